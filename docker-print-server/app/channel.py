@@ -0,0 +1,317 @@
+"""
+Модуль WebSocket каналу друку (/ws/print)
+
+Браузер тримає одне постійне з'єднання і надсилає в нього скільки завгодно
+повідомлень друку з власними ідентифікаторами, не чекаючи відповіді на
+попереднє. Кожне повідомлення стає завданням JobManager (app/jobs.py), тому
+канали, /api/jobs та /api/print друкують на принтер через одну чергу і одне
+з'єднання потоку принтера. Підтвердження приходять асинхронно після кожного
+вікна етикеток, отримання якого підтвердив принтер, а підписані клієнти
+періодично отримують стан принтера з реєстру (app/inventory.py).
+
+Повідомлення клієнта (JSON):
+    {"type": "print", "id": "a1", "IP": "...", "PORT": 9100, "ZPL": "...", "priority": "normal"}
+    {"type": "subscribe", "IP": "...", "PORT": 9100}
+    {"type": "unsubscribe", "IP": "...", "PORT": 9100}
+    {"type": "ping"}
+
+Повідомлення сервера:
+    {"type": "accepted", "id": "a1", "job_id": "...", "labels": 3}
+    {"type": "ack", "id": "a1", "label": 2, "labels": 3}
+    {"type": "done", "id": "a1", "status": "success"}
+    {"type": "done", "id": "a1", "status": "error", "message": "...", "acked": 1}
+    {"type": "status", "IP": "...", "PORT": 9100, "reachable": true, "host_status": {...}, "last_checked": "..."}
+    {"type": "error", "id": "a1", "message": "..."}
+    {"type": "pong", "id": ...}
+
+Канал не журналює етикетки: якщо клієнт від'єднався, незавершені
+повідомлення скасовуються і записуються в історію як невдалі. Для друку,
+що має пережити обрив або перезапуск, використовуйте /api/jobs.
+"""
+import os
+import json
+import logging
+import threading
+from typing import Dict, Any, Optional, Tuple, Set
+
+from simple_websocket import ConnectionClosed
+
+from app.printer import parse_printer_address
+from app.inventory import get_registry
+from app.zpl import validate_zpl, split_document
+from app.jobs import (get_job_manager, PRIORITIES, PRIORITY_NORMAL, STATUS_COMPLETED,
+                      STATUS_FAILED, TERMINAL_STATUSES)
+from app.history import KIND_WEBSOCKET
+
+logger = logging.getLogger(__name__)
+
+# Як часто надсилати стан принтера підписаним клієнтам (в секундах)
+WS_STATUS_INTERVAL = float(os.getenv('WS_STATUS_INTERVAL', '5'))
+# Максимальна кількість повідомлень друку, що очікують виконання, на одне з'єднання
+WS_MAX_PENDING = int(os.getenv('WS_MAX_PENDING', '1000'))
+# Максимальний розмір одного повідомлення (в байтах)
+WS_MAX_MESSAGE_SIZE = int(os.getenv('WS_MAX_MESSAGE_SIZE', str(16 * 1024 * 1024)))
+# Інтервал WebSocket ping, щоб проксі не закривали неактивне з'єднання (в секундах)
+WS_PING_INTERVAL = 25
+MESSAGE_ID_MAX_LENGTH = 128
+# Скільки при закритті чекати, поки скасовані повідомлення зупиняться (в секундах)
+WS_CLOSE_TIMEOUT = 5
+CLOSED_ERROR = "WebSocket закрито до завершення друку"
+
+# Параметри simple_websocket.Server для flask-sock (SOCK_SERVER_OPTIONS)
+SOCK_SERVER_OPTIONS = {"ping_interval": WS_PING_INTERVAL, "max_message_size": WS_MAX_MESSAGE_SIZE}
+
+
+class PrintChannel:
+    """
+    Одне WebSocket з'єднання клієнта
+
+    Читає повідомлення в потоці запиту; друкують потоки принтерів JobManager,
+    які через listener завдання надсилають ack та done. Стан підписаних
+    принтерів надсилає окремий потік, поки є підписки. Усі відповіді
+    надсилаються через спільний замок.
+    """
+
+    def __init__(self, ws, origin: Optional[str] = None, client: Optional[str] = None):
+        self.ws = ws
+        # Походження з'єднання для історії друку
+        self.origin = origin
+        self.client = client
+        self.closed = False
+        # close() вже викликано (closed стає True і тоді, коли клієнт від'єднався під час send)
+        self._closing = False
+        # Повторно входимий: listener завдання надсилає під ним кілька повідомлень поспіль
+        self._send_lock = threading.RLock()
+        self._lock = threading.Lock()
+        # Сповіщається, коли повідомлення завершилося (див. close)
+        self._finished = threading.Condition(self._lock)
+        # Повідомлення, що ще друкуються: id -> job_id (None - завдання ще створюється)
+        self._pending: Dict[str, Optional[str]] = {}
+        # Скільки етикеток повідомлення вже підтверджено клієнту
+        self._acked: Dict[str, int] = {}
+        self._subscriptions: Set[Tuple[str, int]] = set()
+        self._status_thread: Optional[threading.Thread] = None
+        self._status_wakeup = threading.Event()
+
+    def run(self):
+        """Обробляє повідомлення клієнта, поки з'єднання відкрите"""
+        try:
+            while not self.closed:
+                raw = self.ws.receive()
+                if raw is not None:
+                    self._handle(raw)
+        except ConnectionClosed:
+            pass
+        finally:
+            self.close()
+
+    def close(self):
+        """
+        Скасовує незавершені повідомлення та закриває канал
+
+        Завдання в черзі скасовуються одразу, а те, що друкується, - на межі
+        наступної етикетки (канал чекає на це до WS_CLOSE_TIMEOUT секунд);
+        кожне записується в історію як невдале. Поки з'єднання ще відкрите,
+        клієнт отримує done з помилкою.
+        """
+        with self._lock:
+            if self._closing:
+                return
+            self._closing = True
+            pending = [job_id for job_id in self._pending.values() if job_id is not None]
+            self._subscriptions.clear()
+        self._status_wakeup.set()
+
+        manager = get_job_manager()
+        cancelled = {job_id for job_id in pending if manager.cancel(job_id, CLOSED_ERROR)}
+        with self._finished:
+            self._finished.wait_for(lambda: not cancelled.intersection(self._pending.values()),
+                                    timeout=WS_CLOSE_TIMEOUT)
+        # Останній done міг ще надсилатися
+        with self._send_lock:
+            self.closed = True
+        dropped = len(cancelled)
+        if dropped:
+            logger.warning(f"WebSocket закрито, {dropped} повідомлень друку скасовано")
+
+    def send(self, message: Dict[str, Any]):
+        """Надсилає повідомлення клієнту (безпечно з будь-якого потоку)"""
+        if self.closed:
+            return
+        data = json.dumps(message, ensure_ascii=False)
+        try:
+            with self._send_lock:
+                self.ws.send(data)
+        except ConnectionClosed:
+            self.closed = True
+
+    def _on_job_update(self, message_id: str, state: Dict[str, Any]):
+        """Надсилає ack та done за станом завдання (викликається потоком, що його змінив)"""
+        status = state['status']
+        acked = state['source_acked']
+        # Під замком надсилання: ack і done одного повідомлення не переставляються
+        with self._send_lock:
+            with self._lock:
+                if self._pending.get(message_id) != state['job_id']:
+                    return
+                new_ack = acked > self._acked.get(message_id, 0)
+                if new_ack:
+                    self._acked[message_id] = acked
+                if status in TERMINAL_STATUSES:
+                    self._pending.pop(message_id, None)
+                    self._acked.pop(message_id, None)
+                    self._finished.notify_all()
+
+            if new_ack:
+                self.send({"type": "ack", "id": message_id, "label": acked, "labels": state['source_total']})
+            if status == STATUS_COMPLETED:
+                self.send({"type": "done", "id": message_id, "status": "success"})
+            elif status == STATUS_FAILED:
+                logger.error(f"WebSocket: повідомлення {message_id}: {state['error']}")
+                self.send({"type": "done", "id": message_id, "status": "error",
+                           "message": state['error'], "acked": acked})
+
+    def _handle(self, raw):
+        if isinstance(raw, bytes):
+            raw = raw.decode('utf-8', errors='replace')
+        try:
+            message = json.loads(raw)
+        except json.JSONDecodeError as e:
+            self.send({"type": "error", "message": f"Некоректний JSON: {str(e)}"})
+            return
+        if not isinstance(message, dict):
+            self.send({"type": "error", "message": "Повідомлення повинно бути JSON об'єктом"})
+            return
+
+        message_type = message.get('type', 'print')
+        if message_type == 'print':
+            self._handle_print(message)
+        elif message_type in ('subscribe', 'unsubscribe'):
+            self._handle_subscribe(message, message_type == 'subscribe')
+        elif message_type == 'ping':
+            self.send({"type": "pong", "id": message.get('id')})
+        else:
+            self.send({"type": "error", "id": message.get('id'),
+                       "message": f"Невідомий тип повідомлення: {message_type}"})
+
+    def _handle_print(self, message: Dict[str, Any]):
+        message_id = message.get('id')
+        if not isinstance(message_id, (str, int)) or isinstance(message_id, bool) or message_id == '':
+            self.send({"type": "error", "message": "id повідомлення не вказаний"})
+            return
+        message_id = str(message_id)
+        if len(message_id) > MESSAGE_ID_MAX_LENGTH:
+            self.send({"type": "error", "message": f"id не може бути довшим за {MESSAGE_ID_MAX_LENGTH} символів"})
+            return
+
+        ip, port, error_msg = parse_printer_address(message)
+        zpl = message.get('ZPL') or message.get('zpl')
+        if error_msg is None and (not zpl or not isinstance(zpl, str)):
+            error_msg = "ZPL команди не вказані"
+        if error_msg:
+            self.send({"type": "error", "id": message_id, "message": error_msg})
+            return
+
+        printer = get_registry().get(ip, port) or {}
+        doc = validate_zpl(zpl, printer.get('print_width'), printer.get('label_length'))
+        if not doc.ok:
+            self.send({
+                "type": "error",
+                "id": message_id,
+                "message": "ZPL містить структурні помилки: " + "; ".join(doc.errors[:3]),
+                "errors": doc.errors,
+                "warnings": doc.warnings
+            })
+            return
+        labels = split_document(doc)
+
+        priority = message.get('priority') or PRIORITY_NORMAL
+        if priority not in PRIORITIES:
+            self.send({"type": "error", "id": message_id,
+                       "message": f"priority повинен бути одним з: {', '.join(PRIORITIES)}, отримано: {priority}"})
+            return
+
+        with self._lock:
+            if self._closing:
+                return
+            if message_id in self._pending:
+                error_msg = f"Повідомлення з id {message_id} вже виконується"
+            elif len(self._pending) >= WS_MAX_PENDING:
+                error_msg = f"Забагато повідомлень в черзі (максимум {WS_MAX_PENDING})"
+            else:
+                self._pending[message_id] = None
+        if error_msg:
+            self.send({"type": "error", "id": message_id, "message": error_msg})
+            return
+
+        # accepted надсилається під замком надсилання: listener не випередить його першим ack
+        with self._send_lock:
+            try:
+                job = get_job_manager().submit(
+                    ip, port, labels=labels, priority=priority, kind=KIND_WEBSOCKET,
+                    origin=self.origin, client=self.client, durable=False,
+                    listener=lambda state: self._on_job_update(message_id, state)
+                )
+            except Exception as e:
+                logger.error(f"WebSocket: не вдалося створити завдання для повідомлення {message_id}: {str(e)}",
+                             exc_info=True)
+                with self._lock:
+                    self._pending.pop(message_id, None)
+                self.send({"type": "error", "id": message_id, "message": f"Не вдалося створити завдання: {str(e)}"})
+                return
+            with self._lock:
+                self._pending[message_id] = job.id
+
+            accepted = {"type": "accepted", "id": message_id, "job_id": job.id, "labels": len(labels)}
+            if doc.warnings:
+                accepted["warnings"] = doc.warnings
+            self.send(accepted)
+
+    def _handle_subscribe(self, message: Dict[str, Any], subscribe: bool):
+        ip, port, error_msg = parse_printer_address(message)
+        if error_msg:
+            self.send({"type": "error", "id": message.get('id'), "message": error_msg})
+            return
+        with self._lock:
+            if self._closing:
+                return
+            if not subscribe:
+                self._subscriptions.discard((ip, port))
+                return
+            self._subscriptions.add((ip, port))
+            if self._status_thread is None:
+                self._status_thread = threading.Thread(target=self._status_loop, name="ws-status", daemon=True)
+                self._status_thread.start()
+                return
+        # Перший стан - одразу, не чекаючи інтервалу
+        self._status_wakeup.set()
+
+    def _status_loop(self):
+        """Надсилає стан підписаних принтерів кожні WS_STATUS_INTERVAL секунд, поки є підписки"""
+        while True:
+            with self._lock:
+                printers = sorted(self._subscriptions)
+                if not printers or self._closing:
+                    self._status_thread = None
+                    return
+            for ip, port in printers:
+                self._push_status(ip, port)
+            self._status_wakeup.wait(WS_STATUS_INTERVAL)
+            self._status_wakeup.clear()
+
+    def _push_status(self, ip: str, port: int):
+        """
+        Надсилає клієнту стан принтера з реєстру
+
+        Канал не підключається до принтера: стан оновлюють фонове опитування
+        інвентарю та звернення до принтера з шляху друку.
+        """
+        printer = get_registry().get(ip, port) or {}
+        self.send({
+            "type": "status",
+            "IP": ip,
+            "PORT": port,
+            "reachable": printer.get('reachable'),
+            "host_status": printer.get('printer_status'),
+            "last_checked": printer.get('last_checked')
+        })
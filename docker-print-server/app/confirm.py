@@ -0,0 +1,351 @@
+"""
+Модуль підтвердження друку
+
+Успішна відправка означає лише, що байти прийняв TCP стек. У режимі
+підтвердження після відправки принтер опитується командою ~HS, доки в ньому
+не залишиться форматів у буфері прийому (formats_in_buffer) та етикеток
+партії (labels_remaining), або до крайнього терміну. Порожній буфер
+зараховується лише після того, як принтер хоч раз показав відправлене в
+буфері: інакше відповідь, отримана до того, як принтер розібрав дані, була б
+хибним підтвердженням.
+
+Опитування всіх принтерів виконує один потік через selectors: на принтер -
+одне коротке з'єднання на опитування, спільне для всіх завдань, що на нього
+чекають. Інтервал між опитуваннями подвоюється до CONFIRM_POLL_MAX_INTERVAL,
+тому довгий друк не означає нового з'єднання кожні CONFIRM_POLL_INTERVAL.
+З'єднання між опитуваннями не тримається: багато принтерів обслуговують
+одне з'єднання на raw порту одночасно, і воно затримало б наступне завдання.
+"""
+import os
+import time
+import errno
+import queue
+import socket
+import logging
+import selectors
+import threading
+from datetime import datetime
+from typing import Dict, Any, Optional, List, Tuple, Callable
+
+from app.printer import parse_host_status, STATUS_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+# Скільки чекати, поки принтер надрукує все з буфера (в секундах)
+CONFIRM_TIMEOUT = float(os.getenv('CONFIRM_TIMEOUT', '60'))
+# Перший інтервал опитування принтера (в секундах); далі він подвоюється до максимуму
+CONFIRM_POLL_INTERVAL = float(os.getenv('CONFIRM_POLL_INTERVAL', '0.25'))
+CONFIRM_POLL_MAX_INTERVAL = float(os.getenv('CONFIRM_POLL_MAX_INTERVAL', '2'))
+# Таймаут одного опитування: з'єднання та відповідь на ~HS (в секундах)
+CONFIRM_POLL_TIMEOUT = STATUS_TIMEOUT
+
+CONFIRMATION_PENDING = 'pending'
+CONFIRMATION_PRINTED = 'printed'
+CONFIRMATION_TIMEOUT = 'timeout'
+
+
+def _isoformat(timestamp: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(timestamp).isoformat() if timestamp else None
+
+
+def _drained(host_status: Dict[str, Any]) -> bool:
+    """Чи немає в принтері форматів у буфері прийому та етикеток партії"""
+    return host_status['formats_in_buffer'] == 0 and host_status['labels_remaining'] == 0
+
+
+class Confirmation:
+    """
+    Очікування підтвердження друку одного запиту чи завдання
+
+    Поля змінює лише потік PrintConfirmer; після завершення (wait) вони
+    більше не змінюються.
+    """
+
+    def __init__(self, ip: str, port: int, created_at: Optional[float], timeout: float,
+                 callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 host_status: Optional[Dict[str, Any]] = None):
+        self.ip = ip
+        self.port = port
+        self.sent_at = time.time()
+        # Від чого рахується time_to_printed: прийом запиту або створення завдання
+        self.created_at = created_at or self.sent_at
+        self.timeout = timeout
+        self.deadline = time.monotonic() + timeout
+        self.callback = callback
+        self.status = CONFIRMATION_PENDING
+        self.printed_at: Optional[float] = None
+        self.polls = 0
+        self.printer_status: Optional[Dict[str, Any]] = host_status
+        # Чи бачили відправлене в буфері принтера (див. _poll_done)
+        self.busy_seen = host_status is not None and not _drained(host_status)
+        self.error: Optional[str] = None
+        self._done = threading.Event()
+
+    def wait(self, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Чекає завершення підтвердження та повертає його стан"""
+        self._done.wait(timeout)
+        return self.to_dict()
+
+    def to_dict(self) -> Dict[str, Any]:
+        printed = self.printed_at is not None
+        return {
+            "status": self.status,
+            "printed_at": _isoformat(self.printed_at),
+            # Від прийому до спорожнення буфера принтера та від відправки до спорожнення
+            "time_to_printed": round(self.printed_at - self.created_at, 3) if printed else None,
+            "drain_time": round(self.printed_at - self.sent_at, 3) if printed else None,
+            "polls": self.polls,
+            "printer_status": self.printer_status,
+            "error": self.error
+        }
+
+
+class _PrinterPoll:
+    """Стан опитування одного принтера"""
+
+    def __init__(self, ip: str, port: int):
+        self.ip = ip
+        self.port = port
+        self.waiting: List[Confirmation] = []
+        self.sock: Optional[socket.socket] = None
+        self.connected = False
+        self.response = b''
+        # Коли почалося поточне опитування (monotonic та unix час)
+        self.started = 0.0
+        self.started_at = 0.0
+        self.interval = CONFIRM_POLL_INTERVAL
+        self.next_poll = time.monotonic() + self.interval
+
+
+class PrintConfirmer(threading.Thread):
+    """
+    Потік, що опитує принтери з очікуваними підтвердженнями
+
+    Принтер вважається таким, що надрукував усе відправлене до початку
+    опитування, коли ~HS повертає 0 форматів у буфері та 0 етикеток у партії,
+    а раніше (у відповіді на ~HS відправника або в попередньому опитуванні)
+    в буфері щось було. Якщо за цей час на принтер відправлено ще щось,
+    підтвердження чекає, поки надрукується і воно.
+    """
+
+    def __init__(self):
+        super().__init__(name="print-confirmer", daemon=True)
+        self._incoming: 'queue.Queue[Confirmation]' = queue.Queue()
+        self._selector = selectors.DefaultSelector()
+        self._printers: Dict[Tuple[str, int], _PrinterPoll] = {}
+        # Пробудження select, коли додано нове підтвердження
+        self._wakeup_recv, self._wakeup_send = socket.socketpair()
+        self._wakeup_recv.setblocking(False)
+        self._wakeup_send.setblocking(False)
+        self._selector.register(self._wakeup_recv, selectors.EVENT_READ)
+        self._stats_lock = threading.Lock()
+        self.pending = 0
+        self.printed = 0
+        self.timed_out = 0
+
+    def watch(self, ip: str, port: int, created_at: Optional[float] = None,
+              timeout: float = CONFIRM_TIMEOUT,
+              callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+              host_status: Optional[Dict[str, Any]] = None) -> Confirmation:
+        """
+        Починає чекати, поки принтер надрукує вже відправлені дані
+
+        Args:
+            ip, port: Принтер
+            created_at: Unix час прийому запиту (відлік time_to_printed)
+            timeout: Крайній термін у секундах
+            callback: Викликається з результатом (to_dict) у потоці PrintConfirmer
+            host_status: Відповідь на ~HS, отримана відправником одразу після даних
+                (зараховується як перше спостереження буфера)
+
+        Returns:
+            Confirmation: Об'єкт, на якому можна чекати результат (wait)
+        """
+        confirmation = Confirmation(ip, port, created_at, timeout, callback, host_status)
+        with self._stats_lock:
+            self.pending += 1
+        self._incoming.put(confirmation)
+        try:
+            self._wakeup_send.send(b'\0')
+        except BlockingIOError:
+            pass
+        return confirmation
+
+    def metrics(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return {"pending": self.pending, "printed": self.printed, "timeout": self.timed_out}
+
+    def run(self):
+        while True:
+            try:
+                self._step()
+            except Exception as e:
+                logger.error(f"Помилка опитування принтерів для підтвердження друку: {str(e)}", exc_info=True)
+                time.sleep(CONFIRM_POLL_INTERVAL)
+
+    def _step(self):
+        for key, _ in self._selector.select(self._next_timeout()):
+            if key.data is None:
+                try:
+                    while self._wakeup_recv.recv(1024):
+                        pass
+                except BlockingIOError:
+                    pass
+            else:
+                self._on_ready(key.data)
+
+        while True:
+            try:
+                confirmation = self._incoming.get_nowait()
+            except queue.Empty:
+                break
+            key = (confirmation.ip, confirmation.port)
+            poll = self._printers.get(key)
+            if poll is None:
+                poll = self._printers[key] = _PrinterPoll(confirmation.ip, confirmation.port)
+            else:
+                # Новий друк - знову опитуємо часто
+                poll.interval = CONFIRM_POLL_INTERVAL
+                poll.next_poll = min(poll.next_poll, time.monotonic() + poll.interval)
+            poll.waiting.append(confirmation)
+
+        now = time.monotonic()
+        for key, poll in list(self._printers.items()):
+            if poll.sock is not None and now - poll.started >= CONFIRM_POLL_TIMEOUT:
+                self._poll_failed(poll, f"Принтер {poll.ip}:{poll.port} не відповів на ~HS")
+            for confirmation in [c for c in poll.waiting if now >= c.deadline]:
+                if confirmation.error is None and not confirmation.busy_seen:
+                    confirmation.error = (f"Принтер {poll.ip}:{poll.port} за {confirmation.timeout:g} с "
+                                          f"не показав відправлене в буфері, друк не підтверджено")
+                elif confirmation.error is None:
+                    confirmation.error = (f"Принтер {poll.ip}:{poll.port} не надрукував відправлене "
+                                          f"за {confirmation.timeout:g} с")
+                self._resolve(poll, confirmation, CONFIRMATION_TIMEOUT)
+            if not poll.waiting:
+                if poll.sock is None:
+                    del self._printers[key]
+            elif poll.sock is None and now >= poll.next_poll:
+                self._start_poll(poll)
+
+    def _next_timeout(self) -> Optional[float]:
+        """Скільки чекати в select до наступного опитування, таймауту чи крайнього терміну"""
+        if not self._printers:
+            return None
+        deadlines = []
+        for poll in self._printers.values():
+            deadlines.append(poll.started + CONFIRM_POLL_TIMEOUT if poll.sock is not None else poll.next_poll)
+            deadlines.extend(confirmation.deadline for confirmation in poll.waiting)
+        return max(0.0, min(deadlines) - time.monotonic())
+
+    def _start_poll(self, poll: _PrinterPoll):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        poll.sock, poll.connected, poll.response = sock, False, b''
+        poll.started, poll.started_at = time.monotonic(), time.time()
+        self._selector.register(sock, selectors.EVENT_WRITE, poll)
+        error = sock.connect_ex((poll.ip, poll.port))
+        if error not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+            self._poll_failed(poll, f"Не вдалося підключитися до {poll.ip}:{poll.port}: {os.strerror(error)}")
+
+    def _on_ready(self, poll: _PrinterPoll):
+        try:
+            if not poll.connected:
+                error = poll.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                if error:
+                    self._poll_failed(poll, f"Не вдалося підключитися до {poll.ip}:{poll.port}: "
+                                            f"{os.strerror(error)}")
+                    return
+                poll.connected = True
+                poll.sock.send(b'~HS')
+                self._selector.modify(poll.sock, selectors.EVENT_READ, poll)
+                return
+
+            chunk = poll.sock.recv(1024)
+            poll.response += chunk
+            # Відповідь - три рядки у форматі <STX>...<ETX>
+            if chunk and poll.response.count(b'\x03') < 3:
+                return
+            self._poll_done(poll)
+        except OSError as e:
+            self._poll_failed(poll, f"Помилка опитування {poll.ip}:{poll.port}: {str(e)}")
+
+    def _close_poll(self, poll: _PrinterPoll):
+        self._selector.unregister(poll.sock)
+        poll.sock.close()
+        poll.sock = None
+        poll.next_poll = time.monotonic() + poll.interval
+        poll.interval = min(poll.interval * 2, max(CONFIRM_POLL_MAX_INTERVAL, CONFIRM_POLL_INTERVAL))
+
+    def _poll_done(self, poll: _PrinterPoll):
+        self._close_poll(poll)
+        host_status = parse_host_status(poll.response.decode('ascii', errors='ignore'))
+        if host_status is None:
+            for confirmation in poll.waiting:
+                confirmation.error = f"Некоректна відповідь ~HS від {poll.ip}:{poll.port}"
+            return
+
+        drained = _drained(host_status)
+        for confirmation in list(poll.waiting):
+            confirmation.polls += 1
+            confirmation.printer_status = host_status
+            confirmation.error = None
+            # Дані, відправлені після початку опитування, ще могли не потрапити в буфер
+            if confirmation.sent_at > poll.started_at:
+                continue
+            if not drained:
+                confirmation.busy_seen = True
+            elif confirmation.busy_seen:
+                confirmation.printed_at = time.time()
+                self._resolve(poll, confirmation, CONFIRMATION_PRINTED)
+
+    def _poll_failed(self, poll: _PrinterPoll, error_msg: str):
+        logger.debug(error_msg)
+        self._close_poll(poll)
+        for confirmation in poll.waiting:
+            confirmation.polls += 1
+            confirmation.error = error_msg
+
+    def _resolve(self, poll: _PrinterPoll, confirmation: Confirmation, status: str):
+        poll.waiting.remove(confirmation)
+        confirmation.status = status
+        with self._stats_lock:
+            self.pending -= 1
+            if status == CONFIRMATION_PRINTED:
+                self.printed += 1
+            else:
+                self.timed_out += 1
+        if status == CONFIRMATION_PRINTED:
+            logger.info(f"Принтер {poll.ip}:{poll.port} надрукував відправлене: "
+                        f"{confirmation.printed_at - confirmation.created_at:.2f} с від прийому")
+        else:
+            logger.warning(f"Друк на {poll.ip}:{poll.port} не підтверджено: {confirmation.error}")
+        confirmation._done.set()
+        if confirmation.callback:
+            try:
+                confirmation.callback(confirmation.to_dict())
+            except Exception as e:
+                logger.error(f"Помилка обробки підтвердження друку: {str(e)}", exc_info=True)
+
+
+_confirmer: Optional[PrintConfirmer] = None
+_confirmer_lock = threading.Lock()
+
+
+def get_confirmer() -> PrintConfirmer:
+    """Повертає спільний для процесу потік підтвердження друку (запускає при першому виклику)"""
+    global _confirmer
+    if _confirmer is None:
+        with _confirmer_lock:
+            if _confirmer is None:
+                confirmer = PrintConfirmer()
+                confirmer.start()
+                _confirmer = confirmer
+    return _confirmer
+
+
+def confirm_metrics() -> Dict[str, int]:
+    """Лічильники підтверджень процесу (нулі, якщо підтвердження ще не запитували)"""
+    confirmer = _confirmer
+    if confirmer is None:
+        return {"pending": 0, "printed": 0, "timeout": 0}
+    return confirmer.metrics()
@@ -0,0 +1,339 @@
+"""
+Модуль історії друку
+
+Кожен друк (/api/print, завдання /api/jobs та /api/print/merge, повідомлення
+/ws/print) записується з принтером, розміром, кількістю етикеток, часом
+виконання, результатом та походженням запиту. Запис - лише додавання в
+обмежений кільцевий буфер у пам'яті; фоновий потік переносить накопичені
+записи пакетами (одна транзакція на пакет) в індексовану базу SQLite, тому
+запит друку не чекає на диск. Якщо диск не встигає і буфер переповнюється,
+найстаріші незаписані записи відкидаються (кількість - в dropped).
+"""
+import os
+import time
+import socket
+import sqlite3
+import logging
+import threading
+import collections
+from datetime import datetime
+from typing import Dict, Any, Optional, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HISTORY_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)),
+    'config',
+    'history.db'
+)
+
+# Скільки записів тримати в пам'яті до запису на диск
+HISTORY_BUFFER_SIZE = int(os.getenv('HISTORY_BUFFER_SIZE', '10000'))
+# Як часто переносити записи з пам'яті в базу (в секундах)
+HISTORY_FLUSH_INTERVAL = float(os.getenv('HISTORY_FLUSH_INTERVAL', '1'))
+# Скільки днів зберігати історію
+HISTORY_RETENTION_DAYS = int(os.getenv('HISTORY_RETENTION_DAYS', '30'))
+# Як часто видаляти старі записи (в секундах)
+HISTORY_PRUNE_INTERVAL = 3600
+# Таймаут очікування блокування бази іншим процесом (в мілісекундах)
+HISTORY_BUSY_TIMEOUT_MS = 5000
+HISTORY_MAX_PAGE_SIZE = 500
+HISTORY_DEFAULT_PAGE_SIZE = 50
+
+# Джерела записів
+KIND_PRINT = 'print'
+KIND_JOB = 'job'
+KIND_MERGE = 'merge'
+KIND_WEBSOCKET = 'ws'
+
+_COLUMNS = ('job_id', 'kind', 'ip', 'port', 'printer', 'status', 'priority', 'labels', 'bytes',
+            'created_at', 'started_at', 'finished_at', 'duration', 'error', 'origin', 'client', 'process')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT,
+    kind TEXT NOT NULL,
+    ip TEXT NOT NULL,
+    port INTEGER NOT NULL,
+    printer TEXT NOT NULL,
+    status TEXT NOT NULL,
+    priority TEXT,
+    labels INTEGER,
+    bytes INTEGER,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    duration REAL,
+    error TEXT,
+    origin TEXT,
+    client TEXT,
+    process TEXT
+);
+CREATE INDEX IF NOT EXISTS history_created ON history (created_at);
+CREATE INDEX IF NOT EXISTS history_printer_created ON history (printer, created_at);
+CREATE INDEX IF NOT EXISTS history_ip_created ON history (ip, created_at);
+CREATE INDEX IF NOT EXISTS history_status_created ON history (status, created_at);
+CREATE INDEX IF NOT EXISTS history_job_id ON history (job_id);
+"""
+
+
+def get_history_path() -> str:
+    """Повертає шлях до бази історії"""
+    return os.getenv('HISTORY_PATH', DEFAULT_HISTORY_PATH)
+
+
+def is_history_enabled() -> bool:
+    """Чи увімкнено історію друку (HISTORY_DISABLE=1 вимикає)"""
+    return os.getenv('HISTORY_DISABLE') != '1'
+
+
+def _isoformat(timestamp: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(timestamp).isoformat() if timestamp else None
+
+
+class PrintHistory:
+    """
+    Історія друку: кільцевий буфер у пам'яті та база SQLite на диску
+
+    Кілька процесів gunicorn пишуть в одну базу (режим WAL); кожен процес
+    має власний буфер і потік запису.
+    """
+
+    def __init__(self, path: str, buffer_size: int = HISTORY_BUFFER_SIZE):
+        self.path = path
+        self.process = f"{socket.gethostname()}:{os.getpid()}"
+        self.dropped = 0
+        # deque.append атомарний, тому запис не бере замків
+        self._buffer: 'collections.deque[Tuple]' = collections.deque(maxlen=max(1, buffer_size))
+        self._flush_lock = threading.Lock()
+        self._writer: Optional[threading.Thread] = None
+        self._writer_lock = threading.Lock()
+        self._last_prune = 0.0
+        self._initialized = False
+
+    def record(self, ip: str, port: int, status: str, kind: str = KIND_PRINT,
+               job_id: Optional[str] = None, priority: Optional[str] = None,
+               labels: Optional[int] = None, nbytes: Optional[int] = None,
+               created_at: Optional[float] = None, started_at: Optional[float] = None,
+               finished_at: Optional[float] = None, error: Optional[str] = None,
+               origin: Optional[str] = None, client: Optional[str] = None):
+        """
+        Додає запис у буфер (без звернення до диска)
+
+        Args:
+            ip, port: Принтер
+            status: Результат (completed або failed)
+            kind: Джерело: print, job, merge або ws
+            labels: Кількість етикеток
+            nbytes: Розмір відправлених даних
+            created_at, started_at, finished_at: unix час прийому, першої етикетки, завершення
+            origin: Origin (або Referer) запиту
+            client: IP-адреса клієнта
+        """
+        finished_at = finished_at or time.time()
+        created_at = created_at or finished_at
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1
+        self._buffer.append((
+            job_id, kind, ip, port, f"{ip}:{port}", status, priority, labels, nbytes,
+            created_at, started_at, finished_at, round(finished_at - created_at, 6),
+            error, origin, client, self.process
+        ))
+        if self._writer is None:
+            self._start_writer()
+
+    def flush(self) -> int:
+        """
+        Записує накопичені записи однією транзакцією
+
+        Returns:
+            int: Кількість записаних записів
+        """
+        with self._flush_lock:
+            batch = []
+            while self._buffer:
+                try:
+                    batch.append(self._buffer.popleft())
+                except IndexError:
+                    break
+            if not batch:
+                return 0
+            try:
+                connection = self._connect()
+                try:
+                    with connection:
+                        connection.executemany(
+                            f"INSERT INTO history ({', '.join(_COLUMNS)}) "
+                            f"VALUES ({', '.join('?' * len(_COLUMNS))})",
+                            batch
+                        )
+                finally:
+                    connection.close()
+            except sqlite3.Error as e:
+                # Повертаємо пакет у буфер (що не вміщується - відкидається)
+                logger.warning(f"Не вдалося записати {len(batch)} записів історії: {str(e)}")
+                for position, item in enumerate(reversed(batch)):
+                    if len(self._buffer) == self._buffer.maxlen:
+                        self.dropped += len(batch) - position
+                        break
+                    self._buffer.appendleft(item)
+                return 0
+            return len(batch)
+
+    def query(self, printer: Optional[str] = None, status: Optional[str] = None,
+              kind: Optional[str] = None, since: Optional[float] = None, until: Optional[float] = None,
+              limit: int = HISTORY_DEFAULT_PAGE_SIZE,
+              cursor: Optional[Tuple[float, int]] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Повертає записи від новіших до старіших
+
+        Args:
+            printer: "ip" або "ip:port"
+            status: completed або failed
+            kind: Джерело запису
+            since, until: Межі часу прийому (unix час)
+            limit: Розмір сторінки
+            cursor: (created_at, id) останнього запису попередньої сторінки
+
+        Returns:
+            (записи, курсор наступної сторінки або None)
+        """
+        # Записи цього процесу, що ще в пам'яті, теж повинні потрапити у відповідь
+        self.flush()
+
+        conditions, params = [], []
+        if printer:
+            if ':' in printer:
+                conditions.append("printer = ?")
+            else:
+                conditions.append("ip = ?")
+            params.append(printer)
+        if status:
+            conditions.append("status = ?")
+            params.append(status)
+        if kind:
+            conditions.append("kind = ?")
+            params.append(kind)
+        if since is not None:
+            conditions.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("created_at < ?")
+            params.append(until)
+        if cursor is not None:
+            conditions.append("(created_at < ? OR (created_at = ? AND id < ?))")
+            params.extend((cursor[0], cursor[0], cursor[1]))
+
+        sql = f"SELECT id, {', '.join(_COLUMNS)} FROM history"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY created_at DESC, id DESC LIMIT ?"
+        params.append(limit + 1)
+
+        connection = self._connect()
+        try:
+            rows = connection.execute(sql, params).fetchall()
+        finally:
+            connection.close()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = f"{rows[-1]['created_at']!r}:{rows[-1]['id']}"
+        return [_row_to_dict(row) for row in rows], next_cursor
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=HISTORY_BUSY_TIMEOUT_MS / 1000)
+        connection.row_factory = sqlite3.Row
+        if not self._initialized:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(_SCHEMA)
+            self._initialized = True
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _start_writer(self):
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="history-writer", daemon=True)
+                self._writer.start()
+
+    def _write_loop(self):
+        reported_dropped = 0
+        while True:
+            time.sleep(HISTORY_FLUSH_INTERVAL)
+            try:
+                self.flush()
+                if self.dropped != reported_dropped:
+                    logger.warning(f"Буфер історії друку переповнено, відкинуто "
+                                   f"{self.dropped - reported_dropped} записів")
+                    reported_dropped = self.dropped
+                if time.time() - self._last_prune >= HISTORY_PRUNE_INTERVAL:
+                    self._prune()
+            except Exception as e:
+                logger.error(f"Помилка запису історії друку: {str(e)}", exc_info=True)
+
+    def _prune(self):
+        """Видаляє записи, старіші за HISTORY_RETENTION_DAYS"""
+        self._last_prune = time.time()
+        threshold = self._last_prune - HISTORY_RETENTION_DAYS * 86400
+        connection = self._connect()
+        try:
+            with connection:
+                deleted = connection.execute("DELETE FROM history WHERE created_at < ?", (threshold,)).rowcount
+        finally:
+            connection.close()
+        if deleted:
+            logger.info(f"Видалено {deleted} записів історії друку, старіших за {HISTORY_RETENTION_DAYS} днів")
+
+
+def _row_to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+    record = {name: row[name] for name in _COLUMNS if name != 'printer'}
+    for name in ('created_at', 'started_at', 'finished_at'):
+        record[name] = _isoformat(record[name])
+    return record
+
+
+def parse_cursor(value: str) -> Tuple[float, int]:
+    """
+    Розбирає курсор сторінки ("created_at:id")
+
+    Raises:
+        ValueError: Якщо курсор некоректний
+    """
+    created_at, _, row_id = value.rpartition(':')
+    return float(created_at), int(row_id)
+
+
+_history: Optional[PrintHistory] = None
+_history_lock = threading.Lock()
+
+
+def get_history() -> Optional[PrintHistory]:
+    """Повертає спільну для процесу історію або None, якщо історію вимкнено"""
+    global _history
+    if _history is None and is_history_enabled():
+        with _history_lock:
+            if _history is None:
+                _history = PrintHistory(get_history_path())
+    return _history
+
+
+def record_print(ip: str, port: int, status: str, **fields):
+    """Записує друк в історію (нічого не робить, якщо історію вимкнено)"""
+    history = get_history()
+    if history is not None:
+        history.record(ip, port, status, **fields)
+
+
+def flush_history():
+    """Записує на диск буфер історії процесу (викликається перед зупинкою worker)"""
+    history = _history
+    if history is not None:
+        try:
+            history.flush()
+        except Exception as e:
+            logger.warning(f"Не вдалося записати історію друку: {str(e)}")
@@ -0,0 +1,114 @@
+"""
+Модуль для ідемпотентних запитів (заголовок Idempotency-Key)
+
+Клієнт, що повторює запит після таймауту або обриву з'єднання, передає
+той самий Idempotency-Key і отримує збережену відповідь першого запиту
+замість повторного друку. Результати зберігаються у спільному сховищі,
+тому повтор може потрапити на будь-який процес чи репліку.
+"""
+import os
+import hashlib
+import logging
+import functools
+from typing import Callable
+
+from flask import request, jsonify, make_response, current_app
+
+from app.state import get_state_backend
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+# Скільки зберігати відповідь (в секундах)
+IDEMPOTENCY_TTL = int(os.getenv('IDEMPOTENCY_TTL', '86400'))
+# Скільки вважати запит таким, що виконується (якщо процес завершився посеред запиту)
+IDEMPOTENCY_PENDING_TTL = 300
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+
+def idempotent(view: Callable) -> Callable:
+    """
+    Декоратор Flask view: повертає збережену відповідь для повторного Idempotency-Key
+
+    - той самий ключ і те саме тіло - збережена відповідь із заголовком Idempotent-Replayed: true;
+    - той самий ключ, але інше тіло - 422;
+    - перший запит з цим ключем ще виконується - 409.
+    Відповіді 5xx не зберігаються, щоб запит можна було повторити.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view(*args, **kwargs)
+        if len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+            return jsonify({
+                "status": "error",
+                "message": f"{IDEMPOTENCY_HEADER} не може бути довшим за {IDEMPOTENCY_KEY_MAX_LENGTH} символів"
+            }), 400
+
+        state_key = "idempotency:" + hashlib.sha256(
+            f"{request.method} {request.path} {key}".encode('utf-8')
+        ).hexdigest()
+        fingerprint = hashlib.sha256(request.get_data()).hexdigest()
+        backend = get_state_backend()
+
+        try:
+            claimed = backend.add(state_key, {"pending": True, "fingerprint": fingerprint},
+                                  ttl=IDEMPOTENCY_PENDING_TTL)
+            stored = None if claimed else backend.get(state_key)
+        except Exception as e:
+            # Недоступне сховище не повинно зупиняти друк
+            logger.warning(f"Сховище ідемпотентності недоступне, запит виконується без нього: {str(e)}")
+            return view(*args, **kwargs)
+
+        if not claimed and stored is not None:
+            if stored.get('fingerprint') != fingerprint:
+                return jsonify({
+                    "status": "error",
+                    "message": f"{IDEMPOTENCY_HEADER} вже використано з іншим тілом запиту"
+                }), 422
+            if stored.get('pending'):
+                return jsonify({
+                    "status": "error",
+                    "message": f"Запит з цим {IDEMPOTENCY_HEADER} ще виконується"
+                }), 409
+            response = current_app.response_class(
+                stored['body'], status=stored['status_code'], mimetype=stored['mimetype']
+            )
+            response.headers[REPLAYED_HEADER] = 'true'
+            return response
+
+        try:
+            response = make_response(view(*args, **kwargs))
+        except Exception:
+            _forget(backend, state_key, claimed)
+            raise
+
+        if response.status_code >= 500 or response.is_streamed:
+            _forget(backend, state_key, claimed)
+            return response
+
+        if claimed:
+            try:
+                backend.set(state_key, {
+                    "fingerprint": fingerprint,
+                    "status_code": response.status_code,
+                    "mimetype": response.mimetype,
+                    "body": response.get_data(as_text=True)
+                }, ttl=IDEMPOTENCY_TTL)
+            except Exception as e:
+                logger.warning(f"Не вдалося зберегти відповідь для {IDEMPOTENCY_HEADER}: {str(e)}")
+        return response
+
+    return wrapper
+
+
+def _forget(backend, state_key: str, claimed: bool):
+    """Знімає позначку "виконується", щоб клієнт міг повторити запит"""
+    if not claimed:
+        return
+    try:
+        backend.delete(state_key)
+    except Exception as e:
+        logger.warning(f"Не вдалося видалити ключ ідемпотентності: {str(e)}")
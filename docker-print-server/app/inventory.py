@@ -0,0 +1,420 @@
+"""
+Модуль для підтримки актуального реєстру принтерів у пам'яті
+
+Фоновий потік у кожному процесі gunicorn намагається стати лідером
+(оренда "inventory-leader" у спільному сховищі, app/state.py). Лідер
+періодично перевіряє відомі принтери (підключення, а ZPL принтери - ще й ~HS) і публікує
+знімок стану в сховище; інші процеси та репліки лише синхронізуються з
+ним. Запити до реєстру не виконують жодного вводу-виводу.
+"""
+import os
+import time
+import socket
+import logging
+import threading
+import concurrent.futures
+from datetime import datetime
+from typing import Dict, Any, Optional, List
+
+from app.printer import read_host_status, identify_printer, add_connect_listener
+from app.jobs import is_printer_busy
+from app.scan_data import load_scan_data, get_scan_data_path
+from app.state import get_state_backend
+
+logger = logging.getLogger(__name__)
+
+# Ключі знімка стану, інвентарю сканування та оренди лідера у спільному сховищі
+INVENTORY_KEY = 'inventory'
+SCAN_DATA_KEY = 'scan_data'
+LEADER_LEASE = 'inventory-leader'
+
+# Інтервал перевірки принтерів лідером (в секундах)
+INVENTORY_REFRESH_INTERVAL = float(os.getenv('INVENTORY_REFRESH_INTERVAL', '30'))
+# Інтервал синхронізації інших процесів зі знімком (в секундах)
+INVENTORY_SYNC_INTERVAL = 2
+# Таймаут перевірки одного принтера (в секундах)
+PROBE_TIMEOUT = 2
+# Максимальна кількість одночасних перевірок
+PROBE_MAX_WORKERS = 20
+# Строк оренди лідера; лідер продовжує її на кожному циклі перевірки (в секундах)
+LEADER_LEASE_TTL = INVENTORY_REFRESH_INTERVAL * 3
+# Скільки секунд результат "недоступний" дозволяє відхиляти друк без спроби підключення
+UNREACHABLE_FAIL_FAST_SECONDS = float(os.getenv('UNREACHABLE_FAIL_FAST_SECONDS', '5'))
+# Через скільки секунд повторювати невдалу ідентифікацію (подвоюється після кожної невдачі)
+IDENTIFY_RETRY_INTERVAL = float(os.getenv('IDENTIFY_RETRY_INTERVAL', '600'))
+IDENTIFY_RETRY_MAX_INTERVAL = 24 * 3600
+# Поля стану, які процес оновлює сам зі шляху друку (mark)
+_MARK_FIELDS = ('reachable', 'last_checked', 'last_seen')
+
+
+def _mtime(path: str) -> Optional[float]:
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+def probe_printer(ip: str, port: int, timeout: float = PROBE_TIMEOUT,
+                  host_status: bool = True) -> Dict[str, Any]:
+    """
+    Перевіряє доступність принтера та запитує його стан (~HS)
+
+    Принтер, зайнятий друком в іншому з'єднанні, може не відповісти на ~HS,
+    тому доступність визначається лише успішним TCP підключенням.
+
+    Args:
+        host_status: Надсилати ~HS; для пристроїв, що не є ZPL принтерами, -
+            False (лише TCP підключення)
+
+    Returns:
+        Dict з reachable, latency_ms, printer_status, last_checked (та last_seen, якщо доступний)
+    """
+    now = datetime.now().isoformat()
+    result: Dict[str, Any] = {"reachable": False, "latency_ms": None,
+                              "printer_status": None, "last_checked": now}
+    sock = None
+    try:
+        started = time.monotonic()
+        sock = socket.create_connection((ip, port), timeout=timeout)
+        result["latency_ms"] = round((time.monotonic() - started) * 1000, 1)
+        result["reachable"] = True
+        result["last_seen"] = now
+        if host_status:
+            result["printer_status"] = read_host_status(sock, timeout)
+    except (socket.timeout, socket.error) as e:
+        logger.debug(f"Принтер {ip}:{port} недоступний: {str(e)}")
+    finally:
+        if sock:
+            sock.close()
+    return result
+
+
+class PrinterRegistry:
+    """
+    Реєстр принтерів у пам'яті: інвентар сканування + поточний стан
+
+    Ключ - "ip:port". Стан (reachable, printer_status, ...) оновлюється
+    лідером або з його знімка, а також з результатів друку в цьому процесі.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._scan_data: Dict[str, Any] = {}
+        self._printers: Dict[str, Dict[str, Any]] = {}
+        self._live: Dict[str, Dict[str, Any]] = {}
+        self._scan_version = None
+        self._snapshot_version: Optional[str] = None
+        self.updated_at: Optional[str] = None
+
+    def load_scan_data(self, force: bool = False) -> bool:
+        """
+        Перечитує інвентар сканування, якщо він змінився
+
+        Зі спільним між репліками сховищем (Redis) інвентар береться з нього,
+        щоб результат сканування на одній репліці бачили всі інші; інакше -
+        з scan_data.json.
+        """
+        backend = get_state_backend()
+        if backend.shared:
+            try:
+                scan_data = backend.get(SCAN_DATA_KEY)
+            except Exception as e:
+                logger.debug(f"Не вдалося прочитати інвентар сканування зі сховища: {str(e)}")
+                scan_data = None
+            if scan_data is not None:
+                version = scan_data.get('last_scan')
+                if not force and version == self._scan_version:
+                    return False
+                self._apply_scan_data(scan_data, version)
+                return True
+
+        mtime = _mtime(get_scan_data_path())
+        if not force and mtime is not None and mtime == self._scan_version:
+            return False
+        self._apply_scan_data(load_scan_data(), mtime)
+        return True
+
+    def publish_scan_data(self):
+        """Застосовує щойно збережений scan_data.json та ділиться ним з іншими репліками"""
+        scan_data = load_scan_data()
+        backend = get_state_backend()
+        if backend.shared:
+            try:
+                backend.set(SCAN_DATA_KEY, scan_data)
+            except Exception as e:
+                logger.warning(f"Не вдалося опублікувати інвентар сканування: {str(e)}")
+        self._apply_scan_data(scan_data, scan_data.get('last_scan') if backend.shared
+                              else _mtime(get_scan_data_path()))
+
+    def _apply_scan_data(self, scan_data: Dict[str, Any], version):
+        printers = {
+            f"{printer.get('ip')}:{printer.get('port')}": printer
+            for printer in scan_data.get('printers') or [] if isinstance(printer, dict)
+        }
+        with self._lock:
+            self._scan_data = {key: value for key, value in scan_data.items() if key != 'printers'}
+            self._printers = printers
+            self._scan_version = version
+
+    def load_snapshot(self) -> bool:
+        """Перечитує знімок стану, опублікований лідером, якщо він змінився"""
+        try:
+            snapshot = get_state_backend().get(INVENTORY_KEY)
+        except Exception as e:
+            logger.debug(f"Не вдалося прочитати знімок стану принтерів: {str(e)}")
+            return False
+        if not snapshot or snapshot.get('updated_at') == self._snapshot_version:
+            return False
+
+        with self._lock:
+            live = snapshot.get('printers') or {}
+            # Власні спостереження процесу, новіші за перевірку лідера, не втрачаємо
+            for key, local in self._live.items():
+                if (local.get('last_checked') or '') > (live.get(key, {}).get('last_checked') or ''):
+                    live[key] = dict(live.get(key, {}))
+                    live[key].update({field: local[field] for field in _MARK_FIELDS if field in local})
+            self._live = live
+            self.updated_at = snapshot.get('updated_at')
+            self._snapshot_version = self.updated_at
+        return True
+
+    def save_snapshot(self):
+        """Публікує поточний стан для інших процесів та реплік"""
+        with self._lock:
+            snapshot = {"updated_at": self.updated_at,
+                        "printers": {key: dict(value) for key, value in self._live.items()}}
+        get_state_backend().set(INVENTORY_KEY, snapshot)
+        self._snapshot_version = snapshot['updated_at']
+
+    def keys(self) -> List[str]:
+        """Повертає ключі всіх відомих принтерів"""
+        with self._lock:
+            return list(self._printers.keys())
+
+    def update(self, key: str, fields: Dict[str, Any]):
+        """Оновлює поточний стан принтера"""
+        with self._lock:
+            self._live.setdefault(key, {}).update(fields)
+
+    def mark(self, ip: str, port: int, reachable: bool):
+        """Записує результат звернення до принтера з шляху друку (без вводу-виводу)"""
+        now = datetime.now().isoformat()
+        fields: Dict[str, Any] = {"reachable": reachable, "last_checked": now}
+        if reachable:
+            fields["last_seen"] = now
+        self.update(f"{ip}:{port}", fields)
+
+    def is_reachable(self, ip: str, port: int, max_age: Optional[float] = None) -> Optional[bool]:
+        """
+        Повертає останню відому доступність принтера
+
+        Args:
+            max_age: Враховувати лише перевірку, давнішу не більше ніж на max_age секунд
+
+        Returns:
+            True/False або None, якщо принтер ще не перевірявся (або перевірка застаріла)
+        """
+        with self._lock:
+            state = self._live.get(f"{ip}:{port}", {})
+        if max_age is not None:
+            try:
+                checked = datetime.fromisoformat(state['last_checked'])
+            except (KeyError, TypeError, ValueError):
+                return None
+            if (datetime.now() - checked).total_seconds() > max_age:
+                return None
+        return state.get('reachable')
+
+    def get(self, ip: str, port: int) -> Optional[Dict[str, Any]]:
+        """Повертає запис принтера (інвентар + стан) або None"""
+        key = f"{ip}:{port}"
+        with self._lock:
+            if key not in self._printers and key not in self._live:
+                return None
+            return self._merge(key)
+
+    def list(self, reachable: Optional[bool] = None, model: Optional[str] = None,
+             identified: Optional[bool] = None, ip: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Повертає принтери з фільтрацією
+
+        Args:
+            reachable: Лише доступні/недоступні
+            model: Префікс моделі (без урахування регістру)
+            identified: Лише ідентифіковані/неідентифіковані
+            ip: Конкретна IP-адреса
+        """
+        with self._lock:
+            printers = [self._merge(key) for key in self._printers]
+
+        result = []
+        for printer in printers:
+            if reachable is not None and bool(printer.get('reachable')) != reachable:
+                continue
+            if model and not (printer.get('model') or '').lower().startswith(model.lower()):
+                continue
+            if identified is not None and bool(printer.get('identified')) != identified:
+                continue
+            if ip and printer.get('ip') != ip:
+                continue
+            result.append(printer)
+        return result
+
+    def scan_data(self) -> Dict[str, Any]:
+        """Повертає дані останнього сканування у форматі scan_data.json"""
+        with self._lock:
+            scan_data = dict(self._scan_data)
+            scan_data['printers'] = [dict(printer) for printer in self._printers.values()]
+        return scan_data
+
+    def _merge(self, key: str) -> Dict[str, Any]:
+        """Об'єднує інвентар та стан принтера (викликається під замком)"""
+        printer = dict(self._printers.get(key, {}))
+        printer.setdefault('reachable', None)
+        printer.update(self._live.get(key, {}))
+        return printer
+
+
+class InventoryMaintainer(threading.Thread):
+    """
+    Фоновий потік підтримки реєстру
+
+    Лідер (один на всі процеси та репліки) перевіряє принтери та публікує
+    знімок, решта процесів синхронізуються зі знімком.
+    """
+
+    def __init__(self, registry: PrinterRegistry):
+        super().__init__(name='inventory-maintainer', daemon=True)
+        self.registry = registry
+        self.is_leader = False
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._wakeup = threading.Event()
+
+    def refresh_now(self):
+        """Просить лідера перевірити принтери позачергово (наприклад, після сканування)"""
+        self._wakeup.set()
+
+    def run(self):
+        while True:
+            try:
+                self._renew_leadership()
+
+                self.registry.load_scan_data()
+                if self.is_leader:
+                    self._refresh()
+                    # Прибирання сховища - у фоні лідера, а не на шляху запису стану
+                    get_state_backend().cleanup()
+                else:
+                    self.registry.load_snapshot()
+            except Exception as e:
+                logger.error(f"Помилка оновлення реєстру принтерів: {str(e)}", exc_info=True)
+
+            interval = INVENTORY_REFRESH_INTERVAL if self.is_leader else INVENTORY_SYNC_INTERVAL
+            self._wakeup.wait(interval)
+            self._wakeup.clear()
+
+    def _renew_leadership(self):
+        """Захоплює або продовжує оренду лідера"""
+        try:
+            is_leader = get_state_backend().acquire_lease(LEADER_LEASE, self.owner, LEADER_LEASE_TTL)
+        except Exception as e:
+            logger.warning(f"Не вдалося продовжити оренду лідера реєстру принтерів: {str(e)}")
+            is_leader = False
+
+        if is_leader and not self.is_leader:
+            # Продовжуємо з останнього опублікованого стану
+            self.registry.load_snapshot()
+            logger.info(f"Процес {self.owner} став лідером підтримки реєстру принтерів")
+        elif self.is_leader and not is_leader:
+            logger.warning(f"Процес {self.owner} втратив роль лідера підтримки реєстру принтерів")
+        self.is_leader = is_leader
+
+    def _refresh(self):
+        """Перевіряє всі відомі принтери та публікує знімок"""
+        keys = self.registry.keys()
+        if keys:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=min(PROBE_MAX_WORKERS, len(keys))) as executor:
+                futures = {executor.submit(self._probe, key): key for key in keys}
+                for future in concurrent.futures.as_completed(futures):
+                    try:
+                        self.registry.update(futures[future], future.result())
+                    except Exception as e:
+                        logger.debug(f"Помилка перевірки {futures[future]}: {str(e)}")
+
+        self.registry.updated_at = datetime.now().isoformat()
+        try:
+            self.registry.save_snapshot()
+        except Exception as e:
+            logger.warning(f"Не вдалося зберегти знімок стану принтерів: {str(e)}")
+
+    def _probe(self, key: str) -> Dict[str, Any]:
+        """
+        Перевіряє один принтер; неідентифіковані доступні принтери ідентифікує
+
+        ~HS надсилається лише ідентифікованим ZPL принтерам, решта перевіряється
+        TCP підключенням. Принтер, на який цей процес зараз друкує, не
+        перевіряється другим з'єднанням - його доступність відмічає друк.
+        Після невдалої ідентифікації наступна спроба - через
+        IDENTIFY_RETRY_INTERVAL, що подвоюється до IDENTIFY_RETRY_MAX_INTERVAL.
+        """
+        ip, port = key.rsplit(':', 1)
+        port = int(port)
+        if is_printer_busy(ip, port):
+            return {}
+
+        printer = self.registry.get(ip, port) or {}
+        is_zpl = bool(printer.get('identified') or printer.get('model'))
+        result = probe_printer(ip, port, host_status=is_zpl)
+        if not result["reachable"] or is_zpl or not _identify_due(printer):
+            return result
+
+        info = identify_printer(ip, port)
+        if info:
+            result.update(info)
+            result.update({"identified": True, "identify_failed_at": None, "identify_failures": 0})
+        else:
+            failures = int(printer.get('identify_failures') or 0) + 1
+            result.update({"identified": False, "identify_failed_at": datetime.now().isoformat(),
+                           "identify_failures": failures})
+            logger.debug(f"Пристрій {key} не відповів на ~HI (спроба {failures}), "
+                         f"наступна - через {_identify_backoff(failures):.0f} с")
+        return result
+
+
+def _identify_backoff(failures: int) -> float:
+    """Інтервал до наступної спроби ідентифікації після failures невдач поспіль"""
+    return min(IDENTIFY_RETRY_MAX_INTERVAL, IDENTIFY_RETRY_INTERVAL * 2 ** max(0, failures - 1))
+
+
+def _identify_due(printer: Dict[str, Any]) -> bool:
+    """Чи настав час (повторно) ідентифікувати пристрій"""
+    try:
+        failed_at = datetime.fromisoformat(printer['identify_failed_at'])
+    except (KeyError, TypeError, ValueError):
+        return True
+    elapsed = (datetime.now() - failed_at).total_seconds()
+    return elapsed >= _identify_backoff(int(printer.get('identify_failures') or 1))
+
+
+_registry = PrinterRegistry()
+# Кожне підключення з шляху друку (запити, завдання, WebSocket) оновлює доступність принтера
+add_connect_listener(_registry.mark)
+_maintainer: Optional[InventoryMaintainer] = None
+_maintainer_lock = threading.Lock()
+
+
+def get_registry() -> PrinterRegistry:
+    """Повертає реєстр принтерів процесу"""
+    return _registry
+
+
+def start_inventory_maintainer() -> InventoryMaintainer:
+    """Запускає фоновий потік підтримки реєстру (один раз на процес)"""
+    global _maintainer
+    with _maintainer_lock:
+        if _maintainer is None:
+            _registry.load_scan_data(force=True)
+            _registry.load_snapshot()
+            _maintainer = InventoryMaintainer(_registry)
+            _maintainer.start()
+        return _maintainer
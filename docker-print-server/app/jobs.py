@@ -0,0 +1,782 @@
+"""
+Модуль для друку ZPL завдань поетикетково з контрольними точками та відновленням
+"""
+import os
+import queue
+import socket
+import logging
+import threading
+import time
+import uuid
+import itertools
+import collections
+from datetime import datetime
+from typing import Dict, Any, Optional, Tuple, List, Callable
+
+from app.printer import connect_to_printer, read_host_status, SEND_TIMEOUT, STATUS_TIMEOUT
+from app.rate_limit import get_printer_shaper
+from app.spool import Spool, get_spool_dir, is_spool_enabled
+from app.state import StateBackend, get_state_backend
+from app.zpl import split_labels, collapse_repeated_labels
+from app.history import record_print, KIND_JOB
+from app.confirm import get_confirmer
+
+logger = logging.getLogger(__name__)
+
+# Кількість етикеток у вікні; прогрес публікується після кожного вікна
+JOB_WINDOW_SIZE = int(os.getenv('JOB_WINDOW_SIZE', '10'))
+# Скільки часу зберігати завершені завдання в пам'яті (в секундах)
+JOB_RETENTION_SECONDS = int(os.getenv('JOB_RETENTION_SECONDS', '3600'))
+# Скільки часу потік принтера чекає на нові завдання перед завершенням (в секундах)
+WORKER_IDLE_TIMEOUT = 60
+# Як часто перевіряти спільний стан завдання, яке виконує інший процес (в секундах)
+JOB_STATE_POLL_INTERVAL = 1
+# Замінювати послідовні однакові етикетки однією з ^PQ N
+JOB_COLLAPSE_REPEATS = os.getenv('JOB_COLLAPSE_REPEATS', '1') == '1'
+# Підтверджувати прийом кожного вікна запитом ~HS перед контрольною точкою;
+# 0 - контрольна точка одразу після відправки (для пристроїв без ~HS)
+JOB_CONFIRM_RECEIPT = os.getenv('JOB_CONFIRM_RECEIPT', '1') == '1'
+
+# Статуси завдання
+STATUS_QUEUED = 'queued'
+STATUS_PRINTING = 'printing'
+STATUS_COMPLETED = 'completed'
+STATUS_FAILED = 'failed'
+TERMINAL_STATUSES = (STATUS_COMPLETED, STATUS_FAILED)
+
+# Пріоритети завдання: high вставляється на межі наступної етикетки поточного завдання normal
+PRIORITY_NORMAL = 'normal'
+PRIORITY_HIGH = 'high'
+PRIORITIES = (PRIORITY_HIGH, PRIORITY_NORMAL)
+# Скільки останніх завдань кожного пріоритету враховувати в перцентилях затримки
+LATENCY_SAMPLES = 1000
+
+
+def _isoformat(timestamp: Optional[float]) -> Optional[str]:
+    """Перетворює unix timestamp в ISO рядок"""
+    return datetime.fromtimestamp(timestamp).isoformat() if timestamp else None
+
+
+class _JobCancelled(Exception):
+    """Завдання скасовано під час друку (див. JobManager.cancel)"""
+
+
+class PrintJob:
+    """
+    Завдання друку: список етикеток та контрольна точка
+
+    Контрольна точка (acked) - кількість етикеток, отримання яких принтер
+    підтвердив відповіддю на ~HS після вікна. Відновлення продовжує друк з
+    неї, тому етикетки непідтвердженого вікна можуть надрукуватися повторно
+    (не більше вікна). З JOB_CONFIRM_RECEIPT=0 контрольна точка ставиться
+    після прийому байтів TCP стеком і відновлення може пропустити етикетки,
+    які загубилися в дорозі.
+    """
+
+    def __init__(self, ip: str, port: int, labels: List[str], job_id: Optional[str] = None,
+                 priority: str = PRIORITY_NORMAL):
+        self.id = job_id or uuid.uuid4().hex
+        self.ip = ip
+        self.port = port
+        self.labels = labels
+        self.priority = priority
+        # Для історії друку: джерело (job або merge) та походження запиту
+        self.kind = KIND_JOB
+        self.origin: Optional[str] = None
+        self.client: Optional[str] = None
+        # Скільки вхідних етикеток замінює кожна етикетка завдання (None - без об'єднання в ^PQ,
+        # див. collapse_repeated_labels)
+        self.copies: Optional[List[int]] = None
+        # Чекати після відправки, поки принтер надрукує (див. app/confirm.py)
+        self.confirm = False
+        self.confirmation: Optional[Dict[str, Any]] = None
+        # Чи журналюється завдання в spool (див. submit)
+        self.durable = True
+        # Викликається зі станом (to_dict) після кожної зміни завдання
+        self.listener: Optional[Callable[[Dict[str, Any]], None]] = None
+        # Причина скасування (див. JobManager.cancel)
+        self.cancelled: Optional[str] = None
+        self.acked = 0
+        self.status = STATUS_QUEUED
+        self.error: Optional[str] = None
+        self.attempts = 0
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        # Коли на принтер пішла перша етикетка (затримка в черзі = started_at - created_at)
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.version = 0
+
+    @property
+    def total(self) -> int:
+        return len(self.labels)
+
+    @property
+    def collapsed(self) -> int:
+        """Скільки однакових етикеток прибрано об'єднанням в ^PQ"""
+        return sum(self.copies) - self.total if self.copies else 0
+
+    def expanded(self, count: int) -> int:
+        """Скільки вхідних етикеток становлять перші count етикеток завдання"""
+        return sum(self.copies[:count]) if self.copies else count
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Повертає стан завдання для API (без самих етикеток)"""
+        return {
+            "job_id": self.id,
+            "ip": self.ip,
+            "port": self.port,
+            "status": self.status,
+            "priority": self.priority,
+            "total": self.total,
+            "acked": self.acked,
+            "remaining": self.total - self.acked,
+            "collapsed": self.collapsed,
+            # Те саме в етикетках запиту (до об'єднання в ^PQ)
+            "source_total": self.expanded(self.total),
+            "source_acked": self.expanded(self.acked),
+            "attempts": self.attempts,
+            "error": self.error,
+            "created_at": _isoformat(self.created_at),
+            "updated_at": _isoformat(self.updated_at),
+            "started_at": _isoformat(self.started_at),
+            "finished_at": _isoformat(self.finished_at),
+            "confirmation": self.confirmation
+        }
+
+
+class _LatencyStats:
+    """Затримки завершених завдань одного пріоритету (в секундах)"""
+
+    def __init__(self):
+        self.jobs = 0
+        self.failed = 0
+        self.labels = 0
+        # (очікування в черзі, час до завершення) останніх завдань
+        self.samples: 'collections.deque[Tuple[float, float]]' = collections.deque(maxlen=LATENCY_SAMPLES)
+        # Час від прийому до фактичного друку завдань з підтвердженням
+        self.unconfirmed = 0
+        self.printed: 'collections.deque[float]' = collections.deque(maxlen=LATENCY_SAMPLES)
+
+    def add(self, job: PrintJob):
+        self.jobs += 1
+        self.labels += job.expanded(job.total)
+        if job.status == STATUS_FAILED:
+            self.failed += 1
+            return
+        started = job.started_at or job.finished_at
+        self.samples.append((started - job.created_at, job.finished_at - job.created_at))
+
+    def add_confirmation(self, confirmation: Dict[str, Any]):
+        if confirmation['time_to_printed'] is None:
+            self.unconfirmed += 1
+        else:
+            self.printed.append(confirmation['time_to_printed'])
+
+    def to_dict(self) -> Dict[str, Any]:
+        waits = sorted(sample[0] for sample in self.samples)
+        totals = sorted(sample[1] for sample in self.samples)
+        return {
+            "jobs": self.jobs,
+            "failed": self.failed,
+            "labels": self.labels,
+            "samples": len(self.samples),
+            "queue_wait": _percentiles(waits),
+            "completion": _percentiles(totals),
+            "printed": len(self.printed),
+            "unconfirmed": self.unconfirmed,
+            "time_to_printed": _percentiles(sorted(self.printed))
+        }
+
+
+def _percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    """p50/p95/max відсортованого списку (None, якщо даних немає)"""
+    if not values:
+        return {"p50": None, "p95": None, "max": None}
+
+    def pick(fraction: float) -> float:
+        return round(values[min(len(values) - 1, int(fraction * len(values)))], 4)
+
+    return {"p50": pick(0.5), "p95": pick(0.95), "max": round(values[-1], 4)}
+
+
+class _PrinterWorker(threading.Thread):
+    """
+    Потік, що послідовно виконує завдання для одного принтера
+
+    Черга впорядкована за пріоритетом, а в межах пріоритету - за часом
+    постановки. Завдання high, поставлене під час друку завдання normal,
+    виконується на межі наступної етикетки через те саме з'єднання.
+    """
+
+    def __init__(self, manager: 'JobManager', ip: str, port: int):
+        super().__init__(name=f"printer-{ip}:{port}", daemon=True)
+        self.manager = manager
+        self.key = (ip, port)
+        self.jobs: 'queue.PriorityQueue[Tuple[int, int, PrintJob]]' = queue.PriorityQueue()
+        self._sequence = itertools.count()
+
+    def put(self, job: PrintJob):
+        rank = 0 if job.priority == PRIORITY_HIGH else 1
+        self.jobs.put((rank, next(self._sequence), job))
+
+    def take_urgent(self) -> Optional[PrintJob]:
+        """Забирає з черги завдання high, якщо воно є"""
+        with self.jobs.mutex:
+            # Швидка перевірка без виклику get() - виконується після кожної етикетки
+            if not self.jobs.queue or self.jobs.queue[0][0] != 0:
+                return None
+        try:
+            return self.jobs.get_nowait()[2]
+        except queue.Empty:
+            return None
+
+    def run(self):
+        while True:
+            try:
+                job = self.jobs.get(timeout=WORKER_IDLE_TIMEOUT)[2]
+            except queue.Empty:
+                # Завершуємо потік лише якщо під замком черга досі порожня
+                with self.manager._lock:
+                    if self.jobs.empty():
+                        self.manager._workers.pop(self.key, None)
+                        return
+                continue
+
+            try:
+                self.manager._run_job(job, self)
+            except Exception as e:
+                logger.error(f"Помилка виконання завдання {job.id}: {str(e)}", exc_info=True)
+
+
+class JobManager:
+    """
+    Менеджер завдань друку
+
+    Для кожного принтера створюється окремий потік, тому завдання на один
+    принтер виконуються по черзі, а на різні - паралельно. Стан завдань
+    дублюється в спільне сховище (state), тому його може повернути будь-який
+    процес чи репліка сервера.
+    """
+
+    def __init__(self, window_size: int = JOB_WINDOW_SIZE, spool: Optional[Spool] = None,
+                 state: Optional[StateBackend] = None):
+        self.window_size = max(1, window_size)
+        self.spool = spool
+        self.state = state
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._jobs: Dict[str, PrintJob] = {}
+        self._workers: Dict[Tuple[str, int], _PrinterWorker] = {}
+        self._latency: Dict[str, _LatencyStats] = {priority: _LatencyStats() for priority in PRIORITIES}
+
+    def submit(self, ip: str, port: int, zpl: Optional[str] = None,
+               labels: Optional[List[str]] = None, priority: str = PRIORITY_NORMAL,
+               kind: str = KIND_JOB, origin: Optional[str] = None, client: Optional[str] = None,
+               confirm: bool = False, durable: bool = True,
+               listener: Optional[Callable[[Dict[str, Any]], None]] = None) -> PrintJob:
+        """
+        Створює завдання та ставить його в чергу принтера
+
+        Args:
+            ip: IP-адреса принтера
+            port: Порт принтера
+            zpl: ZPL потік, який буде розбито на етикетки по ^XA…^XZ
+            labels: Або готовий список етикеток
+            priority: PRIORITY_NORMAL або PRIORITY_HIGH (друкується на межі наступної
+                етикетки поточного завдання normal)
+            kind, origin, client: Джерело та походження запиту для історії друку
+            confirm: Після відправки чекати, поки принтер надрукує (поле confirmation)
+            durable: False - не журналювати завдання: після перезапуску процесу воно не
+                відтворюється (канал /ws/print, що скасовує друк при обриві з'єднання)
+            listener: Викликається зі станом завдання (to_dict) після кожної зміни, у
+                потоці, що її зробив
+
+        Returns:
+            PrintJob: Створене завдання
+        """
+        if labels is None:
+            labels = split_labels(zpl or '')
+        else:
+            labels = [label for label in labels if label and label.strip()]
+
+        copies = None
+        if JOB_COLLAPSE_REPEATS:
+            # Серії не довші за вікно: між ними можна вставити завдання high
+            labels, copies = collapse_repeated_labels(labels, max_copies=self.window_size)
+            if sum(copies) == len(labels):
+                copies = None
+
+        job = PrintJob(ip, port, labels, priority=priority)
+        job.copies = copies
+        job.kind, job.origin, job.client = kind, origin, client
+        job.confirm = confirm
+        job.durable, job.listener = durable, listener
+        if self._spool(job):
+            # Завдання підтверджується клієнту лише після запису на диск
+            self.spool.journal_accept(job.id, ip, port, labels, copies=copies, priority=priority)
+
+        # Стан записується до постановки в чергу, щоб не перезаписати новіший стан потоку принтера
+        self._store(self._record(job))
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+            self._enqueue(job)
+
+        logger.info(f"Створено завдання {job.id} для {ip}:{port} ({job.total} етикеток"
+                    + (f", {job.collapsed} однакових об'єднано в ^PQ" if job.collapsed else "")
+                    + (", пріоритет high)" if priority == PRIORITY_HIGH else ")"))
+        return job
+
+    def recover(self) -> int:
+        """
+        Відтворює незавершені завдання з журналів процесів, що завершилися
+
+        Автоматично відтворюються лише завдання, перервані завершенням процесу.
+        Невдалі завдання відновлюються зі статусом failed і чекають явного
+        /resume, доки не мине JOB_RETENTION_SECONDS.
+
+        Returns:
+            int: Кількість відновлених завдань
+        """
+        if not self.spool:
+            return 0
+
+        records = self.spool.open()
+        with self._lock:
+            for record in records:
+                job = PrintJob(record['ip'], record['port'], record['labels'], job_id=record['job_id'],
+                               priority=record.get('priority', PRIORITY_NORMAL))
+                job.acked = min(record.get('acked', 0), job.total)
+                job.copies = record.get('copies')
+                if 'failed_at' in record:
+                    job.status, job.error = STATUS_FAILED, record.get('error')
+                    job.finished_at = record['failed_at']
+                self._jobs[job.id] = job
+                self._store(self._record(job))
+                if job.status == STATUS_FAILED:
+                    logger.info(f"Невдале завдання {job.id} для {job.ip}:{job.port} доступне для /resume "
+                                f"з етикетки {job.acked + 1} з {job.total}")
+                    continue
+                self._enqueue(job)
+                logger.info(f"Відновлено завдання {job.id} для {job.ip}:{job.port} "
+                            f"з етикетки {job.acked + 1} з {job.total}")
+        return len(records)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Повертає стан завдання або None, якщо завдання не знайдено
+
+        Завдання інших процесів та реплік беруться зі спільного сховища.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job:
+                return job.to_dict()
+        record = self._load(job_id)
+        return record['job'] if record else None
+
+    def resume(self, job_id: str) -> Tuple[bool, Optional[str]]:
+        """
+        Відновлює невдале завдання з останньої контрольної точки
+
+        Returns:
+            Tuple[bool, Optional[str]]: (успіх, повідомлення про помилку)
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                if job.status != STATUS_FAILED:
+                    return False, f"Відновити можна лише завдання зі статусом '{STATUS_FAILED}', поточний статус: '{job.status}'"
+                job.cancelled = None
+                self._update(job, status=STATUS_QUEUED, finished_at=None)
+                record, state = self._record(job), job.to_dict()
+
+        if job is None:
+            record = self._load(job_id)
+            if record is None:
+                return False, f"Завдання {job_id} не знайдено"
+            # Етикетки завдання зберігаються лише в процесі, що його прийняв
+            return False, f"Завдання {job_id} належить іншому процесу ({record.get('owner')}), відновити його може лише він"
+
+        if self._spool(job):
+            self.spool.journal_resume(job_id)
+        self._store(record)
+        self._notify(job, state)
+        with self._lock:
+            self._enqueue(job)
+
+        logger.info(f"Відновлення завдання {job_id} з етикетки {job.acked + 1} з {job.total}")
+        return True, None
+
+    def cancel(self, job_id: str, reason: str) -> bool:
+        """
+        Скасовує незавершене завдання цього процесу
+
+        Завдання в черзі одразу стає невдалим, а завдання, що друкується,
+        зупиняється на межі наступної етикетки. Як і інше невдале завдання,
+        його можна відновити через resume.
+
+        Returns:
+            bool: False, якщо завдання не знайдено або воно вже завершилося
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status in TERMINAL_STATUSES or job.cancelled is not None:
+                return False
+            job.cancelled = reason
+            queued = job.status == STATUS_QUEUED
+        if queued:
+            # Потік принтера пропустить його (див. _start)
+            self._fail(job, reason)
+        return True
+
+    def wait_for_update(self, job_id: str, version: int,
+                        timeout: float) -> Optional[Tuple[int, Dict[str, Any]]]:
+        """
+        Чекає, поки версія завдання стане відмінною від version
+
+        Returns:
+            (версія, стан завдання) - після зміни або по таймауту з поточною версією;
+            None, якщо завдання не знайдено
+        """
+        with self._changed:
+            if job_id in self._jobs:
+                self._changed.wait_for(
+                    lambda: job_id not in self._jobs or self._jobs[job_id].version != version,
+                    timeout=timeout
+                )
+                job = self._jobs.get(job_id)
+                if job:
+                    return job.version, job.to_dict()
+
+        # Завдання виконує інший процес - опитуємо спільне сховище
+        deadline = time.monotonic() + timeout
+        while True:
+            record = self._load(job_id)
+            if record is None:
+                return None
+            remaining = deadline - time.monotonic()
+            if record['version'] != version or remaining <= 0:
+                return record['version'], record['job']
+            time.sleep(min(JOB_STATE_POLL_INTERVAL, remaining))
+
+    def wait(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """
+        Чекає завершення завдання цього процесу
+
+        Returns:
+            Стан завдання (можливо незавершеного, якщо минув timeout) або None
+        """
+        with self._changed:
+            self._changed.wait_for(
+                lambda: job_id not in self._jobs or self._jobs[job_id].status in TERMINAL_STATUSES,
+                timeout=timeout
+            )
+            job = self._jobs.get(job_id)
+            return job.to_dict() if job else None
+
+    def is_busy(self, ip: str, port: int) -> bool:
+        """Чи друкує або має в черзі цей процес завдання для принтера"""
+        with self._lock:
+            return any(job.ip == ip and job.port == port and job.status in (STATUS_QUEUED, STATUS_PRINTING)
+                       for job in self._jobs.values())
+
+    def latency(self) -> Dict[str, Any]:
+        """Затримки завершених завдань окремо для кожного пріоритету"""
+        with self._lock:
+            return {priority: stats.to_dict() for priority, stats in self._latency.items()}
+
+    def drain(self, timeout: float) -> bool:
+        """
+        Чекає, поки всі завдання в черзі та в друку завершаться
+
+        Returns:
+            bool: False, якщо за timeout залишилися незавершені завдання
+        """
+        with self._changed:
+            return self._changed.wait_for(
+                lambda: all(job.status not in (STATUS_QUEUED, STATUS_PRINTING) for job in self._jobs.values()),
+                timeout=timeout
+            )
+
+    def _enqueue(self, job: PrintJob):
+        """Ставить завдання в чергу потоку принтера (викликається під замком)"""
+        key = (job.ip, job.port)
+        worker = self._workers.get(key)
+        if worker is None:
+            worker = _PrinterWorker(self, job.ip, job.port)
+            self._workers[key] = worker
+            worker.start()
+        worker.put(job)
+
+    def _update(self, job: PrintJob, **changes):
+        """Оновлює поля завдання та сповіщає підписників (викликається під замком)"""
+        for name, value in changes.items():
+            setattr(job, name, value)
+        job.updated_at = time.time()
+        job.version += 1
+        self._changed.notify_all()
+
+    def _publish(self, job: PrintJob, **changes):
+        """
+        Оновлює завдання під замком та сповіщає підписників цього процесу
+
+        У спільне сховище стан записується лише при зміні статусу чи
+        підтвердження друку, а не після кожного вікна етикеток.
+        """
+        with self._lock:
+            self._update(job, **changes)
+            record, state = self._record(job), job.to_dict()
+        if 'status' in changes or 'confirmation' in changes:
+            self._store(record)
+        self._notify(job, state)
+
+    def _start(self, job: PrintJob) -> bool:
+        """
+        Позначає завдання як таке, що друкується
+
+        Returns:
+            bool: False, якщо завдання скасовано в черзі або запис у черзі застарів:
+            скасоване та відновлене завдання стоїть у черзі двічі, і друкується лише один раз
+        """
+        with self._lock:
+            if job.cancelled is not None or job.status != STATUS_QUEUED:
+                return False
+            self._update(job, status=STATUS_PRINTING, error=None, attempts=job.attempts + 1)
+            record, state = self._record(job), job.to_dict()
+        self._store(record)
+        self._notify(job, state)
+        return True
+
+    def _notify(self, job: PrintJob, state: Dict[str, Any]):
+        """Передає стан завдання його listener (поза замком)"""
+        if job.listener is None:
+            return
+        try:
+            job.listener(state)
+        except Exception as e:
+            logger.error(f"Помилка обробки стану завдання {job.id}: {str(e)}", exc_info=True)
+
+    def _spool(self, job: PrintJob) -> Optional[Spool]:
+        """Журнал завдання або None, якщо завдання не журналюється"""
+        return self.spool if job.durable else None
+
+    def _record(self, job: PrintJob) -> Dict[str, Any]:
+        """Формує запис спільного стану завдання (викликається під замком)"""
+        return {"job": job.to_dict(), "version": job.version, "owner": self.owner}
+
+    def _store(self, record: Dict[str, Any]):
+        """Записує стан завдання у спільне сховище; помилка сховища не зупиняє друк"""
+        if not self.state:
+            return
+        try:
+            self.state.set(f"job:{record['job']['job_id']}", record, ttl=JOB_RETENTION_SECONDS)
+        except Exception as e:
+            logger.warning(f"Не вдалося записати стан завдання {record['job']['job_id']}: {str(e)}")
+
+    def _load(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Читає стан завдання зі спільного сховища"""
+        if not self.state:
+            return None
+        try:
+            return self.state.get(f"job:{job_id}")
+        except ValueError:
+            # Ідентифікатор, який не може бути ключем сховища
+            return None
+        except Exception as e:
+            logger.warning(f"Не вдалося прочитати стан завдання {job_id}: {str(e)}")
+            return None
+
+    def _checkpoint(self, job: PrintJob, acked: int):
+        """Записує контрольну точку після підтвердженого вікна етикеток"""
+        with self._lock:
+            job.acked = acked
+        if self._spool(job):
+            self.spool.journal_ack(job.id, acked)
+
+    def _run_job(self, job: PrintJob, worker: _PrinterWorker, sock: Optional[socket.socket] = None):
+        """
+        Відправляє етикетки завдання, починаючи з контрольної точки
+
+        Після кожного вікна надсилає ~HS у те саме з'єднання: команди з тильдою
+        принтер виконує одразу після отримання, тому відповідь означає, що всі
+        етикетки вікна він отримав, і лише тоді вікно стає контрольною точкою.
+
+        Після кожної етикетки завдання normal перевіряє чергу принтера: завдання
+        high виконуються одразу через те саме з'єднання (sock), після чого друк
+        продовжується з наступної етикетки.
+        """
+        if not self._start(job):
+            return
+
+        shaper = get_printer_shaper(job.ip, job.port)
+        own_sock = sock is None
+        try:
+            if own_sock:
+                logger.info(f"Завдання {job.id}: підключення до {job.ip}:{job.port}, "
+                            f"етикетки {job.acked + 1}-{job.total}")
+                sock = connect_to_printer(job.ip, job.port)
+            auto_tune = shaper.auto_tune
+            preemptible = job.priority != PRIORITY_HIGH
+            if job.started_at is None:
+                self._publish(job, started_at=time.time())
+
+            host_status = None
+            while job.acked < job.total:
+                window_end = min(job.acked + self.window_size, job.total)
+                for index in range(job.acked, window_end):
+                    if job.cancelled is not None:
+                        raise _JobCancelled()
+                    data = job.labels[index].encode('utf-8')
+                    shaper.acquire(1, len(data))
+                    sock.sendall(data)
+                    if preemptible and index + 1 < job.total:
+                        self._run_urgent(job, worker, sock)
+
+                host_status = None
+                last_window = window_end == job.total
+                # Для підтвердження друку стан після останнього вікна потрібен і без JOB_CONFIRM_RECEIPT:
+                # це перше спостереження етикеток завдання в буфері принтера (див. _confirm)
+                if JOB_CONFIRM_RECEIPT or (auto_tune and not last_window) or (job.confirm and last_window):
+                    # Принтер, зайнятий друком, може відповісти не одразу
+                    host_status = read_host_status(sock, SEND_TIMEOUT if JOB_CONFIRM_RECEIPT else STATUS_TIMEOUT)
+                    if host_status is None and JOB_CONFIRM_RECEIPT:
+                        raise socket.timeout(f"принтер не підтвердив отримання етикеток "
+                                             f"{job.acked + 1}-{window_end}")
+                self._checkpoint(job, window_end)
+                self._publish(job)
+
+                if auto_tune and not last_window:
+                    # Підлаштовуємо швидкість за заповненням буфера принтера
+                    if host_status is None:
+                        logger.warning(f"Принтер {job.ip}:{job.port} не відповідає на ~HS, "
+                                       f"автопідбір швидкості вимкнено для завдання {job.id}")
+                        auto_tune = False
+                    else:
+                        shaper.feedback(host_status)
+
+            self._publish(job, status=STATUS_COMPLETED, finished_at=time.time())
+            self._finished(job)
+            if self._spool(job):
+                self.spool.journal_done(job.id)
+            logger.info(f"Завдання {job.id} завершено ({job.total} етикеток)")
+            if job.confirm:
+                self._confirm(job, host_status)
+
+        except _JobCancelled:
+            self._fail(job, job.cancelled)
+
+        except socket.timeout as e:
+            self._fail(job, f"Таймаут з'єднання з принтером {job.ip}:{job.port}: {str(e)}")
+
+        except socket.error as e:
+            self._fail(job, f"Помилка з'єднання з принтером {job.ip}:{job.port}: {str(e)}")
+
+        except Exception as e:
+            logger.error(f"Невідома помилка в завданні {job.id}", exc_info=True)
+            self._fail(job, f"Невідома помилка при відправці на {job.ip}:{job.port}: {str(e)}")
+
+        finally:
+            if sock and own_sock:
+                try:
+                    sock.close()
+                except Exception as e:
+                    logger.warning(f"Помилка при закритті socket: {str(e)}")
+
+    def _run_urgent(self, job: PrintJob, worker: _PrinterWorker, sock: socket.socket):
+        """Виконує завдання high, що чекають у черзі принтера, між етикетками завдання job"""
+        urgent = worker.take_urgent()
+        if urgent is None:
+            return
+        self._publish(job)
+        while urgent is not None:
+            logger.info(f"Завдання {urgent.id} (high) вставлено після етикетки {job.acked} "
+                        f"з {job.total} завдання {job.id}")
+            self._run_job(urgent, worker, sock)
+            urgent = worker.take_urgent()
+
+    def _fail(self, job: PrintJob, error_msg: str):
+        """Позначає завдання як невдале, зберігаючи контрольну точку"""
+        logger.error(f"Завдання {job.id}: {error_msg} (підтверджено {job.acked} з {job.total})")
+        if self._spool(job):
+            self.spool.journal_fail(job.id, error_msg)
+        self._publish(job, status=STATUS_FAILED, error=error_msg, finished_at=time.time())
+        self._finished(job)
+
+    def _finished(self, job: PrintJob):
+        """Додає завершене завдання до статистики затримок та історії друку"""
+        with self._lock:
+            self._latency[job.priority].add(job)
+        record_print(
+            job.ip, job.port, job.status, kind=job.kind, job_id=job.id, priority=job.priority,
+            labels=job.expanded(job.acked), nbytes=sum(len(label.encode('utf-8')) for label in job.labels[:job.acked]),
+            created_at=job.created_at, started_at=job.started_at, finished_at=job.finished_at,
+            error=job.error, origin=job.origin, client=job.client
+        )
+
+    def _confirm(self, job: PrintJob, host_status: Optional[Dict[str, Any]] = None):
+        """
+        Починає чекати фактичного друку завдання (потік принтера не блокується)
+
+        host_status - відповідь на ~HS після останнього вікна: якщо етикетки ще
+        в буфері принтера, це вже перше спостереження для підтвердження.
+        """
+        confirmation = get_confirmer().watch(job.ip, job.port, created_at=job.created_at,
+                                             callback=lambda result: self._confirmed(job, result),
+                                             host_status=host_status)
+        self._publish(job, confirmation=confirmation.to_dict())
+
+    def _confirmed(self, job: PrintJob, confirmation: Dict[str, Any]):
+        """Записує результат підтвердження друку (викликається потоком PrintConfirmer)"""
+        with self._lock:
+            self._latency[job.priority].add_confirmation(confirmation)
+        self._publish(job, confirmation=confirmation)
+
+    def _prune(self):
+        """Видаляє старі завершені завдання (викликається під замком)"""
+        threshold = time.time() - JOB_RETENTION_SECONDS
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.status in TERMINAL_STATUSES and job.finished_at and job.finished_at < threshold
+        ]
+        for job_id in expired:
+            job = self._jobs.pop(job_id)
+            if self._spool(job) and job.status == STATUS_FAILED:
+                # Невдале завдання більше не можна відновити - прибираємо його з журналу
+                self.spool.journal_done(job_id)
+
+
+_job_manager: Optional[JobManager] = None
+_job_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    """Повертає спільний для процесу менеджер завдань"""
+    global _job_manager
+    with _job_manager_lock:
+        if _job_manager is None:
+            spool = None
+            if is_spool_enabled():
+                spool = Spool(get_spool_dir())
+            _job_manager = JobManager(spool=spool, state=get_state_backend())
+            try:
+                _job_manager.recover()
+            except Exception as e:
+                logger.error(f"Помилка відкриття журналу завдань, журналювання вимкнено: {str(e)}",
+                             exc_info=True)
+                _job_manager.spool = None
+        return _job_manager
+
+
+def is_printer_busy(ip: str, port: int) -> bool:
+    """Чи друкує цей процес на принтер (без створення менеджера завдань)"""
+    manager = _job_manager
+    return manager.is_busy(ip, port) if manager else False
+
+
+def drain_jobs(timeout: float) -> bool:
+    """Чекає завершення активних завдань процесу (якщо менеджер вже створено)"""
+    manager = _job_manager
+    return manager.drain(timeout) if manager else True
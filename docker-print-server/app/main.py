@@ -1,12 +1,33 @@
+import functools
+import json
 import logging
 import os
+import re
+import time
 import subprocess
+from datetime import datetime
 from pathlib import Path
-from flask import Flask, request, jsonify
-import docker
-from app.printer import send_zpl_to_printer, scan_printers
+from typing import Optional
+from flask import Flask, Response, request, jsonify, stream_with_context
+from app.printer import (send_zpl_to_printer, scan_printers, parse_printer_address, SEND_TIMEOUT,
+                         DISCOVERY_PORTS)
+from app.jobs import (get_job_manager, TERMINAL_STATUSES, STATUS_COMPLETED, STATUS_FAILED,
+                      PRIORITIES, PRIORITY_NORMAL, PRIORITY_HIGH)
+from app.zpl import split_document, parse_zpl, validate_zpl, ZPL_VALIDATION
 from app.config import load_config, save_config, validate_config
-from app.scan_data import load_scan_data, update_scan_data
+from app.rate_limit import get_rate_limits_status
+from app.scan_data import update_scan_data
+from app.inventory import get_registry, start_inventory_maintainer, UNREACHABLE_FAIL_FAST_SECONDS
+from app.ssl_renew import start_renewal, get_renewal
+from app.tls import get_tls_status
+from app.idempotency import idempotent
+from app.merge import (compile_template, detect_rows_format, iter_csv_rows, iter_ndjson_rows,
+                       MergeError, MergeLimitError)
+from app.channel import PrintChannel, SOCK_SERVER_OPTIONS
+from app.history import (get_history, record_print, parse_cursor, KIND_PRINT, KIND_MERGE,
+                         HISTORY_DEFAULT_PAGE_SIZE, HISTORY_MAX_PAGE_SIZE)
+from app.profiling import init_profiling, PROFILE_TOKEN_HEADER, PROFILE_ID_HEADER
+from app.confirm import confirm_metrics
 
 # Налаштування логування
 logging.basicConfig(
@@ -40,11 +61,41 @@ ALLOWED_ORIGINS = [
 CORS(app, 
      origins=ALLOWED_ORIGINS,
      methods=["GET", "POST", "OPTIONS"],
-     allow_headers=["Content-Type", "Authorization", "Accept", "X-Requested-With"],
-     expose_headers=["Content-Type"],
+     allow_headers=["Content-Type", "Authorization", "Accept", "X-Requested-With", "Idempotency-Key",
+                    PROFILE_TOKEN_HEADER],
+     expose_headers=["Content-Type", "Idempotent-Replayed", PROFILE_ID_HEADER],
      supports_credentials=False,
      max_age=3600)
 
+# WebSocket канал друку (/ws/print)
+from flask_sock import Sock
+
+app.config['SOCK_SERVER_OPTIONS'] = SOCK_SERVER_OPTIONS
+sock = Sock(app)
+
+# Профілювання запитів (лише якщо задано PROFILING_TOKEN)
+init_profiling(app)
+
+
+@functools.lru_cache(maxsize=None)
+def _x509():
+    """Імпортує cryptography при першому використанні (потрібен лише для /api/ssl-status)"""
+    from cryptography import x509
+    from cryptography.hazmat.backends import default_backend
+    return x509, default_backend
+
+
+def start_background_services():
+    """
+    Запускає фонові служби процесу (один раз на процес)
+
+    Відтворює незавершені завдання з журналу друку та запускає підтримку
+    реєстру принтерів. З GUNICORN_PRELOAD=1 викликається з хука post_fork
+    у кожному worker, а не в master, бо потоки та flock не переживають fork.
+    """
+    get_job_manager()
+    start_inventory_maintainer()
+
 
 @app.route('/')
 def index():
@@ -54,6 +105,7 @@ def index():
 
 
 @app.route('/api/print', methods=['POST'])
+@idempotent
 def print_endpoint():
     """
     Endpoint для відправки ZPL на принтер
@@ -62,9 +114,15 @@ def print_endpoint():
     {
         "IP": "192.168.1.100",
         "PORT": 9100,
-        "ZPL": "^XA^FO50,50^ADN,36,20^FDHello World^FS^XZ"
+        "ZPL": "^XA^FO50,50^ADN,36,20^FDHello World^FS^XZ",
+        "PRIORITY": "normal",  // необов'язково: "high" - не чекати завершення масового завдання
+        "CONFIRM": false       // необов'язково: true - друкувати завданням і стежити за фактичним друком
     }
+
+    З CONFIRM відповідає одразу кодом 202 зі станом завдання; результат
+    підтвердження - поле confirmation у GET /api/jobs/<job_id>.
     """
+    received_at = time.time()
     try:
         # Перевірка Content-Type
         if not request.is_json:
@@ -122,15 +180,60 @@ def print_endpoint():
                 "message": f"PORT повинен бути від 1 до 65535, отримано: {port}"
             }), 400
         
+        priority, error_response = _parse_priority(data)
+        if error_response:
+            return error_response
+        confirm = _parse_confirm(data)
+
+        # Структурні помилки ZPL відхиляємо до відправки на принтер
+        doc, error_response = _preflight_zpl(zpl, ip, port)
+        if error_response:
+            return error_response
+
+        # Якщо принтер щойно (UNREACHABLE_FAIL_FAST_SECONDS) не відповів на підключення,
+        # відповідаємо одразу, не чекаючи таймауту; давніший результат - лише підказка
+        registry = get_registry()
+        if registry.is_reachable(ip, port, max_age=UNREACHABLE_FAIL_FAST_SECONDS) is False:
+            printer = registry.get(ip, port) or {}
+            error_msg = f"Принтер {ip}:{port} недоступний (остання перевірка: {printer.get('last_checked')})"
+            _record_print(ip, port, zpl, doc, received_at, error_msg, priority)
+            return jsonify({
+                "status": "error",
+                "message": error_msg
+            }), 503
+        
         # Відправка на принтер
         logger.info(f"Отримано запит на друк: {ip}:{port}")
-        success, error_msg = send_zpl_to_printer(ip, port, zpl)
+        manager = get_job_manager()
+        if confirm:
+            # Потік запиту не чекає друку: підтвердження оновить завдання (історію пише завдання)
+            job = manager.submit(ip, port, labels=split_document(doc), priority=priority, kind=KIND_PRINT,
+                                 confirm=True, **_request_origin())
+            response = {
+                "status": "success",
+                "message": "ZPL поставлено в чергу принтера, підтвердження друку - в GET /api/jobs/<job_id>",
+                "job": job.to_dict()
+            }
+            if doc.warnings:
+                response["warnings"] = doc.warnings
+            return jsonify(response), 202
+
+        if priority == PRIORITY_HIGH and manager.is_busy(ip, port):
+            # Принтер зайнятий завданням цього процесу - друкуємо через його з'єднання
+            # на межі наступної етикетки, а не після всього завдання (історію пише завдання)
+            success, error_msg = _print_urgent(manager, ip, port, split_document(doc))
+        else:
+            success, error_msg = send_zpl_to_printer(ip, port, zpl)
+            _record_print(ip, port, zpl, doc, received_at, None if success else error_msg, priority)
         
         if success:
-            return jsonify({
+            response = {
                 "status": "success",
                 "message": "ZPL sent to printer successfully"
-            }), 200
+            }
+            if doc.warnings:
+                response["warnings"] = doc.warnings
+            return jsonify(response), 200
         else:
             return jsonify({
                 "status": "error",
@@ -145,6 +248,549 @@ def print_endpoint():
         }), 500
 
 
+@sock.route('/ws/print')
+def print_channel_endpoint(ws):
+    """
+    WebSocket канал друку: одне постійне з'єднання для багатьох повідомлень
+
+    Протокол повідомлень описаний в app/channel.py та README.
+    """
+    logger.info(f"Відкрито WebSocket канал друку ({request.remote_addr})")
+    PrintChannel(ws, **_request_origin()).run()
+    logger.info(f"Закрито WebSocket канал друку ({request.remote_addr})")
+
+
+@app.before_request
+def check_websocket_origin():
+    """
+    Перевіряє Origin для WebSocket
+
+    CORS не поширюється на WebSocket, тому браузер з'єднається з будь-якої
+    сторінки; приймаємо лише дозволені домени (клієнти без Origin - не браузери).
+    """
+    if request.path != '/ws/print':
+        return None
+    origin = request.headers.get('Origin')
+    if origin and origin not in ALLOWED_ORIGINS:
+        logger.warning(f"WebSocket з недозволеного Origin відхилено: {origin}")
+        return jsonify({
+            "status": "error",
+            "message": f"Origin {origin} не дозволений"
+        }), 403
+    return None
+
+
+def _request_origin() -> dict:
+    """Походження поточного запиту для історії друку"""
+    return {
+        "origin": request.headers.get('Origin') or request.headers.get('Referer'),
+        "client": request.remote_addr
+    }
+
+
+def _record_print(ip: str, port: int, zpl: str, doc, received_at: float,
+                  error_msg: Optional[str], priority: str):
+    """Записує синхронний друк /api/print в історію (лише додавання в буфер пам'яті)"""
+    record_print(
+        ip, port, STATUS_COMPLETED if error_msg is None else STATUS_FAILED,
+        kind=KIND_PRINT, priority=priority, labels=doc.printed_labels or None,
+        # Кількість символів: для ZPL (ASCII) дорівнює кількості байт, без повторного кодування
+        nbytes=len(zpl), created_at=received_at, error=error_msg, **_request_origin()
+    )
+
+
+def _print_urgent(manager, ip: str, port: int, labels):
+    """
+    Друкує етикетки як завдання high та чекає його завершення
+
+    Returns:
+        Tuple[bool, Optional[str]]: (успіх, повідомлення про помилку)
+    """
+    job = manager.submit(ip, port, labels=labels, priority=PRIORITY_HIGH, kind=KIND_PRINT,
+                         **_request_origin())
+    state = manager.wait(job.id, timeout=SEND_TIMEOUT)
+    if state and state['status'] == STATUS_COMPLETED:
+        return True, None
+    if state and state['status'] in TERMINAL_STATUSES:
+        return False, state['error']
+    return False, f"Таймаут очікування друку на {ip}:{port} (завдання {job.id} залишається в черзі)"
+
+
+@app.route('/api/print/merge', methods=['POST'])
+@idempotent
+def print_merge_endpoint():
+    """
+    Генерує етикетки з шаблону та рядків даних і друкує їх фоновим завданням
+
+    Очікує JSON:
+    {
+        "IP": "192.168.1.100",
+        "PORT": 9100,
+        "TEMPLATE": "^XA^FO50,50^ADN,36,20^FD{{name}}^FS^PQ{{qty}}^XZ",
+        "ROWS": [{"name": "Label 1", "qty": 1}, ...]
+    }
+
+    або multipart/form-data з полями IP, PORT, TEMPLATE та файлом ROWS
+    (CSV з заголовком або NDJSON), який читається потоково.
+    """
+    try:
+        if request.is_json:
+            data = request.get_json(silent=True)
+            if not data:
+                return jsonify({
+                    "status": "error",
+                    "message": "JSON дані не надані"
+                }), 400
+            rows = data.get('ROWS') or data.get('rows')
+            if not isinstance(rows, list):
+                return jsonify({
+                    "status": "error",
+                    "message": "ROWS повинен бути масивом об'єктів"
+                }), 400
+        elif request.mimetype == 'multipart/form-data':
+            data = request.form
+            rows_file = request.files.get('ROWS') or request.files.get('rows')
+            if rows_file is None:
+                return jsonify({
+                    "status": "error",
+                    "message": "Файл ROWS не вказаний"
+                }), 400
+            rows_format = detect_rows_format(rows_file.filename, rows_file.mimetype)
+            if rows_format is None:
+                return jsonify({
+                    "status": "error",
+                    "message": "Формат файлу ROWS не підтримується (очікується CSV або NDJSON)"
+                }), 400
+            rows = iter_csv_rows(rows_file.stream) if rows_format == 'csv' else iter_ndjson_rows(rows_file.stream)
+        else:
+            return jsonify({
+                "status": "error",
+                "message": "Content-Type повинен бути application/json або multipart/form-data"
+            }), 400
+
+        ip, port, error_response = _parse_printer_address(data)
+        if error_response:
+            return error_response
+
+        priority, error_response = _parse_priority(data)
+        if error_response:
+            return error_response
+
+        template = data.get('TEMPLATE') or data.get('template')
+        if not isinstance(template, str):
+            return jsonify({
+                "status": "error",
+                "message": "TEMPLATE не вказаний"
+            }), 400
+
+        try:
+            labels = compile_template(template).render_all(rows)
+        except MergeLimitError as e:
+            return jsonify({
+                "status": "error",
+                "message": f"{str(e)}; розділіть дані на кілька запитів"
+            }), 413
+        except MergeError as e:
+            return jsonify({
+                "status": "error",
+                "message": str(e)
+            }), 400
+
+        doc, error_response = _preflight_zpl(''.join(labels), ip, port)
+        if error_response:
+            return error_response
+
+        job = get_job_manager().submit(ip, port, labels=labels, priority=priority, kind=KIND_MERGE,
+                                       confirm=_parse_confirm(data), **_request_origin())
+        response = {
+            "status": "success",
+            "rows": len(labels),
+            "job": job.to_dict()
+        }
+        if doc.warnings:
+            response["warnings"] = doc.warnings
+        return jsonify(response), 202
+
+    except Exception as e:
+        logger.error(f"Помилка в /api/print/merge: {str(e)}", exc_info=True)
+        return jsonify({
+            "status": "error",
+            "message": f"Internal server error: {str(e)}"
+        }), 500
+
+
+def _parse_printer_address(data):
+    """
+    Витягує та валідує IP і PORT принтера з JSON запиту
+
+    Returns:
+        (ip, port, None) або (None, None, (response, status)) при помилці
+    """
+    ip, port, error_msg = parse_printer_address(data)
+    if error_msg:
+        return None, None, (jsonify({
+            "status": "error",
+            "message": error_msg
+        }), 400)
+    return ip, port, None
+
+
+def _parse_confirm(data) -> bool:
+    """Чи запитано підтвердження друку (CONFIRM: true, також "1"/"true" з форми)"""
+    value = data.get('CONFIRM', data.get('confirm'))
+    return str(value).lower() in ('1', 'true')
+
+
+def _parse_priority(data):
+    """
+    Витягує пріоритет друку (PRIORITY: "normal" або "high") з запиту
+
+    Returns:
+        (priority, None) або (None, (response, status)) при помилці
+    """
+    priority = data.get('PRIORITY') or data.get('priority') or PRIORITY_NORMAL
+    if priority not in PRIORITIES:
+        return None, (jsonify({
+            "status": "error",
+            "message": f"PRIORITY повинен бути одним з: {', '.join(PRIORITIES)}, отримано: {priority}"
+        }), 400)
+    return priority, None
+
+
+def _preflight_zpl(zpl: str, ip: str, port: int):
+    """
+    Перевіряє ZPL перед відправкою з урахуванням ширини друку принтера з реєстру
+
+    Returns:
+        (ZplDocument, None) або (ZplDocument, (response, status)), якщо ZPL містить помилки
+    """
+    printer = get_registry().get(ip, port) or {}
+    doc = validate_zpl(zpl, printer.get('print_width'), printer.get('label_length'))
+    if doc.ok:
+        return doc, None
+    logger.warning(f"ZPL для {ip}:{port} відхилено: {'; '.join(doc.errors[:3])}")
+    return doc, (jsonify({
+        "status": "error",
+        "message": "ZPL містить структурні помилки: " + "; ".join(doc.errors[:3]),
+        "errors": doc.errors,
+        "warnings": doc.warnings
+    }), 400)
+
+
+@app.route('/api/jobs', methods=['POST'])
+@idempotent
+def create_job_endpoint():
+    """
+    Створює завдання друку, яке розбивається на етикетки по ^XA…^XZ
+    та відправляється у фоні з контрольною точкою після кожної етикетки
+
+    Очікує JSON:
+    {
+        "IP": "192.168.1.100",
+        "PORT": 9100,
+        "ZPL": "^XA...^XZ^XA...^XZ",  // або "LABELS": ["^XA...^XZ", ...]
+        "PRIORITY": "normal",          // необов'язково: "high" - на межі наступної етикетки
+        "CONFIRM": false               // необов'язково: true - стежити за фактичним друком (confirmation)
+    }
+    """
+    try:
+        if not request.is_json:
+            return jsonify({
+                "status": "error",
+                "message": "Content-Type повинен бути application/json"
+            }), 400
+
+        data = request.get_json()
+
+        if not data:
+            return jsonify({
+                "status": "error",
+                "message": "JSON дані не надані"
+            }), 400
+
+        ip, port, error_response = _parse_printer_address(data)
+        if error_response:
+            return error_response
+
+        priority, error_response = _parse_priority(data)
+        if error_response:
+            return error_response
+
+        zpl = data.get('ZPL') or data.get('zpl')
+        labels = data.get('LABELS') or data.get('labels')
+
+        if labels is not None and (not isinstance(labels, list)
+                                   or not all(isinstance(label, str) for label in labels)):
+            return jsonify({
+                "status": "error",
+                "message": "LABELS повинен бути масивом рядків"
+            }), 400
+
+        if not zpl and not labels:
+            return jsonify({
+                "status": "error",
+                "message": "ZPL команди не вказані"
+            }), 400
+
+        doc, error_response = _preflight_zpl(zpl if labels is None else ''.join(labels), ip, port)
+        if error_response:
+            return error_response
+
+        if labels is None:
+            labels = split_document(doc)
+        labels = [label for label in labels if label.strip()]
+        if not labels:
+            return jsonify({
+                "status": "error",
+                "message": "Не знайдено етикеток для друку"
+            }), 400
+
+        job = get_job_manager().submit(ip, port, labels=labels, priority=priority,
+                                       confirm=_parse_confirm(data), **_request_origin())
+        response = {
+            "status": "success",
+            "job": job.to_dict()
+        }
+        if doc.warnings:
+            response["warnings"] = doc.warnings
+        return jsonify(response), 202
+
+    except Exception as e:
+        logger.error(f"Помилка в /api/jobs: {str(e)}", exc_info=True)
+        return jsonify({
+            "status": "error",
+            "message": f"Internal server error: {str(e)}"
+        }), 500
+
+
+RELATIVE_TIME_RE = re.compile(r'^(\d+(?:\.\d+)?)([smhd])$')
+RELATIVE_TIME_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def _parse_time_arg(name: str) -> Optional[float]:
+    """
+    Повертає unix час для параметра запиту або None, якщо не вказаний
+
+    Приймає ISO дату (2025-11-10T18:00:00), unix час або тривалість
+    назад від поточного моменту (30m, 1h, 7d).
+
+    Raises:
+        ValueError: Якщо значення некоректне
+    """
+    value = request.args.get(name)
+    if not value:
+        return None
+    match = RELATIVE_TIME_RE.match(value)
+    if match:
+        return time.time() - float(match.group(1)) * RELATIVE_TIME_UNITS[match.group(2)]
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs_endpoint():
+    """
+    Історія друку з фільтрами та посторінковою видачею
+
+    Параметри запиту: printer=<ip або ip:port>, since=, until= (ISO дата, unix час
+    або 30m/1h/7d), status=completed|failed, kind=print|job|merge|ws,
+    limit=<1-500>, cursor=<next_cursor попередньої сторінки>
+    """
+    history = get_history()
+    if history is None:
+        return jsonify({
+            "status": "error",
+            "message": "Історію друку вимкнено (HISTORY_DISABLE=1)"
+        }), 404
+
+    try:
+        since = _parse_time_arg('since')
+        until = _parse_time_arg('until')
+    except ValueError:
+        return jsonify({
+            "status": "error",
+            "message": "since та until повинні бути ISO датою, unix часом або тривалістю (30m, 1h, 7d)"
+        }), 400
+
+    try:
+        limit = int(request.args.get('limit', HISTORY_DEFAULT_PAGE_SIZE))
+    except ValueError:
+        limit = 0
+    if limit < 1 or limit > HISTORY_MAX_PAGE_SIZE:
+        return jsonify({
+            "status": "error",
+            "message": f"limit повинен бути від 1 до {HISTORY_MAX_PAGE_SIZE}"
+        }), 400
+
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            cursor = parse_cursor(cursor)
+        except ValueError:
+            return jsonify({
+                "status": "error",
+                "message": "Некоректний cursor"
+            }), 400
+
+    try:
+        jobs, next_cursor = history.query(
+            printer=request.args.get('printer'),
+            status=request.args.get('status'),
+            kind=request.args.get('kind'),
+            since=since,
+            until=until,
+            limit=limit,
+            cursor=cursor or None
+        )
+    except Exception as e:
+        logger.error(f"Помилка читання історії друку: {str(e)}", exc_info=True)
+        return jsonify({
+            "status": "error",
+            "message": f"Failed to read print history: {str(e)}"
+        }), 500
+
+    return jsonify({
+        "status": "success",
+        "jobs": jobs,
+        "count": len(jobs),
+        "next_cursor": next_cursor
+    }), 200
+
+
+@app.route('/api/zpl/validate', methods=['POST'])
+def validate_zpl_endpoint():
+    """
+    Перевіряє ZPL без друку та повертає характеристики кожної етикетки
+
+    Очікує JSON:
+    {
+        "ZPL": "^XA...^XZ",
+        "IP": "192.168.1.100",   // необов'язково: порівняти ^PW/^LL з принтером
+        "PORT": 9100
+    }
+    """
+    try:
+        data = request.get_json(silent=True)
+        if not data:
+            return jsonify({
+                "status": "error",
+                "message": "JSON дані не надані"
+            }), 400
+
+        zpl = data.get('ZPL') or data.get('zpl')
+        if not zpl or not isinstance(zpl, str):
+            return jsonify({
+                "status": "error",
+                "message": "ZPL команди не вказані"
+            }), 400
+
+        printer = {}
+        ip = data.get('IP') or data.get('ip')
+        if ip:
+            ip, port, error_response = _parse_printer_address(data)
+            if error_response:
+                return error_response
+            printer = get_registry().get(ip, port) or {}
+
+        doc = parse_zpl(zpl, printer.get('print_width'), printer.get('label_length'))
+        return jsonify({
+            "status": "success",
+            "mode": ZPL_VALIDATION,
+            "result": doc.to_dict(include_labels=True)
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Помилка в /api/zpl/validate: {str(e)}", exc_info=True)
+        return jsonify({
+            "status": "error",
+            "message": f"Internal server error: {str(e)}"
+        }), 500
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job_endpoint(job_id):
+    """Повертає стан завдання друку та його контрольну точку"""
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return jsonify({
+            "status": "error",
+            "message": f"Завдання {job_id} не знайдено"
+        }), 404
+
+    return jsonify({
+        "status": "success",
+        "job": job
+    }), 200
+
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def job_events_endpoint(job_id):
+    """Потік прогресу завдання у форматі Server-Sent Events"""
+    manager = get_job_manager()
+    if manager.get(job_id) is None:
+        return jsonify({
+            "status": "error",
+            "message": f"Завдання {job_id} не знайдено"
+        }), 404
+
+    def stream():
+        version = -1
+        while True:
+            update = manager.wait_for_update(job_id, version, timeout=15)
+            if update is None:
+                return
+            new_version, job = update
+            if new_version == version:
+                # Коментар SSE, щоб проксі не закривали неактивне з'єднання
+                yield ": keepalive\n\n"
+                continue
+            version = new_version
+            yield f"id: {version}\ndata: {json.dumps(job, ensure_ascii=False)}\n\n"
+            if job['status'] in TERMINAL_STATUSES:
+                return
+
+    return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.route('/api/jobs/<job_id>/resume', methods=['POST'])
+def resume_job_endpoint(job_id):
+    """Відновлює невдале завдання з останньої підтвердженої етикетки"""
+    manager = get_job_manager()
+    success, error_msg = manager.resume(job_id)
+    if not success:
+        return jsonify({
+            "status": "error",
+            "message": error_msg
+        }), 404 if manager.get(job_id) is None else 409
+
+    return jsonify({
+        "status": "success",
+        "job": manager.get(job_id)
+    }), 202
+
+
+@app.route('/api/jobs/metrics', methods=['GET'])
+def job_metrics_endpoint():
+    """
+    Затримки завершених завдань окремо для кожного пріоритету
+
+    queue_wait - від прийому завдання до відправки першої етикетки,
+    completion - від прийому до завершення, time_to_printed - від прийому до
+    фактичного друку (завдання з CONFIRM). Статистика ведеться в кожному
+    процесі окремо (process - процес, що відповів).
+    """
+    manager = get_job_manager()
+    return jsonify({
+        "status": "success",
+        "process": manager.owner,
+        "latency": manager.latency(),
+        "confirm": confirm_metrics()
+    }), 200
+
+
 @app.route('/api/config', methods=['GET'])
 def get_config():
     """Отримати поточну конфігурацію"""
@@ -188,8 +834,10 @@ def update_config():
                 "message": error_msg or "Invalid configuration"
             }), 400
         
-        # Збереження конфігурації
-        success, error_msg = save_config(data)
+        # Збереження конфігурації (ключі, яких немає у формі, наприклад rate_limits, зберігаються)
+        config = load_config()
+        config.update(data)
+        success, error_msg = save_config(config)
         if success:
             return jsonify({
                 "status": "success",
@@ -211,7 +859,11 @@ def update_config():
 
 @app.route('/api/ssl-renew', methods=['POST'])
 def ssl_renew():
-    """Перевипуск SSL сертифікату для вказаного домену"""
+    """
+    Запускає перевипуск SSL сертифікату для домену з конфігурації у фоні
+
+    Повертає 202 з renewal_id; прогрес та вивід certbot - GET /api/ssl-renew/<renewal_id>
+    """
     try:
         # Завантажуємо конфігурацію
         config = load_config()
@@ -237,84 +889,19 @@ def ssl_renew():
                 "message": "DuckDNS API token не вказано в конфігурації"
             }), 400
         
-        logger.info(f"Початок перевипуску SSL сертифікату для домену: {domain}")
-        
-        # Підключаємося до Docker API
-        try:
-            docker_client = docker.from_env()
-        except Exception as e:
-            logger.error(f"Помилка підключення до Docker API: {str(e)}")
+        renewal, running_id = start_renewal(domain, email)
+        if renewal is None:
             return jsonify({
                 "status": "error",
-                "message": f"Помилка підключення до Docker: {str(e)}"
-            }), 500
-        
-        # Виконуємо команду certbot в контейнері certbot
-        try:
-            certbot_container = docker_client.containers.get('docker-print-server-certbot')
-            
-            # Формуємо команду certbot
-            certbot_cmd = [
-                'certbot', 'certonly',
-                '--authenticator', 'dns-duckdns',
-                '--dns-duckdns-credentials', '/etc/letsencrypt/duckdns.ini',
-                '-d', domain,
-                '--email', email,
-                '--agree-tos',
-                '--non-interactive',
-                '--force-renewal',
-                '--dns-duckdns-propagation-seconds', '120'
-            ]
-            
-            # Виконуємо команду
-            exec_result = certbot_container.exec_run(
-                certbot_cmd,
-                stdout=True,
-                stderr=True,
-                demux=True
-            )
-            
-            if exec_result.exit_code == 0:
-                logger.info(f"Сертифікат успішно перевипущено для домену: {domain}")
-                
-                # Перезапускаємо app контейнер для завантаження нового сертифікату
-                try:
-                    app_container = docker_client.containers.get('docker-print-server-app')
-                    app_container.restart(timeout=30)
-                    logger.info("Контейнер app перезапущено")
-                except Exception as restart_error:
-                    logger.warning(f"Не вдалося перезапустити контейнер app: {str(restart_error)}")
-                
-                output = exec_result.output[0].decode('utf-8') if exec_result.output[0] else ''
-                return jsonify({
-                    "status": "success",
-                    "message": f"Сертифікат успішно перевипущено для домену {domain}",
-                    "output": output
-                }), 200
-            else:
-                error_output = exec_result.output[1].decode('utf-8') if exec_result.output[1] else ''
-                stdout_output = exec_result.output[0].decode('utf-8') if exec_result.output[0] else ''
-                error_msg = error_output or stdout_output or "Невідома помилка"
-                logger.error(f"Помилка перевипуску сертифікату: {error_msg}")
-                return jsonify({
-                    "status": "error",
-                    "message": f"Помилка перевипуску сертифікату: {error_msg}",
-                    "output": stdout_output,
-                    "error": error_output
-                }), 500
-                
-        except docker.errors.NotFound:
-            logger.error("Контейнер docker-print-server-certbot не знайдено")
-            return jsonify({
-                "status": "error",
-                "message": "Контейнер certbot не знайдено"
-            }), 500
-        except Exception as e:
-            logger.error(f"Помилка виконання команди certbot: {str(e)}", exc_info=True)
-            return jsonify({
-                "status": "error",
-                "message": f"Помилка виконання команди: {str(e)}"
-            }), 500
+                "message": "Перевипуск сертифікату вже виконується",
+                "renewal_id": running_id
+            }), 409
+
+        return jsonify({
+            "status": "success",
+            "message": f"Перевипуск сертифікату для домену {domain} розпочато",
+            "renewal": renewal
+        }), 202
             
     except Exception as e:
         logger.error(f"Помилка перевипуску SSL сертифікату: {str(e)}", exc_info=True)
@@ -324,6 +911,53 @@ def ssl_renew():
         }), 500
 
 
+@app.route('/api/ssl-renew/<renewal_id>', methods=['GET'])
+def ssl_renew_status(renewal_id):
+    """
+    Стан перевипуску сертифікату
+
+    Параметр offset - зміщення у виводі certbot з попередньої відповіді (next_offset),
+    щоб отримувати лише новий вивід.
+    """
+    try:
+        offset = int(request.args.get('offset', 0))
+    except ValueError:
+        return jsonify({
+            "status": "error",
+            "message": "offset повинен бути числом"
+        }), 400
+
+    renewal = get_renewal(renewal_id, offset)
+    if renewal is None:
+        return jsonify({
+            "status": "error",
+            "message": f"Перевипуск {renewal_id} не знайдено"
+        }), 404
+
+    return jsonify({
+        "status": "success",
+        "renewal": renewal
+    }), 200
+
+
+@app.route('/api/rate-limits', methods=['GET'])
+def rate_limits_endpoint():
+    """Повертає налаштування обмеження швидкості та поточні швидкості принтерів"""
+    try:
+        rate_limits, printers = get_rate_limits_status()
+        return jsonify({
+            "status": "success",
+            "rate_limits": rate_limits,
+            "printers": printers
+        }), 200
+    except Exception as e:
+        logger.error(f"Помилка отримання лімітів швидкості: {str(e)}", exc_info=True)
+        return jsonify({
+            "status": "error",
+            "message": f"Failed to load rate limits: {str(e)}"
+        }), 500
+
+
 @app.route('/api/health', methods=['GET'])
 def health():
     """Health check endpoint"""
@@ -382,8 +1016,7 @@ def ssl_status():
                 }
             }), 200
 
-        from cryptography import x509
-        from cryptography.hazmat.backends import default_backend
+        x509, default_backend = _x509()
 
         with open(cert_path, 'rb') as f:
             cert_data = f.read()
@@ -442,7 +1075,8 @@ def ssl_status():
                 "cert_domains": cert_domains,
                 "configured_domain": configured_domain,
                 "domain_mismatch": domain_mismatch,
-                "domain_warning": domain_warning
+                "domain_warning": domain_warning,
+                "tls_context": get_tls_status()
             }
         }), 200
 
@@ -461,6 +1095,8 @@ def scan_printers_endpoint():
         data = request.get_json() or {}
         network = data.get('network') or data.get('network_cidr')
         port = data.get('port', 9100)
+        ports = data.get('ports')
+        identify = data.get('identify', True)
         
         # Валідація порту
         try:
@@ -475,14 +1111,29 @@ def scan_printers_endpoint():
                 "status": "error",
                 "message": "PORT повинен бути числом"
             }), 400
+
+        if ports is not None:
+            if (not isinstance(ports, list) or not ports
+                    or not all(isinstance(p, int) and not isinstance(p, bool) and 1 <= p <= 65535 for p in ports)):
+                return jsonify({
+                    "status": "error",
+                    "message": "ports повинен бути непорожнім списком портів від 1 до 65535"
+                }), 400
+            ports = list(dict.fromkeys(ports))
+        else:
+            ports = [port] + [p for p in DISCOVERY_PORTS if p != port]
         
-        logger.info(f"Початок сканування мережі на пошук принтерів (порт {port})")
-        printers = scan_printers(network=network, port=port)
+        logger.info(f"Початок сканування мережі на пошук принтерів (порти {ports})")
+        printers = scan_printers(network=network, port=port, ports=ports, identify=bool(identify))
         
         # Зберігаємо дані сканування
-        success, error_msg = update_scan_data(network=network, port=port, printers=printers)
+        success, error_msg = update_scan_data(network=network, port=port, printers=printers, ports=ports)
         if not success:
             logger.warning(f"Не вдалося зберегти дані сканування: {error_msg}")
+        else:
+            # Оновлюємо реєстр одразу, не чекаючи наступного циклу перевірки
+            get_registry().publish_scan_data()
+            start_inventory_maintainer().refresh_now()
         
         return jsonify({
             "status": "success",
@@ -502,7 +1153,7 @@ def scan_printers_endpoint():
 def get_scan_data_endpoint():
     """Отримати збережені дані сканування"""
     try:
-        scan_data = load_scan_data()
+        scan_data = get_registry().scan_data()
         return jsonify({
             "status": "success",
             "scan_data": scan_data
@@ -515,6 +1166,43 @@ def get_scan_data_endpoint():
         }), 500
 
 
+def _parse_bool_arg(name: str):
+    """Повертає True/False для параметра запиту або None, якщо не вказаний"""
+    value = request.args.get(name)
+    if value is None or value == '':
+        return None
+    return value.lower() in ('1', 'true', 'yes')
+
+
+@app.route('/api/printers', methods=['GET'])
+def list_printers_endpoint():
+    """
+    Повертає принтери з реєстру в пам'яті з поточним станом
+
+    Параметри запиту: reachable=true|false, model=<префікс>, identified=true|false, ip=<адреса>
+    """
+    try:
+        registry = get_registry()
+        printers = registry.list(
+            reachable=_parse_bool_arg('reachable'),
+            model=request.args.get('model'),
+            identified=_parse_bool_arg('identified'),
+            ip=request.args.get('ip')
+        )
+        return jsonify({
+            "status": "success",
+            "printers": printers,
+            "count": len(printers),
+            "updated_at": registry.updated_at
+        }), 200
+    except Exception as e:
+        logger.error(f"Помилка отримання списку принтерів: {str(e)}", exc_info=True)
+        return jsonify({
+            "status": "error",
+            "message": f"Failed to list printers: {str(e)}"
+        }), 500
+
+
 @app.route('/api/printers/test-print', methods=['POST'])
 def test_print_endpoint():
     """Тестовий друк на принтері"""
@@ -607,8 +1295,12 @@ def test_print_endpoint():
 
 if __name__ == '__main__':
     # Для розробки
+    start_background_services()
     app.run(host='0.0.0.0', port=5000, debug=True)
 else:
     # Для production (gunicorn)
     logger.info("Flask app initialized")
+    # З preload модуль імпортується в master - служби запустить post_fork (gunicorn.conf.py)
+    if os.getenv('GUNICORN_PRELOAD') != '1':
+        start_background_services()
 
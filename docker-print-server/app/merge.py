@@ -0,0 +1,273 @@
+"""
+Модуль для злиття ZPL шаблону з даними (variable data printing)
+
+Шаблон - звичайний ZPL з іменованими підстановками {{name}}. Він
+компілюється один раз у послідовність незмінних частин та підстановок,
+тому генерація кожної етикетки - це лише склеювання рядків.
+
+Значення в даних полів (^FD/^FV) екрануються шістнадцятковими кодами ^FH
+(_5E для ^, _7E для ~ тощо), тому символи даних не можуть зламати
+структуру етикетки. Якщо поле з підстановкою не має ^FH, він додається
+автоматично. Значення поза даними полів (наприклад, ^FO{{x}},{{y}} або
+^PQ{{qty}}) підставляються як є, але не можуть містити префіксів команд.
+"""
+import io
+import os
+import re
+import csv
+import json
+import functools
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple, Union
+
+from app.zpl import tokenize, DEFAULT_FORMAT_PREFIX, DEFAULT_CONTROL_PREFIX
+
+# Максимальна кількість рядків даних в одному запиті
+MERGE_MAX_ROWS = int(os.getenv('MERGE_MAX_ROWS', '100000'))
+# Максимальний розмір згенерованих етикеток одного запиту (в байтах): усі вони
+# тримаються в пам'яті завдання та записуються в журнал завдань
+MERGE_MAX_BYTES = int(os.getenv('MERGE_MAX_BYTES', str(32 * 1024 * 1024)))
+
+PLACEHOLDER_RE = re.compile(r'\{\{\s*([A-Za-z_][A-Za-z0-9_.-]*)\s*\}\}')
+DEFAULT_HEX_INDICATOR = '_'
+
+
+class MergeError(ValueError):
+    """Помилка шаблону або рядка даних"""
+
+
+class MergeLimitError(MergeError):
+    """Перевищено MERGE_MAX_ROWS або MERGE_MAX_BYTES"""
+
+
+@functools.lru_cache(maxsize=16)
+def _field_escape_table(indicator: str, prefixes: str) -> Dict[int, str]:
+    """Таблиця str.translate: службові та керуючі символи -> шістнадцяткові коди ^FH"""
+    special = set(indicator + prefixes + DEFAULT_FORMAT_PREFIX + DEFAULT_CONTROL_PREFIX)
+    special.update(chr(code) for code in range(0x20))
+    special.add('\x7f')
+    return {ord(char): f"{indicator}{ord(char):02X}" for char in special}
+
+
+def escape_field_data(value: str, indicator: str = DEFAULT_HEX_INDICATOR,
+                      prefixes: str = DEFAULT_FORMAT_PREFIX + DEFAULT_CONTROL_PREFIX) -> str:
+    """
+    Екранує значення для даних поля з ^FH
+
+    Args:
+        value: Значення
+        indicator: Символ-індикатор ^FH (за замовчуванням _)
+        prefixes: Поточні префікси команд
+
+    Returns:
+        str: Значення, в якому службові символи замінено на _XX
+    """
+    return value.translate(_field_escape_table(indicator, prefixes))
+
+
+class MergeTemplate:
+    """
+    Скомпільований шаблон
+
+    parts - список, де рядки - незмінні частини, а кортежі
+    (name, indicator) - підстановки; indicator - символ ^FH для даних
+    поля або None для підстановки як є.
+    """
+
+    def __init__(self, template: str):
+        if not template or not isinstance(template, str) or not template.strip():
+            raise MergeError("Шаблон не вказаний")
+        self.template = template
+        self.parts: List[Union[str, Tuple[str, Optional[str]]]] = []
+        self.prefixes = DEFAULT_FORMAT_PREFIX + DEFAULT_CONTROL_PREFIX
+        self._compile()
+        self.placeholders = sorted({part[0] for part in self.parts if isinstance(part, tuple)})
+        if not self.placeholders:
+            raise MergeError("Шаблон не містить жодної підстановки {{name}}")
+
+    def _compile(self):
+        template = self.template
+        literal: List[str] = []
+        position = 0
+        # Індикатор ^FH поточного поля (None - поле без ^FH)
+        field_indicator: Optional[str] = None
+        format_prefix, control_prefix = DEFAULT_FORMAT_PREFIX, DEFAULT_CONTROL_PREFIX
+
+        for cmd in tokenize(template):
+            literal.append(template[position:cmd.start])
+            position = cmd.end
+            text = template[cmd.start:cmd.end]
+            name = cmd.name
+
+            if name == 'CC' and cmd.params:
+                format_prefix = cmd.params
+            elif name == 'CT' and cmd.params:
+                control_prefix = cmd.params
+            self.prefixes = format_prefix + control_prefix
+
+            if cmd.prefix != DEFAULT_FORMAT_PREFIX:
+                self._append_raw(literal, text)
+                continue
+
+            if name == 'FH':
+                field_indicator = cmd.params[:1] or DEFAULT_HEX_INDICATOR
+            elif name in ('FD', 'FV') and PLACEHOLDER_RE.search(cmd.params):
+                head = template[cmd.start:cmd.end - len(cmd.params)]
+                if field_indicator is None:
+                    # Додаємо ^FH, тому незмінний текст поля теж треба екранувати
+                    field_indicator = DEFAULT_HEX_INDICATOR
+                    literal.append(format_prefix + 'FH')
+                    literal.append(head)
+                    self._append_field(literal, cmd.params, field_indicator, escape_literal=True)
+                else:
+                    literal.append(head)
+                    self._append_field(literal, cmd.params, field_indicator, escape_literal=False)
+                continue
+            elif name in ('FS', 'XA', 'XZ'):
+                field_indicator = None
+
+            self._append_raw(literal, text)
+
+        literal.append(template[position:])
+        self._flush(literal)
+
+    def _append_raw(self, literal: List[str], text: str):
+        """Додає текст, у якому підстановки вставляються без екранування"""
+        position = 0
+        for match in PLACEHOLDER_RE.finditer(text):
+            literal.append(text[position:match.start()])
+            self._flush(literal)
+            self.parts.append((match.group(1), None))
+            position = match.end()
+        literal.append(text[position:])
+
+    def _append_field(self, literal: List[str], data: str, indicator: str, escape_literal: bool):
+        """Додає дані поля: підстановки екрануються кодами ^FH"""
+        position = 0
+        for match in PLACEHOLDER_RE.finditer(data):
+            text = data[position:match.start()]
+            literal.append(escape_field_data(text, indicator, self.prefixes) if escape_literal else text)
+            self._flush(literal)
+            self.parts.append((match.group(1), indicator))
+            position = match.end()
+        text = data[position:]
+        literal.append(escape_field_data(text, indicator, self.prefixes) if escape_literal else text)
+
+    def _flush(self, literal: List[str]):
+        text = ''.join(literal)
+        literal.clear()
+        if text:
+            self.parts.append(text)
+
+    def render(self, row: Dict[str, Any], row_number: int = 1) -> str:
+        """
+        Генерує етикетку для одного рядка даних
+
+        Raises:
+            MergeError: Якщо в рядку немає значення для підстановки або
+                значення поза даними поля містить префікс команди
+        """
+        result = []
+        for part in self.parts:
+            if isinstance(part, str):
+                result.append(part)
+                continue
+            name, indicator = part
+            try:
+                value = row[name]
+            except KeyError:
+                raise MergeError(f"Рядок {row_number}: немає значення для {{{{{name}}}}}")
+            value = '' if value is None else str(value)
+            if indicator is not None:
+                value = escape_field_data(value, indicator, self.prefixes)
+            elif any(prefix in value for prefix in self.prefixes):
+                raise MergeError(f"Рядок {row_number}: значення {{{{{name}}}}} не може містити "
+                                 f"символи {' '.join(self.prefixes)}")
+            result.append(value)
+        return ''.join(result)
+
+    def render_all(self, rows: Iterable[Dict[str, Any]], max_rows: Optional[int] = None,
+                   max_bytes: Optional[int] = None) -> List[str]:
+        """
+        Генерує етикетки для всіх рядків
+
+        Рядки читаються потоково, тому генерація зупиняється, щойно
+        перевищено ліміт, не дочитуючи решту даних.
+
+        Args:
+            max_rows: Максимальна кількість рядків (за замовчуванням MERGE_MAX_ROWS)
+            max_bytes: Максимальний розмір етикеток (за замовчуванням MERGE_MAX_BYTES)
+
+        Raises:
+            MergeLimitError: Перевищено max_rows або max_bytes
+            MergeError: Некоректний рядок
+        """
+        max_rows = MERGE_MAX_ROWS if max_rows is None else max_rows
+        max_bytes = MERGE_MAX_BYTES if max_bytes is None else max_bytes
+        labels = []
+        total_bytes = 0
+        for row_number, row in enumerate(rows, start=1):
+            if row_number > max_rows:
+                raise MergeLimitError(f"Перевищено максимальну кількість рядків ({max_rows})")
+            if not isinstance(row, dict):
+                raise MergeError(f"Рядок {row_number}: очікується об'єкт з полями")
+            label = self.render(row, row_number)
+            total_bytes += len(label.encode('utf-8'))
+            if total_bytes > max_bytes:
+                raise MergeLimitError(f"Рядок {row_number}: згенеровані етикетки перевищують "
+                                      f"{max_bytes} байт")
+            labels.append(label)
+        if not labels:
+            raise MergeError("Дані для злиття не вказані")
+        return labels
+
+
+@functools.lru_cache(maxsize=32)
+def compile_template(template: str) -> MergeTemplate:
+    """Компілює шаблон (повторне використання того самого шаблону не компілює його знову)"""
+    return MergeTemplate(template)
+
+
+def _text_stream(stream) -> io.TextIOBase:
+    return io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+
+
+def iter_csv_rows(stream) -> Iterator[Dict[str, Any]]:
+    """Читає рядки CSV з заголовком (назви колонок = назви підстановок) з бінарного потоку"""
+    text = _text_stream(stream)
+    sample = text.read(4096)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.DictReader(_chain(sample, text), dialect=dialect)
+    for row in reader:
+        yield row
+
+
+def _chain(sample: str, text: io.TextIOBase) -> Iterator[str]:
+    """Повертає рядки потоку, враховуючи вже прочитаний для визначення діалекту фрагмент"""
+    yield from io.StringIO(sample + text.readline(), newline='')
+    yield from text
+
+
+def iter_ndjson_rows(stream) -> Iterator[Dict[str, Any]]:
+    """Читає рядки NDJSON (один JSON об'єкт на рядок) з бінарного потоку"""
+    for line_number, line in enumerate(_text_stream(stream), start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            raise MergeError(f"Рядок {line_number}: некоректний JSON: {str(e)}")
+
+
+def detect_rows_format(filename: Optional[str], content_type: Optional[str]) -> Optional[str]:
+    """Визначає формат файлу даних: 'csv', 'ndjson' або None"""
+    filename = (filename or '').lower()
+    content_type = (content_type or '').lower()
+    if filename.endswith(('.ndjson', '.jsonl')) or 'ndjson' in content_type or 'jsonl' in content_type:
+        return 'ndjson'
+    if filename.endswith(('.csv', '.txt')) or content_type.startswith(('text/csv', 'text/plain')):
+        return 'csv'
+    return None
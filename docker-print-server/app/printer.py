@@ -1,19 +1,116 @@
 """
 Модуль для відправки ZPL-команд на принтери через TCP/IP
 """
+import errno
 import socket
+import time
 import logging
+import selectors
 import ipaddress
 import concurrent.futures
-from typing import Tuple, Optional, List, Dict
+from typing import Tuple, Optional, List, Dict, Any, Sequence, Callable
+
+from app.rate_limit import get_printer_shaper, RATE_LIMIT_MAX_WAIT
+from app.zpl import count_labels
 
 logger = logging.getLogger(__name__)
 
 # Таймаут для підключення та відправки (в секундах)
 CONNECTION_TIMEOUT = 10
 SEND_TIMEOUT = 30
-# Таймаут для сканування порту (в секундах)
+# Таймаут для сканування порту (в секундах); під час пошуку принтерів - верхня межа адаптивного таймауту
 SCAN_TIMEOUT = 2
+# Порти, що перевіряються під час пошуку принтерів: raw ZPL, альтернативний порт Zebra, LPD
+DISCOVERY_PORTS = (9100, 6101, 515)
+# Порти, на які сервер може відправляти ZPL (основний порт знайденого принтера), та LPD
+RAW_PORTS = (9100, 6101)
+LPD_PORT = 515
+# Адаптивний таймаут пошуку: p95 RTT хостів, що відповіли, помножений на SCAN_RTT_MULTIPLIER,
+# але не менше SCAN_MIN_TIMEOUT; застосовується після SCAN_RTT_MIN_SAMPLES відповідей
+SCAN_RTT_MULTIPLIER = 4
+SCAN_MIN_TIMEOUT = 0.15
+SCAN_RTT_MIN_SAMPLES = 5
+# Максимальна кількість одночасних з'єднань під час пошуку
+SCAN_MAX_IN_FLIGHT = 256
+# Помилки з'єднання, після яких решта портів хоста не перевіряється
+_HOST_UNREACHABLE_ERRORS = (errno.EHOSTUNREACH, errno.ENETUNREACH, errno.EHOSTDOWN)
+# Таймаут очікування відповіді на запит стану принтера (в секундах)
+STATUS_TIMEOUT = 3
+# Таймаут ідентифікації принтера під час сканування (в секундах)
+IDENTIFY_TIMEOUT = 1.5
+
+# Роздільна здатність Zebra: точок на мм -> dpi
+DPMM_TO_DPI = {6: 152, 8: 203, 12: 300, 24: 600}
+
+# Хто отримує результат кожного підключення з шляху друку (реєстр принтерів, app/inventory.py)
+_connect_listeners: List[Callable[[str, int, bool], None]] = []
+
+
+def add_connect_listener(listener: Callable[[str, int, bool], None]):
+    """Додає функцію listener(ip, port, reachable), яку викликає connect_to_printer"""
+    _connect_listeners.append(listener)
+
+
+def _notify_connect(ip: str, port: int, reachable: bool):
+    for listener in _connect_listeners:
+        try:
+            listener(ip, port, reachable)
+        except Exception as e:
+            logger.warning(f"Помилка обробки результату підключення до {ip}:{port}: {str(e)}")
+
+
+def parse_printer_address(data: Dict[str, Any]) -> Tuple[Optional[str], Optional[int], Optional[str]]:
+    """
+    Витягує та валідує IP і PORT принтера з запиту чи повідомлення WebSocket
+
+    Returns:
+        (ip, port, None) або (None, None, error_msg)
+    """
+    ip = data.get('IP') or data.get('ip')
+    port = data.get('PORT') or data.get('port')
+    if not ip or not isinstance(ip, str):
+        return None, None, "IP адреса не вказана"
+    if port is None:
+        return None, None, "PORT не вказаний"
+    try:
+        port = int(port)
+    except (ValueError, TypeError):
+        return None, None, f"PORT повинен бути числом, отримано: {port}"
+    if port < 1 or port > 65535:
+        return None, None, f"PORT повинен бути від 1 до 65535, отримано: {port}"
+    return ip, port, None
+
+
+def connect_to_printer(ip: str, port: int) -> socket.socket:
+    """
+    Відкриває TCP з'єднання з принтером з таймаутами підключення та відправки
+
+    Args:
+        ip: IP-адреса принтера
+        port: Порт принтера
+
+    Результат підключення передається отримувачам add_connect_listener.
+
+    Returns:
+        socket.socket: Підключений socket (закриває викликаючий код)
+
+    Raises:
+        socket.timeout, socket.error: Якщо підключитися не вдалося
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(CONNECTION_TIMEOUT)
+        sock.connect((ip, port))
+        sock.settimeout(SEND_TIMEOUT)
+    except OSError:
+        sock.close()
+        _notify_connect(ip, port, False)
+        raise
+    except Exception:
+        sock.close()
+        raise
+    _notify_connect(ip, port, True)
+    return sock
 
 
 def send_zpl_to_printer(ip: str, port: int, zpl: str) -> Tuple[bool, Optional[str]]:
@@ -37,22 +134,24 @@ def send_zpl_to_printer(ip: str, port: int, zpl: str) -> Tuple[bool, Optional[st
     if not zpl or not isinstance(zpl, str) or not zpl.strip():
         return False, "ZPL команди не вказані або порожні"
     
+    data = zpl.encode('utf-8')
+
+    # Обмеження швидкості друку для принтера
+    shaper = get_printer_shaper(ip, port)
+    if not shaper.acquire(count_labels(zpl), len(data), max_wait=RATE_LIMIT_MAX_WAIT):
+        error_msg = f"Перевищено ліміт швидкості друку для принтера {ip}:{port}, спробуйте пізніше"
+        logger.warning(error_msg)
+        return False, error_msg
+
     sock = None
     try:
-        # Створюємо TCP socket
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(CONNECTION_TIMEOUT)
-        
         # Підключаємося до принтера
         logger.info(f"Підключення до принтера {ip}:{port}")
-        sock.connect((ip, port))
-        
-        # Встановлюємо таймаут для відправки
-        sock.settimeout(SEND_TIMEOUT)
+        sock = connect_to_printer(ip, port)
         
         # Відправляємо ZPL команди
-        logger.info(f"Відправка ZPL на {ip}:{port} ({len(zpl)} байт)")
-        sock.sendall(zpl.encode('utf-8'))
+        logger.info(f"Відправка ZPL на {ip}:{port} ({len(data)} байт)")
+        sock.sendall(data)
         
         logger.info(f"ZPL успішно відправлено на {ip}:{port}")
         return True, None
@@ -86,27 +185,249 @@ def send_zpl_to_printer(ip: str, port: int, zpl: str) -> Tuple[bool, Optional[st
                 logger.warning(f"Помилка при закритті socket: {str(e)}")
 
 
-def check_port_open(ip: str, port: int, timeout: float = SCAN_TIMEOUT) -> bool:
+def read_host_status(sock: socket.socket, timeout: float = STATUS_TIMEOUT) -> Optional[Dict[str, Any]]:
     """
-    Перевіряє, чи відкритий порт на вказаній IP адресі
-    
+    Надсилає ~HS у відкрите з'єднання та розбирає відповідь принтера
+
+    Команди з тильдою виконуються одразу після отримання, тому запит можна
+    надсилати в те саме з'єднання, через яке йде друк.
+
     Args:
-        ip: IP адреса для перевірки
-        port: Порт для перевірки
-        timeout: Таймаут перевірки в секундах
-        
+        sock: Підключений до принтера socket
+        timeout: Таймаут очікування відповіді в секундах
+
+    Returns:
+        Dict зі станом принтера або None, якщо відповідь не отримано
+    """
+    previous_timeout = sock.gettimeout()
+    try:
+        sock.settimeout(timeout)
+        sock.sendall(b'~HS')
+
+        # Відповідь - три рядки у форматі <STX>...<ETX>
+        response = b''
+        deadline = time.monotonic() + timeout
+        while response.count(b'\x03') < 3 and time.monotonic() < deadline:
+            chunk = sock.recv(1024)
+            if not chunk:
+                break
+            response += chunk
+
+        return parse_host_status(response.decode('ascii', errors='ignore'))
+    except (socket.timeout, socket.error) as e:
+        logger.debug(f"Не вдалося отримати ~HS: {str(e)}")
+        return None
+    finally:
+        sock.settimeout(previous_timeout)
+
+
+def parse_host_status(response: str) -> Optional[Dict[str, Any]]:
+    """
+    Розбирає відповідь ~HS (Host Status Return)
+
+    Рядок 1: aaa,b,c,dddd,eee,f,g,h,iii,j,k,l
+        b - немає паперу, c - пауза, eee - форматів у буфері прийому, f - буфер повний
+    Рядок 2: mmm,n,o,p,q,r,s,t,uuuuuuuu,v,www
+        o - голова піднята, p - немає стрічки, t - етикетка очікує зняття,
+        uuuuuuuu - етикеток, що залишилися в партії
+
+    Returns:
+        Dict зі станом принтера або None, якщо відповідь неповна
+    """
+    lines = [part.strip('\r\n') for part in response.replace('\x02', '').split('\x03')]
+    lines = [line for line in lines if line]
+    if len(lines) < 2:
+        return None
+
+    first = lines[0].split(',')
+    second = lines[1].split(',')
+    if len(first) < 6 or len(second) < 9:
+        return None
+
+    def flag(value: str) -> bool:
+        return value.strip() == '1'
+
+    def number(value: str) -> int:
+        try:
+            return int(value.strip())
+        except ValueError:
+            return 0
+
+    return {
+        "paper_out": flag(first[1]),
+        "paused": flag(first[2]),
+        "formats_in_buffer": number(first[4]),
+        "buffer_full": flag(first[5]),
+        "head_up": flag(second[2]),
+        "ribbon_out": flag(second[3]),
+        "label_waiting": flag(second[7]),
+        "labels_remaining": number(second[8])
+    }
+
+
+def query_host_status(ip: str, port: int, timeout: float = STATUS_TIMEOUT) -> Optional[Dict[str, Any]]:
+    """
+    Запитує стан принтера (~HS) через окреме з'єднання
+
     Returns:
-        bool: True якщо порт відкритий, False інакше
+        Dict зі станом принтера або None, якщо принтер не відповів
     """
+    sock = None
     try:
         sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         sock.settimeout(timeout)
-        result = sock.connect_ex((ip, port))
-        sock.close()
-        return result == 0
-    except Exception as e:
-        logger.debug(f"Помилка перевірки порту {ip}:{port}: {str(e)}")
-        return False
+        sock.connect((ip, port))
+        return read_host_status(sock, timeout)
+    except (socket.timeout, socket.error) as e:
+        logger.debug(f"Не вдалося отримати стан принтера {ip}:{port}: {str(e)}")
+        return None
+    finally:
+        if sock:
+            sock.close()
+
+
+def _read_until_etx(sock: socket.socket, frames: int, timeout: float) -> str:
+    """Читає відповідь принтера, поки не отримає frames блоків <STX>...<ETX> або таймаут"""
+    response = b''
+    deadline = time.monotonic() + timeout
+    while response.count(b'\x03') < frames:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        sock.settimeout(remaining)
+        try:
+            chunk = sock.recv(4096)
+        except socket.timeout:
+            break
+        if not chunk:
+            break
+        response += chunk
+    return response.decode('ascii', errors='ignore')
+
+
+def parse_host_identification(response: str) -> Optional[Dict[str, Any]]:
+    """
+    Розбирає відповідь ~HI (Host Identification)
+
+    Формат: <STX>ZT410-200dpi,V75.19.15Z,8,8176KB<ETX>
+    (модель, версія прошивки, точок на мм, обсяг пам'яті)
+
+    Returns:
+        Dict з model, firmware, dpmm, dpi, memory_kb або None
+    """
+    body = response.replace('\x02', '').split('\x03')[0].strip()
+    parts = [part.strip() for part in body.split(',')]
+    if len(parts) < 3 or not parts[0]:
+        return None
+
+    info: Dict[str, Any] = {"model": parts[0], "firmware": parts[1] or None}
+    try:
+        dpmm = int(parts[2])
+        info["dpmm"] = dpmm
+        info["dpi"] = DPMM_TO_DPI.get(dpmm, round(dpmm * 25.4))
+    except ValueError:
+        pass
+    if len(parts) > 3 and parts[3].upper().endswith('KB'):
+        try:
+            info["memory_kb"] = int(parts[3][:-2])
+        except ValueError:
+            pass
+    return info
+
+
+def parse_host_configuration(response: str) -> Dict[str, Any]:
+    """
+    Розбирає конфігурацію принтера, повернуту ^HH
+
+    Рядки мають вигляд "<значення>   <НАЗВА ПАРАМЕТРА>", наприклад
+    "832 8/MM FULL    PRINT WIDTH" або "1215              LABEL LENGTH".
+
+    Returns:
+        Dict з print_width та label_length в точках (якщо знайдено)
+    """
+    info: Dict[str, Any] = {}
+    names = {"PRINT WIDTH": "print_width", "LABEL LENGTH": "label_length"}
+    for line in response.replace('\x02', '').replace('\x03', '').splitlines():
+        line = line.strip()
+        for name, key in names.items():
+            if line.upper().endswith(name):
+                value = line[:-len(name)].strip().split(' ')[0]
+                if value.isdigit():
+                    info[key] = int(value)
+    return info
+
+
+def identify_printer(ip: str, port: int, timeout: float = IDENTIFY_TIMEOUT) -> Optional[Dict[str, Any]]:
+    """
+    Ідентифікує принтер запитами ~HI (модель, прошивка, dpi, пам'ять)
+    та ^HH (ширина друку, довжина етикетки)
+
+    Args:
+        ip: IP-адреса принтера
+        port: Порт принтера
+        timeout: Таймаут кожного запиту в секундах
+
+    Returns:
+        Dict з характеристиками принтера або None, якщо пристрій не відповів як ZPL принтер
+    """
+    sock = None
+    try:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        sock.connect((ip, port))
+
+        sock.sendall(b'~HI')
+        info = parse_host_identification(_read_until_etx(sock, 1, timeout))
+        if info is None:
+            return None
+
+        sock.sendall(b'^XA^HH^XZ')
+        info.update(parse_host_configuration(_read_until_etx(sock, 1, timeout)))
+        return info
+
+    except (socket.timeout, socket.error) as e:
+        logger.debug(f"Не вдалося ідентифікувати принтер {ip}:{port}: {str(e)}")
+        return None
+    finally:
+        if sock:
+            sock.close()
+
+
+def identify_printers(printers: List[Dict[str, Any]], max_workers: int = 20) -> List[Dict[str, Any]]:
+    """
+    Паралельно ідентифікує знайдені принтери та доповнює їхні записи
+
+    Args:
+        printers: Список {"ip": ..., "port": ...}
+        max_workers: Максимальна кількість одночасних запитів
+
+    Returns:
+        List[Dict]: Ті самі записи з полями model, firmware, dpmm, dpi, memory_kb,
+        print_width, label_length (якщо принтер відповів) та identified
+    """
+    if not printers:
+        return printers
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(max_workers, len(printers))) as executor:
+        future_to_printer = {
+            executor.submit(identify_printer, printer["ip"], int(printer["port"])): printer
+            for printer in printers
+        }
+        for future in concurrent.futures.as_completed(future_to_printer):
+            printer = future_to_printer[future]
+            try:
+                info = future.result()
+            except Exception as e:
+                logger.debug(f"Помилка ідентифікації {printer['ip']}: {str(e)}")
+                info = None
+
+            printer["identified"] = info is not None
+            if info:
+                printer.update(info)
+                logger.info(f"Принтер {printer['ip']}:{printer['port']}: {info.get('model')}, "
+                            f"{info.get('dpi')} dpi")
+
+    return printers
 
 
 def get_local_network() -> Optional[str]:
@@ -147,17 +468,160 @@ def get_local_network() -> Optional[str]:
         return None
 
 
-def scan_printers(network: Optional[str] = None, port: int = 9100, max_workers: int = 50) -> List[Dict[str, str]]:
+def sweep_ports(hosts: Sequence[str], ports: Sequence[int], max_in_flight: int = SCAN_MAX_IN_FLIGHT,
+                max_timeout: float = SCAN_TIMEOUT) -> Tuple[Dict[str, List[int]], Dict[str, Any]]:
     """
-    Сканує локальну мережу на пошук пристроїв з відкритим портом 9100
-    
+    Одним проходом перевіряє набір портів на кожному хості
+
+    З'єднання неблокуючі й обслуговуються одним потоком через selectors.
+    Таймаут з'єднання спочатку дорівнює max_timeout, а після перших відповідей
+    стає p95 RTT хостів, що відповіли (з'єднанням або відмовою), помноженим на
+    SCAN_RTT_MULTIPLIER, з нижньою межею SCAN_MIN_TIMEOUT - тому на тихій мережі
+    сканування не чекає max_timeout на кожен неіснуючий хост. Після відмови
+    (RST) на будь-якому порту хост вважається живим: нові порти на ньому не
+    перевіряються, а вже відправленим з'єднанням дається лише SCAN_RTT_MULTIPLIER
+    часу відповіді цього хоста. Після "хост недоступний" хост одразу
+    пропускається.
+
+    Args:
+        hosts: IP-адреси для перевірки
+        ports: Порти для перевірки на кожному хості
+        max_in_flight: Максимальна кількість одночасних з'єднань
+        max_timeout: Верхня межа таймауту з'єднання в секундах
+
+    Returns:
+        ({ip: відкриті порти в порядку ports}, статистика: probes, responsive,
+        timeout, rtt_p95, elapsed)
+    """
+    started_at = time.monotonic()
+    selector = selectors.DefaultSelector()
+    queue = [(ip, port) for ip in hosts for port in ports]
+    position = 0
+    # Порядок вставки = порядок початку з'єднань, тому найстаріші - на початку
+    in_flight: Dict[socket.socket, Tuple[str, int, float]] = {}
+    host_sockets: Dict[str, List[socket.socket]] = {}
+    done_hosts = set()
+    # Крайній термін з'єднань хоста, що вже відповів відмовою
+    host_deadlines: Dict[str, float] = {}
+    found: Dict[str, List[int]] = {}
+    rtts: List[float] = []
+    timeout = max_timeout
+    probes = 0
+
+    def close(sock: socket.socket):
+        ip = in_flight.pop(sock)[0]
+        host_sockets[ip].remove(sock)
+        if not host_sockets[ip]:
+            host_deadlines.pop(ip, None)
+        selector.unregister(sock)
+        sock.close()
+
+    def finish(sock: socket.socket, error: int, rtt: float):
+        nonlocal timeout
+        ip, port, _ = in_flight[sock]
+        close(sock)
+        if error == 0:
+            found.setdefault(ip, []).append(port)
+        if error in (0, errno.ECONNREFUSED):
+            rtts.append(rtt)
+            if len(rtts) >= SCAN_RTT_MIN_SAMPLES:
+                p95 = sorted(rtts)[int(0.95 * (len(rtts) - 1))]
+                timeout = min(max_timeout, max(SCAN_MIN_TIMEOUT, p95 * SCAN_RTT_MULTIPLIER))
+        if error == errno.ECONNREFUSED:
+            done_hosts.add(ip)
+            if host_sockets[ip]:
+                host_deadlines[ip] = time.monotonic() + max(SCAN_MIN_TIMEOUT, rtt * SCAN_RTT_MULTIPLIER)
+        elif error in _HOST_UNREACHABLE_ERRORS:
+            done_hosts.add(ip)
+            for other in list(host_sockets[ip]):
+                close(other)
+
+    try:
+        while position < len(queue) or in_flight:
+            while position < len(queue) and len(in_flight) < max_in_flight:
+                ip, port = queue[position]
+                position += 1
+                if ip in done_hosts:
+                    continue
+                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                sock.setblocking(False)
+                probes += 1
+                in_flight[sock] = (ip, port, time.monotonic())
+                host_sockets.setdefault(ip, []).append(sock)
+                selector.register(sock, selectors.EVENT_WRITE)
+                error = sock.connect_ex((ip, port))
+                if error not in (errno.EINPROGRESS, errno.EWOULDBLOCK):
+                    finish(sock, error, 0.0)
+
+            if not in_flight:
+                continue
+            deadline = in_flight[next(iter(in_flight))][2] + timeout
+            if host_deadlines:
+                deadline = min(deadline, min(host_deadlines.values()))
+            for key, _ in selector.select(max(0.0, deadline - time.monotonic())):
+                sock = key.fileobj
+                if sock in in_flight:
+                    finish(sock, sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR),
+                           time.monotonic() - in_flight[sock][2])
+
+            # Хости, що не відповіли за поточний таймаут
+            now = time.monotonic()
+            for sock, (_, _, probe_started) in list(in_flight.items()):
+                if probe_started + timeout > now:
+                    break
+                close(sock)
+            for ip, host_deadline in list(host_deadlines.items()):
+                if host_deadline <= now:
+                    for sock in list(host_sockets[ip]):
+                        close(sock)
+    finally:
+        for sock in list(in_flight):
+            close(sock)
+        selector.close()
+
+    stats = {
+        "probes": probes,
+        "responsive": len(rtts),
+        "timeout": round(timeout, 3),
+        "rtt_p95": round(sorted(rtts)[int(0.95 * (len(rtts) - 1))], 4) if rtts else None,
+        "elapsed": round(time.monotonic() - started_at, 3)
+    }
+    return found, stats
+
+
+def _primary_port(open_ports: List[int], port: int) -> Optional[int]:
+    """
+    Вибирає порт для друку серед відкритих портів пристрою
+
+    LPD (515) не приймає сирий ZPL, тому він лише залишається в ports:
+    основним стає запитаний port, потім 9100 та 6101, потім інший відкритий
+    порт у порядку сканування.
+
+    Returns:
+        Основний порт або None, якщо відкритий лише LPD
+    """
+    preferred = ([port] if port != LPD_PORT else []) + [p for p in RAW_PORTS if p != port]
+    for candidate in preferred:
+        if candidate in open_ports:
+            return candidate
+    return next((p for p in open_ports if p != LPD_PORT), None)
+
+
+def scan_printers(network: Optional[str] = None, port: int = 9100, ports: Optional[Sequence[int]] = None,
+                  max_in_flight: int = SCAN_MAX_IN_FLIGHT, identify: bool = True) -> List[Dict[str, Any]]:
+    """
+    Сканує локальну мережу на пошук принтерів
+
     Args:
         network: CIDR нотація мережі (наприклад, "192.168.1.0/24"). Якщо None, визначається автоматично
-        port: Порт для сканування (за замовчуванням 9100)
-        max_workers: Максимальна кількість одночасних перевірок
-        
+        port: Основний порт принтера (за замовчуванням 9100)
+        ports: Порти для перевірки; якщо None - port та DISCOVERY_PORTS
+        max_in_flight: Максимальна кількість одночасних з'єднань
+        identify: Запитати у знайдених принтерів модель та характеристики (~HI, ^HH)
+
     Returns:
-        List[Dict[str, str]]: Список знайдених принтерів з IP адресами
+        List[Dict[str, Any]]: Список знайдених принтерів з IP адресами та характеристиками;
+        port - основний порт (див. _primary_port), ports - усі відкриті порти
     """
     if network is None:
         network = get_local_network()
@@ -165,35 +629,34 @@ def scan_printers(network: Optional[str] = None, port: int = 9100, max_workers:
     if network is None:
         logger.warning("Не вдалося визначити локальну мережу")
         return []
-    
+
+    if ports is None:
+        ports = [port] + [p for p in DISCOVERY_PORTS if p != port]
+
     try:
         net = ipaddress.IPv4Network(network, strict=False)
+
+        logger.info(f"Початок сканування мережі {network} на порти {', '.join(map(str, ports))}")
+        found, stats = sweep_ports([str(ip) for ip in net.hosts()], ports, max_in_flight=max_in_flight)
+
         printers = []
-        
-        logger.info(f"Початок сканування мережі {network} на порт {port}")
-        
-        # Використовуємо ThreadPoolExecutor для паралельного сканування
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            # Створюємо список задач
-            future_to_ip = {
-                executor.submit(check_port_open, str(ip), port): str(ip)
-                for ip in net.hosts()
-            }
-            
-            # Обробляємо результати
-            for future in concurrent.futures.as_completed(future_to_ip):
-                ip = future_to_ip[future]
-                try:
-                    if future.result():
-                        printers.append({"ip": ip, "port": str(port)})
-                        logger.info(f"Знайдено принтер: {ip}:{port}")
-                except Exception as e:
-                    logger.debug(f"Помилка перевірки {ip}: {str(e)}")
-        
-        logger.info(f"Сканування завершено. Знайдено {len(printers)} принтерів")
+        for ip in sorted(found, key=ipaddress.IPv4Address):
+            open_ports = sorted(found[ip], key=list(ports).index)
+            primary = _primary_port(open_ports, port)
+            if primary is None:
+                logger.info(f"Пристрій {ip} пропущено: відкритий лише порт LPD {LPD_PORT}")
+                continue
+            printers.append({"ip": ip, "port": str(primary), "ports": open_ports})
+            logger.info(f"Знайдено принтер: {ip}:{', '.join(map(str, open_ports))}")
+
+        logger.info(f"Сканування завершено за {stats['elapsed']} с ({stats['probes']} перевірок, "
+                    f"відповіли {stats['responsive']}, таймаут {stats['timeout']} с). "
+                    f"Знайдено {len(printers)} принтерів")
+
+        if identify:
+            identify_printers(printers)
         return printers
         
     except Exception as e:
         logger.error(f"Помилка сканування мережі: {str(e)}")
         return []
-
@@ -0,0 +1,241 @@
+"""
+Модуль профілювання запитів у production
+
+Вмикається лише змінною PROFILING_TOKEN: без неї хуки та endpoints не
+реєструються взагалі, тому вимкнене профілювання нічого не коштує.
+
+- Запит із заголовком X-Profile-Token: <PROFILING_TOKEN> виконується під
+  cProfile; профіль зберігається в PROFILE_DIR, а його id повертається в
+  заголовку X-Profile-Id (завантаження - GET /api/profiling/profiles/<id>).
+- POST /api/profiling/sample?seconds=N періодично знімає стеки всіх потоків
+  процесу (wall-clock, включно з очікуванням мережі) та повертає їх у
+  форматі collapsed stacks (flamegraph.pl, speedscope).
+"""
+import io
+import os
+import re
+import sys
+import hmac
+import time
+import uuid
+import pstats
+import logging
+import cProfile
+import threading
+import collections
+from typing import Dict, Tuple
+
+from flask import Flask, request, jsonify, g, send_file, Response
+
+logger = logging.getLogger(__name__)
+
+PROFILE_TOKEN_HEADER = 'X-Profile-Token'
+PROFILE_ID_HEADER = 'X-Profile-Id'
+DEFAULT_PROFILE_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)),
+    'config',
+    'profiles'
+)
+# Скільки останніх профілів зберігати
+PROFILE_KEEP = int(os.getenv('PROFILE_KEEP', '50'))
+# Межі семплювання стеків
+SAMPLE_MAX_SECONDS = 60
+SAMPLE_DEFAULT_INTERVAL = 0.01
+SAMPLE_MIN_INTERVAL = 0.001
+# Скільки рядків pstats повертати в текстовому вигляді
+PROFILE_TEXT_LINES = 60
+
+PROFILE_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+
+# cProfile в одному процесі може бути активним лише для одного запиту одночасно
+_profile_lock = threading.Lock()
+_sample_lock = threading.Lock()
+
+
+def get_profiling_token() -> str:
+    return os.getenv('PROFILING_TOKEN', '')
+
+
+def get_profile_dir() -> str:
+    return os.getenv('PROFILE_DIR', DEFAULT_PROFILE_DIR)
+
+
+def _authorized() -> bool:
+    token = get_profiling_token()
+    supplied = request.headers.get(PROFILE_TOKEN_HEADER, '')
+    return bool(token) and hmac.compare_digest(supplied.encode('utf-8'), token.encode('utf-8'))
+
+
+def init_profiling(app: Flask) -> bool:
+    """
+    Реєструє хуки та endpoints профілювання, якщо задано PROFILING_TOKEN
+
+    Returns:
+        bool: True, якщо профілювання увімкнено
+    """
+    if not get_profiling_token():
+        return False
+
+    app.before_request(_start_request_profile)
+    app.after_request(_finish_request_profile)
+    app.add_url_rule('/api/profiling/profiles/<profile_id>', 'profiling_profile',
+                     profile_endpoint, methods=['GET'])
+    app.add_url_rule('/api/profiling/sample', 'profiling_sample', sample_endpoint, methods=['POST'])
+    logger.info(f"Профілювання увімкнено, профілі зберігаються в {get_profile_dir()}")
+    return True
+
+
+def _start_request_profile():
+    if PROFILE_TOKEN_HEADER not in request.headers or request.path.startswith('/api/profiling/'):
+        return None
+    if not _authorized():
+        logger.warning(f"Некоректний {PROFILE_TOKEN_HEADER} від {request.remote_addr}")
+        return None
+    if not _profile_lock.acquire(blocking=False):
+        logger.info(f"Профілювання {request.path} пропущено: вже профілюється інший запит")
+        return None
+    profiler = cProfile.Profile()
+    g.profiler = profiler
+    g.profile_started = time.perf_counter()
+    profiler.enable()
+    return None
+
+
+def _finish_request_profile(response):
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return response
+    try:
+        profiler.disable()
+        elapsed = time.perf_counter() - g.pop('profile_started')
+        profile_id = uuid.uuid4().hex
+        profile_dir = get_profile_dir()
+        os.makedirs(profile_dir, exist_ok=True)
+        profiler.dump_stats(os.path.join(profile_dir, f"{profile_id}.prof"))
+        _prune_profiles(profile_dir)
+        response.headers[PROFILE_ID_HEADER] = profile_id
+        logger.info(f"Профіль {request.method} {request.path} ({elapsed * 1000:.1f} мс) збережено: {profile_id}")
+    except Exception as e:
+        logger.error(f"Не вдалося зберегти профіль запиту: {str(e)}", exc_info=True)
+    finally:
+        _profile_lock.release()
+    return response
+
+
+def _prune_profiles(profile_dir: str):
+    """Залишає лише PROFILE_KEEP найновіших профілів"""
+    paths = [os.path.join(profile_dir, name) for name in os.listdir(profile_dir) if name.endswith('.prof')]
+    if len(paths) <= PROFILE_KEEP:
+        return
+    paths.sort(key=os.path.getmtime)
+    for path in paths[:len(paths) - PROFILE_KEEP]:
+        try:
+            os.remove(path)
+        except OSError as e:
+            logger.warning(f"Не вдалося видалити старий профіль {path}: {str(e)}")
+
+
+def profile_endpoint(profile_id: str):
+    """
+    Повертає збережений профіль запиту
+
+    Параметр format: text (за замовчуванням, pstats за cumulative) або pstats (файл
+    для snakeviz / python -m pstats)
+    """
+    if not _authorized():
+        return jsonify({
+            "status": "error",
+            "message": f"Потрібен коректний заголовок {PROFILE_TOKEN_HEADER}"
+        }), 403
+
+    path = os.path.join(get_profile_dir(), f"{profile_id}.prof")
+    if not PROFILE_ID_RE.match(profile_id) or not os.path.isfile(path):
+        return jsonify({
+            "status": "error",
+            "message": f"Профіль {profile_id} не знайдено"
+        }), 404
+
+    if request.args.get('format') == 'pstats':
+        return send_file(path, mimetype='application/octet-stream', as_attachment=True,
+                         download_name=f"{profile_id}.prof")
+
+    output = io.StringIO()
+    pstats.Stats(path, stream=output).sort_stats('cumulative').print_stats(PROFILE_TEXT_LINES)
+    return Response(output.getvalue(), mimetype='text/plain')
+
+
+def sample_endpoint():
+    """
+    Знімає стеки всіх потоків процесу протягом seconds секунд
+
+    Параметри: seconds (1-60, за замовчуванням 10), interval (секунди між
+    знімками, за замовчуванням 0.01). Повертає collapsed stacks: рядок
+    "потік;функція (файл:рядок);... кількість" на кожен унікальний стек.
+    """
+    if not _authorized():
+        return jsonify({
+            "status": "error",
+            "message": f"Потрібен коректний заголовок {PROFILE_TOKEN_HEADER}"
+        }), 403
+
+    try:
+        seconds = float(request.args.get('seconds', 10))
+        interval = float(request.args.get('interval', SAMPLE_DEFAULT_INTERVAL))
+    except ValueError:
+        seconds = interval = 0
+    if not 0 < seconds <= SAMPLE_MAX_SECONDS or interval < SAMPLE_MIN_INTERVAL:
+        return jsonify({
+            "status": "error",
+            "message": f"seconds повинен бути від 0 до {SAMPLE_MAX_SECONDS}, "
+                       f"interval - не менше {SAMPLE_MIN_INTERVAL}"
+        }), 400
+
+    if not _sample_lock.acquire(blocking=False):
+        return jsonify({
+            "status": "error",
+            "message": "Семплювання в цьому процесі вже виконується"
+        }), 409
+    try:
+        stacks, samples = sample_stacks(seconds, interval)
+    finally:
+        _sample_lock.release()
+
+    body = ''.join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+    response = Response(body, mimetype='text/plain')
+    response.headers['Content-Disposition'] = f'attachment; filename="stacks-{os.getpid()}.txt"'
+    response.headers['X-Profile-Samples'] = str(samples)
+    return response
+
+
+def sample_stacks(seconds: float, interval: float = SAMPLE_DEFAULT_INTERVAL) -> Tuple['collections.Counter[str]', int]:
+    """
+    Періодично знімає стеки всіх потоків процесу (крім поточного)
+
+    Returns:
+        (Counter collapsed stack -> кількість знімків, кількість знімків)
+    """
+    own_id = threading.get_ident()
+    stacks: 'collections.Counter[str]' = collections.Counter()
+    labels: Dict[tuple, str] = {}
+    samples = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                key = (code, frame.f_lineno)
+                label = labels.get(key)
+                if label is None:
+                    label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+                    labels[key] = label
+                frames.append(label)
+                frame = frame.f_back
+            frames.append(names.get(thread_id, str(thread_id)))
+            stacks[';'.join(reversed(frames))] += 1
+        samples += 1
+        time.sleep(interval)
+    return stacks, samples
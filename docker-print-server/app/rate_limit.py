@@ -0,0 +1,283 @@
+"""
+Модуль для обмеження швидкості друку на принтер (token bucket)
+
+Ліміти задаються в config.json у ключі "rate_limits":
+{
+    "default":  {"labels_per_sec": 0, "bytes_per_sec": 0},
+    "models":   {"ZT410": {"labels_per_sec": 6}},
+    "printers": {"192.168.1.100:9100": {"labels_per_sec": 4, "auto_tune": true}}
+}
+Значення 0 або відсутність ліміту означає "без обмеження". Налаштування
+принтера мають пріоритет над моделлю, модель - над default.
+
+Відра токенів живуть у пам'яті процесу, тому кожен з GUNICORN_WORKERS
+процесів отримує рівну частку налаштованої швидкості: разом вони не
+перевищують ліміт принтера, але одне завдання не може використати частку
+інших процесів.
+"""
+import os
+import time
+import logging
+import threading
+from typing import Dict, Any, Optional, Tuple
+
+from app.config import load_config, get_config_path
+from app.scan_data import get_printer_info
+
+logger = logging.getLogger(__name__)
+
+# Максимальний час очікування токенів для синхронних запитів (в секундах)
+RATE_LIMIT_MAX_WAIT = float(os.getenv('RATE_LIMIT_MAX_WAIT', '30'))
+# Кількість процесів, між якими ділиться швидкість принтера (start.sh експортує GUNICORN_WORKERS)
+RATE_LIMIT_WORKERS = max(1, int(os.getenv('GUNICORN_WORKERS', '1')))
+# Як часто перевіряти зміни config.json та моделі принтера в даних сканування (в секундах)
+RATE_LIMIT_REFRESH_INTERVAL = 5
+
+# Параметри автопідбору швидкості за відповіддю ~HS
+AUTO_TUNE_INITIAL_RATE = 5.0       # етикеток/с, якщо ліміт не задано
+AUTO_TUNE_MIN_RATE = 0.5           # етикеток/с
+AUTO_TUNE_MAX_RATE = 50.0          # етикеток/с, якщо не задано max_labels_per_sec
+AUTO_TUNE_INCREASE = 0.5           # адитивне збільшення, етикеток/с
+AUTO_TUNE_DECREASE = 0.7           # мультиплікативне зменшення
+AUTO_TUNE_HIGH_WATERMARK = 8       # форматів у буфері принтера, після яких зменшуємо швидкість
+AUTO_TUNE_LOW_WATERMARK = 2        # форматів у буфері, нижче яких збільшуємо швидкість
+
+
+class TokenBucket:
+    """
+    Відро токенів: поповнюється зі швидкістю rate до місткості capacity
+
+    Запит більший за місткість дозволяється, коли відро повне, і переводить
+    його в "борг", тому великі пакети не блокуються назавжди, а наступні
+    запити чекають, поки борг не буде відпрацьовано.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self._lock = threading.Lock()
+        self.rate = rate
+        self.capacity = capacity if capacity else max(1.0, rate)
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def configure(self, rate: float, capacity: Optional[float] = None):
+        """Змінює швидкість та місткість, зберігаючи накопичені токени"""
+        with self._lock:
+            self._refill()
+            was_unlimited = self.rate <= 0
+            self.rate = rate
+            self.capacity = capacity if capacity else max(1.0, rate)
+            # Щойно обмежене відро стартує повним
+            self.tokens = self.capacity if was_unlimited else min(self.tokens, self.capacity)
+
+    def reserve(self, amount: float) -> float:
+        """
+        Резервує токени та повертає, скільки секунд потрібно почекати
+
+        Returns:
+            float: 0, якщо токени доступні одразу
+        """
+        with self._lock:
+            if self.rate <= 0:
+                return 0.0
+            self._refill()
+            needed = min(amount, self.capacity)
+            wait = max(0.0, (needed - self.tokens) / self.rate)
+            self.tokens -= amount
+            return wait
+
+    def refund(self, amount: float):
+        """Повертає раніше зарезервовані токени"""
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+class PrinterShaper:
+    """Обмежувач швидкості для одного принтера: етикетки/с та байти/с"""
+
+    def __init__(self, key: str, model: Optional[str] = None):
+        self.key = key
+        self.model = model
+        self.labels = TokenBucket(0)
+        self.bytes = TokenBucket(0)
+        self.auto_tune = False
+        self.max_labels_per_sec = AUTO_TUNE_MAX_RATE
+        # labels_per_sec та burst_labels з конфігурації (частка процесу), від яких стартує автопідбір
+        self.configured_labels_rate = 0.0
+        self.labels_burst: Optional[float] = None
+        self.waited_seconds = 0.0
+        # Коли востаннє перевірялася модель принтера (monotonic)
+        self.refreshed = time.monotonic()
+
+    def configure(self, limits: Dict[str, Any]):
+        """Застосовує ліміти з конфігурації (частку цього процесу)"""
+        labels_rate = float(limits.get('labels_per_sec') or 0) / RATE_LIMIT_WORKERS
+        bytes_rate = float(limits.get('bytes_per_sec') or 0) / RATE_LIMIT_WORKERS
+        self.auto_tune = bool(limits.get('auto_tune', False))
+        self.max_labels_per_sec = float(limits.get('max_labels_per_sec') or AUTO_TUNE_MAX_RATE) / RATE_LIMIT_WORKERS
+
+        configured_rate = labels_rate
+        if self.auto_tune:
+            # Під час автопідбору зберігаємо підібрану швидкість, доки в конфігурації
+            # не змінився labels_per_sec - тоді підбір починається з нього заново
+            if configured_rate == self.configured_labels_rate and self.labels.rate:
+                labels_rate = self.labels.rate
+            labels_rate = labels_rate or AUTO_TUNE_INITIAL_RATE / RATE_LIMIT_WORKERS
+            labels_rate = min(labels_rate, self.max_labels_per_sec)
+        self.configured_labels_rate = configured_rate
+        self.labels_burst = _share(limits.get('burst_labels'))
+
+        self.labels.configure(labels_rate, self.labels_burst)
+        self.bytes.configure(bytes_rate, _share(limits.get('burst_bytes')))
+
+    def acquire(self, labels: int, nbytes: int, max_wait: Optional[float] = None) -> bool:
+        """
+        Чекає, поки можна буде відправити labels етикеток розміром nbytes
+
+        Args:
+            labels: Кількість етикеток
+            nbytes: Розмір даних в байтах
+            max_wait: Максимальний час очікування (None - без обмеження)
+
+        Returns:
+            bool: False, якщо очікування перевищило б max_wait (токени не списуються)
+        """
+        wait = max(self.labels.reserve(labels), self.bytes.reserve(nbytes))
+        if max_wait is not None and wait > max_wait:
+            self.labels.refund(labels)
+            self.bytes.refund(nbytes)
+            return False
+        if wait > 0:
+            self.waited_seconds += wait
+            time.sleep(wait)
+        return True
+
+    def feedback(self, host_status: Dict[str, Any]):
+        """
+        Підлаштовує швидкість за станом буфера принтера (відповідь ~HS)
+
+        Поки буфер майже порожній - швидкість поступово зростає, коли
+        форматів у буфері забагато або буфер повний - різко зменшується.
+        """
+        if not self.auto_tune or not host_status:
+            return
+
+        formats = host_status.get('formats_in_buffer', 0)
+        rate = self.labels.rate
+        if host_status.get('buffer_full') or formats >= AUTO_TUNE_HIGH_WATERMARK:
+            rate = max(AUTO_TUNE_MIN_RATE, rate * AUTO_TUNE_DECREASE)
+        elif formats <= AUTO_TUNE_LOW_WATERMARK and not host_status.get('paused'):
+            rate = min(self.max_labels_per_sec, rate + AUTO_TUNE_INCREASE)
+        else:
+            return
+
+        if rate != self.labels.rate:
+            logger.debug(f"Автопідбір швидкості {self.key}: {self.labels.rate:.2f} -> {rate:.2f} етикеток/с "
+                         f"(форматів у буфері: {formats})")
+            self.labels.configure(rate, self.labels_burst)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Повертає поточні ліміти для API"""
+        return {
+            "printer": self.key,
+            "model": self.model,
+            "labels_per_sec": round(self.labels.rate, 3),
+            "bytes_per_sec": round(self.bytes.rate, 3),
+            "auto_tune": self.auto_tune,
+            # Швидкості вище - частка одного з workers процесів
+            "workers": RATE_LIMIT_WORKERS,
+            "waited_seconds": round(self.waited_seconds, 3)
+        }
+
+
+def _share(burst: Optional[float]) -> Optional[float]:
+    """Частка сплеску для одного процесу"""
+    return float(burst) / RATE_LIMIT_WORKERS if burst else None
+
+
+_shapers: Dict[str, PrinterShaper] = {}
+_shapers_lock = threading.Lock()
+_config_mtime: Optional[float] = None
+_config_checked: Optional[float] = None
+_rate_limits: Dict[str, Any] = {}
+
+
+def _load_rate_limits(force: bool = False) -> Dict[str, Any]:
+    """
+    Повертає секцію rate_limits, перечитуючи config.json лише після його зміни
+
+    Час зміни файлу перевіряється не частіше RATE_LIMIT_REFRESH_INTERVAL (або при force).
+    """
+    global _config_mtime, _config_checked, _rate_limits
+    now = time.monotonic()
+    if not force and _config_checked is not None and now - _config_checked < RATE_LIMIT_REFRESH_INTERVAL:
+        return _rate_limits
+    _config_checked = now
+    try:
+        mtime = os.path.getmtime(get_config_path())
+    except OSError:
+        mtime = None
+
+    if mtime != _config_mtime:
+        _config_mtime = mtime
+        rate_limits = load_config().get('rate_limits') or {}
+        _rate_limits = rate_limits if isinstance(rate_limits, dict) else {}
+        for shaper in _shapers.values():
+            shaper.configure(_resolve_limits(shaper.key, shaper.model))
+    return _rate_limits
+
+
+def _resolve_limits(key: str, model: Optional[str]) -> Dict[str, Any]:
+    """Об'єднує ліміти default, моделі та принтера"""
+    limits = dict(_rate_limits.get('default') or {})
+    if model:
+        models = _rate_limits.get('models') or {}
+        # Точний збіг або найдовший префікс ("ZT410" для "ZT410-200dpi")
+        matches = [name for name in models if model == name or model.startswith(name)]
+        if matches:
+            limits.update(models[max(matches, key=len)] or {})
+    limits.update((_rate_limits.get('printers') or {}).get(key) or {})
+    return limits
+
+
+def get_printer_shaper(ip: str, port: int, model: Optional[str] = None) -> PrinterShaper:
+    """
+    Повертає обмежувач швидкості для принтера
+
+    Args:
+        ip: IP-адреса принтера
+        port: Порт принтера
+        model: Модель принтера для лімітів з "models"; якщо не вказана,
+            береться з даних сканування (не частіше RATE_LIMIT_REFRESH_INTERVAL)
+    """
+    key = f"{ip}:{port}"
+    if model is None:
+        shaper = _shapers.get(key)
+        if shaper is not None and time.monotonic() - shaper.refreshed < RATE_LIMIT_REFRESH_INTERVAL:
+            model = shaper.model
+        else:
+            model = get_printer_info(ip, port).get('model')
+            if shaper is not None:
+                shaper.refreshed = time.monotonic()
+    with _shapers_lock:
+        _load_rate_limits()
+        shaper = _shapers.get(key)
+        if shaper is None:
+            shaper = PrinterShaper(key, model)
+            shaper.configure(_resolve_limits(key, model))
+            _shapers[key] = shaper
+        elif model and shaper.model != model:
+            shaper.model = model
+            shaper.configure(_resolve_limits(key, model))
+        return shaper
+
+
+def get_rate_limits_status() -> Tuple[Dict[str, Any], list]:
+    """Повертає налаштування rate_limits та поточний стан обмежувачів"""
+    with _shapers_lock:
+        rate_limits = _load_rate_limits(force=True)
+        return rate_limits, [shaper.to_dict() for shaper in _shapers.values()]
@@ -4,6 +4,7 @@
 import json
 import os
 import logging
+import threading
 from typing import Dict, Any, Optional, Tuple, List
 from pathlib import Path
 from datetime import datetime
@@ -26,6 +27,12 @@ DEFAULT_SCAN_DATA = {
 }
 
 
+# Кеш характеристик принтерів, перечитується лише після зміни файлу
+_printer_info_cache: Dict[str, Dict[str, Any]] = {}
+_printer_info_mtime: Optional[float] = None
+_printer_info_lock = threading.Lock()
+
+
 def get_scan_data_path() -> str:
     """Повертає шлях до файлу з даними сканування"""
     scan_data_path = os.getenv('SCAN_DATA_PATH', DEFAULT_SCAN_DATA_PATH)
@@ -118,14 +125,16 @@ def save_scan_data(scan_data: Dict[str, Any]) -> Tuple[bool, Optional[str]]:
         return False, error_msg
 
 
-def update_scan_data(network: Optional[str], port: int, printers: List[Dict[str, str]]) -> Tuple[bool, Optional[str]]:
+def update_scan_data(network: Optional[str], port: int, printers: List[Dict[str, Any]],
+                     ports: Optional[List[int]] = None) -> Tuple[bool, Optional[str]]:
     """
     Оновлює дані сканування
     
     Args:
         network: CIDR нотація мережі (може бути None)
-        port: Порт сканування
+        port: Основний порт сканування
         printers: Список знайдених принтерів
+        ports: Усі перевірені порти
         
     Returns:
         Tuple[bool, Optional[str]]: (успіх, повідомлення про помилку)
@@ -136,6 +145,39 @@ def update_scan_data(network: Optional[str], port: int, printers: List[Dict[str,
         "printers": printers,
         "last_scan": datetime.now().isoformat()
     }
+    if ports is not None:
+        scan_data["ports"] = ports
     
     return save_scan_data(scan_data)
 
+
+
+def get_printer_info(ip: str, port: int) -> Dict[str, Any]:
+    """
+    Повертає збережені характеристики принтера (модель, dpi, ширина друку тощо)
+
+    Дані беруться з останнього сканування без звернення до принтера;
+    файл перечитується лише після зміни.
+
+    Args:
+        ip: IP-адреса принтера
+        port: Порт принтера
+
+    Returns:
+        Dict з характеристиками принтера або порожній Dict, якщо принтер невідомий
+    """
+    global _printer_info_cache, _printer_info_mtime
+    try:
+        mtime = os.path.getmtime(get_scan_data_path())
+    except OSError:
+        return {}
+
+    with _printer_info_lock:
+        if mtime != _printer_info_mtime:
+            printers = load_scan_data().get('printers') or []
+            _printer_info_cache = {
+                f"{printer.get('ip')}:{printer.get('port')}": printer
+                for printer in printers if isinstance(printer, dict)
+            }
+            _printer_info_mtime = mtime
+        return dict(_printer_info_cache.get(f"{ip}:{port}", {}))
@@ -0,0 +1,341 @@
+"""
+Модуль для надійного журналювання завдань друку на диску (spool)
+
+Кожен процес gunicorn пише власний append-only журнал spool-*.log,
+утримуючи на ньому flock. Журнали без блокування належать процесам,
+що завершилися (наприклад, після перезапуску контейнера), і під час
+старту переймаються новим процесом: незавершені завдання відтворюються.
+"""
+import os
+import json
+import glob
+import fcntl
+import uuid
+import logging
+import threading
+import time
+from typing import Dict, Any, Optional, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Каталог журналів (змонтований том config/)
+DEFAULT_SPOOL_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)),
+    'config',
+    'spool'
+)
+
+# Скільки чекати додаткових записів перед fsync (групова фіксація), в секундах
+SPOOL_COMMIT_INTERVAL = float(os.getenv('SPOOL_COMMIT_INTERVAL', '0.002'))
+# Після скількох завершених завдань журнал ущільнюється
+SPOOL_COMPACT_THRESHOLD = int(os.getenv('SPOOL_COMPACT_THRESHOLD', '200'))
+# Пауза перед повторним записом групи після помилки запису (в секундах)
+SPOOL_RETRY_INTERVAL = 1
+
+# Типи записів журналу
+OP_ACCEPT = 'accept'
+OP_ACK = 'ack'
+OP_DONE = 'done'
+OP_FAIL = 'fail'
+OP_RESUME = 'resume'
+
+
+def get_spool_dir() -> str:
+    """Повертає шлях до каталогу журналів"""
+    return os.getenv('SPOOL_DIR', DEFAULT_SPOOL_DIR)
+
+
+def is_spool_enabled() -> bool:
+    """Чи увімкнено журналювання завдань (SPOOL_DISABLE=1 вимикає)"""
+    return os.getenv('SPOOL_DISABLE') != '1'
+
+
+def _read_journal(path: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Читає журнал та повертає незавершені завдання
+
+    Returns:
+        Dict[job_id, запис accept з актуальним acked; у невдалих завдань - поля error та failed_at]
+    """
+    live: Dict[str, Dict[str, Any]] = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Недописаний останній рядок після аварійного завершення
+                logger.warning(f"Пропущено пошкоджений запис {path}:{line_number}")
+                continue
+
+            job_id = record.get('job_id')
+            op = record.get('op')
+            if op == OP_ACCEPT:
+                # Після ущільнення завдання може бути записане двічі - зберігаємо більший acked
+                previous = live.get(job_id)
+                if previous is not None:
+                    record['acked'] = max(previous.get('acked', 0), record.get('acked', 0))
+                live[job_id] = record
+            elif op == OP_ACK and job_id in live:
+                live[job_id]['acked'] = max(live[job_id].get('acked', 0), record.get('acked', 0))
+            elif op == OP_FAIL and job_id in live:
+                live[job_id]['error'] = record.get('error')
+                live[job_id]['failed_at'] = record.get('ts')
+            elif op == OP_RESUME and job_id in live:
+                live[job_id].pop('error', None)
+                live[job_id].pop('failed_at', None)
+            elif op == OP_DONE:
+                live.pop(job_id, None)
+    return live
+
+
+class Spool:
+    """
+    Журнал завдань з груповою фіксацією
+
+    append() додає запис у буфер; фоновий потік записує всі накопичені
+    записи одним write() та одним fsync(). Записи з wait=True повертаються
+    лише після fsync, тому їх можна підтверджувати клієнту. Якщо запис групи
+    не вдався, записи з wait=True отримують помилку, а решта (контрольні
+    точки, відмітки done) записуються повторно з наступною групою.
+    """
+
+    def __init__(self, spool_dir: str):
+        self.spool_dir = spool_dir
+        self._cond = threading.Condition()
+        # (чекає виклик fsync, рядок журналу)
+        self._pending: List[Tuple[bool, bytes]] = []
+        self._appended_seq = 0
+        self._flushed_seq = 0
+        self._failed_seq = 0
+        # Після помилки в буфері є записи, що чекають повторного запису
+        self._retrying = False
+        self._error: Optional[str] = None
+        self._live: Dict[str, Dict[str, Any]] = {}
+        self._done_since_compaction = 0
+        self._file = None
+        self._path = None
+        self._writer = None
+
+    def open(self) -> List[Dict[str, Any]]:
+        """
+        Відкриває власний журнал та переймає журнали завершених процесів
+
+        Returns:
+            List[Dict]: Незавершені завдання з перейнятих журналів (запис accept з acked;
+                у невдалих завдань - поля error та failed_at)
+        """
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self._file, self._path = self._create_locked_file()
+
+        recovered: Dict[str, Dict[str, Any]] = {}
+        orphans = []
+        for path in sorted(glob.glob(os.path.join(self.spool_dir, 'spool-*.log'))):
+            if path == self._path:
+                continue
+            try:
+                f = open(path, 'ab')
+            except OSError as e:
+                logger.warning(f"Не вдалося відкрити журнал {path}: {str(e)}")
+                continue
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                # Журнал утримує живий процес
+                f.close()
+                continue
+            try:
+                recovered.update(_read_journal(path))
+                orphans.append((path, f))
+            except Exception as e:
+                logger.error(f"Помилка читання журналу {path}: {str(e)}", exc_info=True)
+                f.close()
+
+        self._writer = threading.Thread(target=self._write_loop, name='spool-writer', daemon=True)
+        self._writer.start()
+
+        # Спершу переносимо завдання у власний журнал, лише потім видаляємо старі
+        for record in recovered.values():
+            self._live[record['job_id']] = record
+            self.append(record, wait=False)
+        self.flush()
+        for path, f in orphans:
+            os.unlink(path)
+            f.close()
+
+        if recovered:
+            logger.info(f"Відновлено {len(recovered)} незавершених завдань з журналу")
+        return list(recovered.values())
+
+    def journal_accept(self, job_id: str, ip: str, port: int, labels: List[str], acked: int = 0,
+                       copies: Optional[List[int]] = None, priority: str = 'normal'):
+        """
+        Надійно записує прийняте завдання (повертається після fsync)
+
+        copies - скільки вхідних етикеток замінює кожна етикетка (після об'єднання в ^PQ)
+        """
+        record = {"op": OP_ACCEPT, "job_id": job_id, "ip": ip, "port": port, "labels": labels,
+                  "acked": acked, "copies": copies, "priority": priority, "ts": time.time()}
+        with self._cond:
+            self._live[job_id] = record
+        try:
+            self.append(record, wait=True)
+        except OSError:
+            with self._cond:
+                self._live.pop(job_id, None)
+            raise
+
+    def journal_ack(self, job_id: str, acked: int):
+        """Записує контрольну точку (без очікування fsync)"""
+        with self._cond:
+            record = self._live.get(job_id)
+            if record is not None:
+                record['acked'] = acked
+        self.append({"op": OP_ACK, "job_id": job_id, "acked": acked}, wait=False)
+
+    def journal_done(self, job_id: str):
+        """Записує завершення завдання; після порогу журнал ущільнюється"""
+        with self._cond:
+            self._live.pop(job_id, None)
+            self._done_since_compaction += 1
+        self.append({"op": OP_DONE, "job_id": job_id}, wait=False)
+
+    def journal_fail(self, job_id: str, error: str):
+        """Записує невдачу завдання: після перезапуску воно не відтворюється автоматично"""
+        now = time.time()
+        with self._cond:
+            record = self._live.get(job_id)
+            if record is not None:
+                record['error'] = error
+                record['failed_at'] = now
+        self.append({"op": OP_FAIL, "job_id": job_id, "error": error, "ts": now}, wait=False)
+
+    def journal_resume(self, job_id: str):
+        """Знімає відмітку невдачі: завдання знову відтворюється після перезапуску"""
+        with self._cond:
+            record = self._live.get(job_id)
+            if record is not None:
+                record.pop('error', None)
+                record.pop('failed_at', None)
+        self.append({"op": OP_RESUME, "job_id": job_id}, wait=False)
+
+    def append(self, record: Dict[str, Any], wait: bool = True):
+        """
+        Додає запис у журнал
+
+        Raises:
+            OSError: Якщо wait=True і записати журнал не вдалося
+        """
+        line = (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+        with self._cond:
+            self._pending.append((wait, line))
+            self._appended_seq += 1
+            seq = self._appended_seq
+            self._cond.notify_all()
+            if wait:
+                self._wait_for_seq(seq)
+                if self._flushed_seq < seq:
+                    raise OSError(self._error)
+
+    def flush(self):
+        """Чекає, поки всі додані записи будуть зафіксовані на диску (включно з повторними)"""
+        with self._cond:
+            seq = self._appended_seq
+            self._cond.wait_for(lambda: self._flushed_seq >= seq or (self._failed_seq >= seq and not self._retrying))
+
+    def _wait_for_seq(self, seq: int):
+        """Чекає фіксації або помилки групи з записом seq (викликається під замком)"""
+        self._cond.wait_for(lambda: self._flushed_seq >= seq or self._failed_seq >= seq)
+
+    def _write_loop(self):
+        """Фоновий потік групової фіксації"""
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending)
+            if SPOOL_COMMIT_INTERVAL > 0:
+                # Даємо іншим потокам додати записи в ту ж групу
+                time.sleep(SPOOL_COMMIT_INTERVAL)
+
+            with self._cond:
+                batch = self._pending
+                self._pending = []
+                seq = self._appended_seq
+
+            offset = None
+            try:
+                offset = self._file.tell()
+                self._file.write(b''.join(line for _, line in batch))
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                with self._cond:
+                    self._flushed_seq = seq
+                    self._retrying = False
+                    self._cond.notify_all()
+            except Exception as e:
+                logger.error(f"Помилка запису журналу {self._path}: {str(e)}", exc_info=True)
+                # Прибираємо частково записану групу, щоб наступні записи не склеїлися з нею
+                try:
+                    if offset is not None:
+                        self._file.truncate(offset)
+                except Exception:
+                    pass
+                with self._cond:
+                    self._error = f"Помилка запису журналу друку: {str(e)}"
+                    self._failed_seq = seq
+                    # Автор запису з wait=True отримав помилку; решту записуємо повторно
+                    retry = [item for item in batch if not item[0]]
+                    self._pending[:0] = retry
+                    self._retrying = self._retrying or bool(retry)
+                    self._cond.notify_all()
+                time.sleep(SPOOL_RETRY_INTERVAL)
+                continue
+
+            with self._cond:
+                should_compact = self._done_since_compaction >= SPOOL_COMPACT_THRESHOLD
+            if should_compact:
+                self._compact()
+
+    def _create_locked_file(self):
+        """Створює новий журнал під тимчасовим ім'ям, блокує його та перейменовує"""
+        name = f"spool-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        tmp_path = os.path.join(self.spool_dir, f".{name}.tmp")
+        path = os.path.join(self.spool_dir, f"{name}.log")
+        f = open(tmp_path, 'ab')
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        os.rename(tmp_path, path)
+        # fsync каталогу, щоб перейменування пережило аварійне завершення
+        dir_fd = os.open(self.spool_dir, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+        return f, path
+
+    def _compact(self):
+        """
+        Переписує журнал, залишаючи лише незавершені завдання
+
+        Викликається потоком запису, тому новий журнал будується без замка:
+        записи, додані тим часом, залишаються в буфері й потраплять уже в
+        новий журнал. Під замком виконується лише заміна файлу.
+        """
+        try:
+            with self._cond:
+                live = [dict(record) for record in self._live.values()]
+                self._done_since_compaction = 0
+
+            new_file, new_path = self._create_locked_file()
+            new_file.write(b''.join(
+                (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8') for record in live
+            ))
+            new_file.flush()
+            os.fsync(new_file.fileno())
+
+            with self._cond:
+                old_file, old_path = self._file, self._path
+                self._file, self._path = new_file, new_path
+
+            os.unlink(old_path)
+            old_file.close()
+            logger.info(f"Журнал друку ущільнено: {len(live)} незавершених завдань")
+        except Exception as e:
+            logger.error(f"Помилка ущільнення журналу: {str(e)}", exc_info=True)
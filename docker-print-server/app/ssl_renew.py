@@ -0,0 +1,257 @@
+"""
+Модуль для перевипуску SSL сертифікату у фоні
+
+Certbot запускається в контейнері certbot через Docker API у фоновому
+потоці процесу, що прийняв запит. Стан та вивід certbot пишуться в
+config/ssl_renew/, тому статус доступний з будь-якого процесу gunicorn.
+Одночасно виконується лише один перевипуск (flock на renew.lock).
+Перезапуск не потрібен: workers підхоплюють новий сертифікат самі (app/tls.py).
+"""
+import os
+import json
+import fcntl
+import glob
+import uuid
+import logging
+import threading
+import functools
+from datetime import datetime
+from typing import Dict, Any, Optional, Tuple, List
+
+logger = logging.getLogger(__name__)
+
+# Каталог стану перевипусків (змонтований том config/)
+DEFAULT_SSL_RENEW_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)),
+    'config',
+    'ssl_renew'
+)
+
+CERTBOT_CONTAINER = 'docker-print-server-certbot'
+# Скільки останніх перевипусків зберігати на диску
+SSL_RENEW_HISTORY = 10
+
+# Статуси перевипуску
+RENEW_RUNNING = 'running'
+RENEW_COMPLETED = 'completed'
+RENEW_FAILED = 'failed'
+
+
+def get_ssl_renew_dir() -> str:
+    """Повертає шлях до каталогу стану перевипусків"""
+    return os.getenv('SSL_RENEW_DIR', DEFAULT_SSL_RENEW_DIR)
+
+
+@functools.lru_cache(maxsize=None)
+def _docker():
+    """Імпортує docker SDK при першому використанні"""
+    import docker
+    return docker
+
+
+_docker_client = None
+_docker_client_lock = threading.Lock()
+
+
+def get_docker_client():
+    """Повертає спільний для процесу клієнт Docker API"""
+    global _docker_client
+    with _docker_client_lock:
+        if _docker_client is None:
+            _docker_client = _docker().from_env()
+        return _docker_client
+
+
+def build_certbot_command(domain: str, email: str) -> List[str]:
+    """Формує команду certbot для DNS challenge через DuckDNS"""
+    return [
+        'certbot', 'certonly',
+        '--authenticator', 'dns-duckdns',
+        '--dns-duckdns-credentials', '/etc/letsencrypt/duckdns.ini',
+        '-d', domain,
+        '--email', email,
+        '--agree-tos',
+        '--non-interactive',
+        '--force-renewal',
+        '--dns-duckdns-propagation-seconds', '120'
+    ]
+
+
+def _state_path(renewal_id: str) -> str:
+    return os.path.join(get_ssl_renew_dir(), f"{renewal_id}.json")
+
+
+def _output_path(renewal_id: str) -> str:
+    return os.path.join(get_ssl_renew_dir(), f"{renewal_id}.log")
+
+
+def _write_state(state: Dict[str, Any]):
+    """Атомарно записує стан перевипуску"""
+    path = _state_path(state['renewal_id'])
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def get_renewal(renewal_id: str, offset: int = 0) -> Optional[Dict[str, Any]]:
+    """
+    Повертає стан перевипуску та вивід certbot, починаючи з offset
+
+    Args:
+        renewal_id: Ідентифікатор перевипуску
+        offset: Зміщення у виводі (в байтах), з якого продовжити читання
+
+    Returns:
+        Dict зі станом, output та next_offset або None, якщо перевипуск не знайдено
+    """
+    if not renewal_id or os.path.basename(renewal_id) != renewal_id:
+        return None
+    try:
+        with open(_state_path(renewal_id), 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+    if state.get('status') == RENEW_RUNNING and not _is_running(renewal_id):
+        # Процес, що виконував перевипуск, завершився до його закінчення
+        state['status'] = RENEW_FAILED
+        state['error'] = "Перевипуск перервано: процес сервера завершився"
+
+    output = b''
+    try:
+        with open(_output_path(renewal_id), 'rb') as f:
+            f.seek(max(0, offset))
+            output = f.read()
+    except OSError:
+        pass
+
+    state['output'] = output.decode('utf-8', errors='replace')
+    state['next_offset'] = max(0, offset) + len(output)
+    return state
+
+
+def _is_running(renewal_id: str) -> bool:
+    """Чи утримує якийсь процес блокування перевипуску renewal_id"""
+    try:
+        with open(os.path.join(get_ssl_renew_dir(), 'renew.lock'), 'a+') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.seek(0)
+                return lock_file.read().strip() == renewal_id
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            return False
+    except OSError:
+        return True
+
+
+def start_renewal(domain: str, email: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """
+    Запускає перевипуск сертифікату у фоновому потоці
+
+    Returns:
+        Tuple[Optional[Dict], Optional[str]]: (стан нового перевипуску, None) або
+        (None, ідентифікатор перевипуску, що вже виконується)
+    """
+    renew_dir = get_ssl_renew_dir()
+    os.makedirs(renew_dir, exist_ok=True)
+
+    lock_file = open(os.path.join(renew_dir, 'renew.lock'), 'a+')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.seek(0)
+        running_id = lock_file.read().strip()
+        lock_file.close()
+        return None, running_id
+
+    try:
+        renewal_id = uuid.uuid4().hex
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(renewal_id)
+        lock_file.flush()
+
+        state = {
+            "renewal_id": renewal_id,
+            "domain": domain,
+            "status": RENEW_RUNNING,
+            "exit_code": None,
+            "error": None,
+            "started_at": datetime.now().isoformat(),
+            "finished_at": None
+        }
+        _write_state(state)
+        open(_output_path(renewal_id), 'wb').close()
+    except Exception:
+        lock_file.close()
+        raise
+
+    thread = threading.Thread(target=_run_renewal, args=(state, email, lock_file),
+                              name=f"ssl-renew-{renewal_id[:8]}", daemon=True)
+    thread.start()
+    logger.info(f"Початок перевипуску SSL сертифікату {renewal_id} для домену: {domain}")
+    return state, None
+
+
+def _run_renewal(state: Dict[str, Any], email: str, lock_file):
+    """Виконує certbot та пише його вивід"""
+    renewal_id = state['renewal_id']
+    domain = state['domain']
+    try:
+        with open(_output_path(renewal_id), 'ab') as output:
+            try:
+                client = get_docker_client()
+                certbot_container = client.containers.get(CERTBOT_CONTAINER)
+
+                # Низькорівневий API дозволяє читати вивід по мірі виконання
+                exec_id = client.api.exec_create(
+                    certbot_container.id, build_certbot_command(domain, email),
+                    stdout=True, stderr=True
+                )['Id']
+                for chunk in client.api.exec_start(exec_id, stream=True):
+                    output.write(chunk)
+                    output.flush()
+                state['exit_code'] = client.api.exec_inspect(exec_id).get('ExitCode')
+
+                if state['exit_code'] == 0:
+                    logger.info(f"Сертифікат успішно перевипущено для домену: {domain}")
+                    state['status'] = RENEW_COMPLETED
+                else:
+                    state['status'] = RENEW_FAILED
+                    state['error'] = f"certbot завершився з кодом {state['exit_code']}"
+                    logger.error(f"Помилка перевипуску сертифікату {renewal_id}: {state['error']}")
+
+            except _docker().errors.NotFound:
+                logger.error(f"Контейнер {CERTBOT_CONTAINER} не знайдено")
+                state['status'] = RENEW_FAILED
+                state['error'] = "Контейнер certbot не знайдено"
+
+            except Exception as e:
+                logger.error(f"Помилка виконання команди certbot: {str(e)}", exc_info=True)
+                state['status'] = RENEW_FAILED
+                state['error'] = f"Помилка виконання команди: {str(e)}"
+
+        state['finished_at'] = datetime.now().isoformat()
+        _write_state(state)
+    except Exception as e:
+        logger.error(f"Помилка збереження стану перевипуску {renewal_id}: {str(e)}", exc_info=True)
+    finally:
+        lock_file.close()
+        _prune()
+
+
+def _prune():
+    """Видаляє стан та вивід старих перевипусків"""
+    try:
+        states = sorted(glob.glob(os.path.join(get_ssl_renew_dir(), '*.json')), key=os.path.getmtime)
+        for path in states[:-SSL_RENEW_HISTORY]:
+            renewal_id = os.path.splitext(os.path.basename(path))[0]
+            for stale in (path, _output_path(renewal_id)):
+                try:
+                    os.unlink(stale)
+                except OSError:
+                    pass
+    except OSError as e:
+        logger.debug(f"Не вдалося прибрати старі перевипуски: {str(e)}")
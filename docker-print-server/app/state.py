@@ -0,0 +1,294 @@
+"""
+Модуль спільного стану сервера друку (state backend)
+
+Стан, який має бути однаковим для всіх процесів та реплік сервера - стан
+завдань, результати ідемпотентних запитів, реєстр принтерів - зберігається
+через StateBackend. Реалізації (змінна STATE_BACKEND):
+
+- file (за замовчуванням) - JSON файли в config/state/, спільні для
+  процесів gunicorn одного контейнера;
+- redis - Redis за адресою REDIS_URL, спільний для кількох реплік за
+  балансувальником навантаження.
+
+Ключі мають вигляд "простір:ім'я" (наприклад, "job:<id>"), значення -
+JSON-серіалізовані словники.
+"""
+import os
+import re
+import abc
+import json
+import time
+import fcntl
+import uuid
+import logging
+import threading
+import functools
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# Каталог файлового сховища (змонтований том config/)
+DEFAULT_STATE_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)),
+    'config',
+    'state'
+)
+
+DEFAULT_REDIS_URL = 'redis://localhost:6379/0'
+# Префікс ключів у Redis, щоб кілька інсталяцій могли ділити один сервер
+DEFAULT_REDIS_PREFIX = 'print-server:'
+# Таймаут операцій Redis (в секундах)
+REDIS_TIMEOUT = 2
+# Як часто файлове сховище видаляє прострочені записи (в секундах)
+FILE_STATE_CLEANUP_INTERVAL = 300
+
+_KEY_PART_RE = re.compile(r'^[A-Za-z0-9._-]+$')
+
+
+class StateBackend(abc.ABC):
+    """
+    Інтерфейс сховища спільного стану
+
+    Атрибут shared - чи бачать стан інші хости (репліки), а не лише процеси
+    цього контейнера.
+    """
+
+    shared = False
+
+    @abc.abstractmethod
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Повертає значення або None, якщо ключа немає чи строк дії минув"""
+
+    @abc.abstractmethod
+    def set(self, key: str, value: Dict[str, Any], ttl: Optional[float] = None):
+        """Записує значення; ttl - строк дії в секундах (None - безстроково)"""
+
+    @abc.abstractmethod
+    def add(self, key: str, value: Dict[str, Any], ttl: Optional[float] = None) -> bool:
+        """Атомарно записує значення, лише якщо ключа ще немає"""
+
+    @abc.abstractmethod
+    def delete(self, key: str):
+        """Видаляє ключ"""
+
+    @abc.abstractmethod
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        """
+        Захоплює або продовжує оренду (наприклад, роль лідера)
+
+        Returns:
+            bool: True, якщо оренда належить owner
+        """
+
+    @abc.abstractmethod
+    def release_lease(self, name: str, owner: str):
+        """Звільняє оренду, якщо вона належить owner"""
+
+    def cleanup(self):
+        """Видаляє прострочені записи, якщо сховище не робить цього саме (викликає лідер реєстру)"""
+
+
+class FileStateBackend(StateBackend):
+    """
+    Сховище в JSON файлах: ключ "job:abc" -> <root>/job/abc.json
+
+    Запис атомарний (os.replace), add() - через os.link тимчасового файлу.
+    Оренда тримається як flock і звільняється разом із процесом, тому
+    роль лідера переходить до іншого процесу одразу після його завершення.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._leases: Dict[str, Any] = {}
+        self._leases_lock = threading.Lock()
+        self._cleanup_at = time.monotonic() + FILE_STATE_CLEANUP_INTERVAL
+
+    def _path(self, key: str) -> str:
+        parts = key.split(':')
+        if not all(_KEY_PART_RE.match(part) for part in parts):
+            raise ValueError(f"Недопустимий ключ стану: {key}")
+        return os.path.join(self.root, *parts) + '.json'
+
+    def _read(self, path: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                record = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        expires_at = record.get('expires_at')
+        if expires_at is not None and expires_at <= time.time():
+            return None
+        return record
+
+    def _encode(self, value: Dict[str, Any], ttl: Optional[float]) -> str:
+        expires_at = time.time() + ttl if ttl else None
+        return json.dumps({"expires_at": expires_at, "value": value}, ensure_ascii=False)
+
+    def _write_tmp(self, path: str, data: str) -> str:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(data)
+        return tmp_path
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        record = self._read(self._path(key))
+        return record['value'] if record else None
+
+    def set(self, key: str, value: Dict[str, Any], ttl: Optional[float] = None):
+        path = self._path(key)
+        os.replace(self._write_tmp(path, self._encode(value, ttl)), path)
+
+    def add(self, key: str, value: Dict[str, Any], ttl: Optional[float] = None) -> bool:
+        path = self._path(key)
+        tmp_path = self._write_tmp(path, self._encode(value, ttl))
+        try:
+            for _ in range(2):
+                try:
+                    os.link(tmp_path, path)
+                    return True
+                except FileExistsError:
+                    if self._read(path) is not None:
+                        return False
+                    # Прострочений запис - видаляємо та пробуємо ще раз
+                    try:
+                        os.unlink(path)
+                    except FileNotFoundError:
+                        pass
+            return False
+        finally:
+            os.unlink(tmp_path)
+
+    def delete(self, key: str):
+        try:
+            os.unlink(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        with self._leases_lock:
+            if name in self._leases:
+                return True
+            lock_path = os.path.join(self.root, f"{name}.lock")
+            try:
+                os.makedirs(self.root, exist_ok=True)
+                lock_file = open(lock_path, 'a')
+            except OSError as e:
+                logger.warning(f"Не вдалося відкрити {lock_path}: {str(e)}")
+                return False
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                return False
+            self._leases[name] = lock_file
+            return True
+
+    def release_lease(self, name: str, owner: str):
+        with self._leases_lock:
+            lock_file = self._leases.pop(name, None)
+        if lock_file:
+            lock_file.close()
+
+    def cleanup(self):
+        """Видаляє прострочені записи не частіше FILE_STATE_CLEANUP_INTERVAL (інакше вони лише не читаються)"""
+        now = time.monotonic()
+        if now < self._cleanup_at:
+            return
+        self._cleanup_at = now + FILE_STATE_CLEANUP_INTERVAL
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                if not name.endswith('.json'):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        expires_at = json.load(f).get('expires_at')
+                    if expires_at is not None and expires_at <= time.time():
+                        os.unlink(path)
+                except (OSError, json.JSONDecodeError):
+                    continue
+
+
+@functools.lru_cache(maxsize=None)
+def _redis():
+    """Імпортує redis при першому використанні (потрібен лише для STATE_BACKEND=redis)"""
+    import redis
+    return redis
+
+
+class RedisStateBackend(StateBackend):
+    """Сховище в Redis, спільне для всіх реплік"""
+
+    shared = True
+
+    # Продовжує оренду власника або захоплює вільну
+    _ACQUIRE_LEASE = """
+        if redis.call('get', KEYS[1]) == ARGV[1] then
+            return redis.call('pexpire', KEYS[1], ARGV[2])
+        end
+        if redis.call('set', KEYS[1], ARGV[1], 'NX', 'PX', ARGV[2]) then
+            return 1
+        end
+        return 0
+    """
+    # Видаляє оренду, лише якщо вона належить власнику
+    _RELEASE_LEASE = """
+        if redis.call('get', KEYS[1]) == ARGV[1] then
+            return redis.call('del', KEYS[1])
+        end
+        return 0
+    """
+
+    def __init__(self, url: str, prefix: str = DEFAULT_REDIS_PREFIX):
+        self.prefix = prefix
+        self._client = _redis().Redis.from_url(
+            url, socket_timeout=REDIS_TIMEOUT, socket_connect_timeout=REDIS_TIMEOUT
+        )
+        self._acquire_lease = self._client.register_script(self._ACQUIRE_LEASE)
+        self._release_lease = self._client.register_script(self._RELEASE_LEASE)
+
+    def _ttl_ms(self, ttl: Optional[float]) -> Optional[int]:
+        return max(1, int(ttl * 1000)) if ttl else None
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        data = self._client.get(self.prefix + key)
+        return json.loads(data) if data is not None else None
+
+    def set(self, key: str, value: Dict[str, Any], ttl: Optional[float] = None):
+        self._client.set(self.prefix + key, json.dumps(value, ensure_ascii=False), px=self._ttl_ms(ttl))
+
+    def add(self, key: str, value: Dict[str, Any], ttl: Optional[float] = None) -> bool:
+        return bool(self._client.set(self.prefix + key, json.dumps(value, ensure_ascii=False),
+                                     px=self._ttl_ms(ttl), nx=True))
+
+    def delete(self, key: str):
+        self._client.delete(self.prefix + key)
+
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        return bool(self._acquire_lease(keys=[f"{self.prefix}lease:{name}"],
+                                        args=[owner, self._ttl_ms(ttl)]))
+
+    def release_lease(self, name: str, owner: str):
+        self._release_lease(keys=[f"{self.prefix}lease:{name}"], args=[owner])
+
+
+_backend: Optional[StateBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_state_backend() -> StateBackend:
+    """Повертає сховище спільного стану, налаштоване змінними оточення"""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            kind = os.getenv('STATE_BACKEND', 'file').lower()
+            if kind == 'redis':
+                url = os.getenv('REDIS_URL', DEFAULT_REDIS_URL)
+                _backend = RedisStateBackend(url, os.getenv('REDIS_PREFIX', DEFAULT_REDIS_PREFIX))
+                logger.info(f"Спільний стан зберігається в Redis: {url}")
+            elif kind == 'file':
+                _backend = FileStateBackend(os.getenv('STATE_DIR', DEFAULT_STATE_DIR))
+            else:
+                raise ValueError(f"Невідомий STATE_BACKEND: {kind} (підтримуються file, redis)")
+        return _backend
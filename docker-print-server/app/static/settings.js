@@ -266,25 +266,30 @@ async function renewCertificate() {
         
         const data = await response.json();
         
-        if (data.status === 'success') {
-            showStatus('Сертифікат успішно перевипущено! Контейнер перезапускається...', 'success');
-            renewBtn.textContent = 'Успішно!';
+        if (response.status === 202 || response.status === 409) {
+            // Перевипуск виконується у фоні (або вже був запущений) - стежимо за ним
+            const renewalId = data.renewal ? data.renewal.renewal_id : data.renewal_id;
+            const renewal = await waitForRenewal(renewalId);
             
-            // Оновлюємо статус через кілька секунд
-            setTimeout(() => {
-                checkServiceStatus();
+            if (renewal.status === 'completed') {
+                showStatus('Сертифікат успішно перевипущено! Сервер застосує його протягом кількох секунд', 'success');
+                renewBtn.textContent = 'Успішно!';
+                
+                // Оновлюємо статус через кілька секунд
+                setTimeout(() => {
+                    checkServiceStatus();
+                    renewBtn.textContent = originalText;
+                    renewBtn.disabled = false;
+                }, 5000);
+            } else {
+                showStatus('Помилка перевипуску: ' + (renewal.error || 'Невідома помилка'), 'error');
                 renewBtn.textContent = originalText;
                 renewBtn.disabled = false;
-            }, 10000);
+            }
         } else {
             showStatus('Помилка перевипуску: ' + (data.message || 'Невідома помилка'), 'error');
             renewBtn.textContent = originalText;
             renewBtn.disabled = false;
-            
-            // Показуємо детальну інформацію про помилку, якщо є
-            if (data.error) {
-                console.error('Деталі помилки:', data.error);
-            }
         }
     } catch (error) {
         console.error('Помилка перевипуску сертифікату:', error);
@@ -294,6 +299,33 @@ async function renewCertificate() {
     }
 }
 
+/**
+ * Очікує завершення перевипуску сертифікату, виводячи лог certbot в консоль
+ * @param {string} renewalId - Ідентифікатор перевипуску
+ * @returns {Promise<Object>} Фінальний стан перевипуску
+ */
+async function waitForRenewal(renewalId) {
+    let offset = 0;
+    while (true) {
+        const response = await fetch(`/api/ssl-renew/${encodeURIComponent(renewalId)}?offset=${offset}`);
+        const data = await response.json();
+        if (data.status !== 'success') {
+            throw new Error(data.message || 'Не вдалося отримати стан перевипуску');
+        }
+        
+        const renewal = data.renewal;
+        if (renewal.output) {
+            console.log(renewal.output);
+        }
+        offset = renewal.next_offset;
+        
+        if (renewal.status !== 'running') {
+            return renewal;
+        }
+        await new Promise(resolve => setTimeout(resolve, 2000));
+    }
+}
+
 /**
  * Завантажує конфігурацію з сервера
  */
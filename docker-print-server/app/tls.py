@@ -0,0 +1,109 @@
+"""
+Модуль для кешування TLS контексту gunicorn з підхопленням нових сертифікатів
+
+gunicorn запитує SSLContext (хук ssl_context у gunicorn.conf.py) для кожного
+з'єднання і за замовчуванням щоразу заново читає сертифікат та ключ.
+Тут контекст створюється один раз і замінюється на місці, коли файли
+SSL_CERT_PATH/SSL_KEY_PATH змінилися, тому перевипущений сертифікат
+застосовується без перезапуску процесів та обриву з'єднань.
+"""
+import os
+import ssl
+import time
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Any, Callable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Як часто перевіряти зміну файлів сертифіката (в секундах)
+SSL_RELOAD_CHECK_INTERVAL = float(os.getenv('SSL_RELOAD_CHECK_INTERVAL', '5'))
+
+
+def _file_signature(path: str) -> Optional[Tuple[int, int, int]]:
+    """Ознака версії файлу; certbot оновлює live/ symlink, тому враховуємо inode цілі"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+class ReloadingSSLContext:
+    """SSLContext, що перестворюється лише після зміни файлів сертифіката або ключа"""
+
+    def __init__(self, check_interval: float = SSL_RELOAD_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._context: Optional[ssl.SSLContext] = None
+        self._signature = None
+        self._checked_at = 0.0
+        self.loaded_at: Optional[str] = None
+        self.reloads = 0
+        self.error: Optional[str] = None
+
+    def get(self, certfile: str, keyfile: str,
+            factory: Callable[[], ssl.SSLContext]) -> ssl.SSLContext:
+        """
+        Повертає поточний контекст, за потреби перечитуючи сертифікат
+
+        Args:
+            certfile: Шлях до сертифіката
+            keyfile: Шлях до приватного ключа
+            factory: Функція, що створює новий SSLContext з цих файлів
+
+        Raises:
+            OSError, ssl.SSLError: Якщо контекст не вдалося створити жодного разу
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._context is not None and now - self._checked_at < self.check_interval:
+                return self._context
+            self._checked_at = now
+
+            signature = (_file_signature(certfile), _file_signature(keyfile))
+            if self._context is not None and signature == self._signature:
+                return self._context
+
+            try:
+                context = factory()
+            except (OSError, ssl.SSLError) as e:
+                if self._context is None:
+                    raise
+                # Наприклад, сертифікат вже оновлено, а ключ ще ні - спробуємо на наступній перевірці
+                self.error = str(e)
+                logger.warning(f"Не вдалося завантажити новий SSL сертифікат, "
+                               f"використовується попередній: {str(e)}")
+                return self._context
+
+            if self._context is not None:
+                self.reloads += 1
+                logger.info(f"Завантажено новий SSL сертифікат: {certfile}")
+            self._context = context
+            self._signature = signature
+            self.loaded_at = datetime.now().isoformat()
+            self.error = None
+            return context
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Повертає стан контексту для API"""
+        return {
+            "loaded_at": self.loaded_at,
+            "reloads": self.reloads,
+            "error": self.error
+        }
+
+
+_ssl_context = ReloadingSSLContext()
+
+
+def get_ssl_context(certfile: str, keyfile: str,
+                    factory: Callable[[], ssl.SSLContext]) -> ssl.SSLContext:
+    """Повертає спільний для процесу TLS контекст"""
+    return _ssl_context.get(certfile, keyfile, factory)
+
+
+def get_tls_status() -> Optional[Dict[str, Any]]:
+    """Повертає стан TLS контексту процесу або None, якщо процес не обслуговує HTTPS"""
+    return _ssl_context.to_dict() if _ssl_context.loaded_at else None
@@ -0,0 +1,556 @@
+"""
+Модуль для роботи з ZPL: токенізація, розбиття на етикетки та перевірка
+
+Токенізатор проходить потік один раз: пошук наступного префікса команди
+(^ або ~) виконується скомпільованим регулярним виразом, а дані команд
+(зокрема великі ^GF) пропускаються без розбору, тому багатомегабайтні
+завдання обробляються за мілісекунди. На токенізаторі побудовані
+split_labels, count_labels та parse_zpl/validate_zpl (перевірка перед друком).
+"""
+import os
+import re
+import functools
+from typing import Dict, Any, Iterator, List, NamedTuple, Optional, Tuple
+
+# Режим перевірки ZPL перед відправкою: strict - відхиляти завдання з
+# помилками, warn - лише повертати попередження, off - не перевіряти
+ZPL_VALIDATION = os.getenv('ZPL_VALIDATION', 'strict').lower()
+# Скільки помилок та попереджень повертати (решта лише рахується)
+MAX_REPORTED_ISSUES = 50
+
+DEFAULT_FORMAT_PREFIX = '^'
+DEFAULT_CONTROL_PREFIX = '~'
+DEFAULT_DELIMITER = ','
+
+# Команди, дані яких тягнуться до наступної команди формату (символ ~ в них - це дані)
+_FIELD_DATA_COMMANDS = frozenset(('FD', 'FV'))
+# Зміна префікса команд формату (CC), керуючих команд (CT) або роздільника (CD)
+_PREFIX_COMMANDS = frozenset(('CC', 'CT', 'CD'))
+# Дані поля (FD, FV) та кінець поля (FS)
+_FIELD_COMMANDS = frozenset(('FS',)) | _FIELD_DATA_COMMANDS
+# Команди, які розбирає parse_zpl (решта пропускається токенізатором)
+_STRUCTURE_COMMANDS = frozenset(('XA', 'XZ', 'PW', 'LL', 'PQ', 'GF')) | _FIELD_COMMANDS
+# Команди, потрібні для пошуку меж етикеток (^GF - щоб пропустити двійкові дані)
+_BOUNDARY_COMMANDS = frozenset(('XZ', 'GF'))
+# Параметри, довші за це (наприклад, дані ^GF), пропускаються пошуком str.find
+_SKIP_AHEAD = 4096
+# Команди, з якими копії етикетки відрізняються або які не друкують етикетку
+# (серіалізація, збереження формату чи зображення) - такі етикетки не об'єднуються в ^PQ
+_NO_COLLAPSE_COMMANDS = frozenset(('SN', 'SF', 'DF', 'IS')) | _PREFIX_COMMANDS
+# Максимальна кількість копій ^PQ
+MAX_PRINT_QUANTITY = 99999999
+
+
+class ZplCommand(NamedTuple):
+    """Команда ZPL: тип префікса, назва (у верхньому регістрі), параметри та зміщення в потоці"""
+    prefix: str
+    name: str
+    params: str
+    start: int
+    end: int
+
+
+class LabelInfo:
+    """Характеристики однієї етикетки (формату ^XA…^XZ)"""
+
+    __slots__ = ('index', 'start', 'end', 'width', 'length', 'quantity', 'fields', 'graphics')
+
+    def __init__(self, index: int, start: int):
+        self.index = index
+        self.start = start
+        self.end = start
+        self.width: Optional[int] = None        # ^PW, точок
+        self.length: Optional[int] = None       # ^LL, точок
+        self.quantity: Optional[int] = None     # ^PQ, кількість копій
+        self.fields = 0                         # поля з даними (^FD, ^FV)
+        self.graphics: List[Dict[str, Any]] = []
+
+    @property
+    def copies(self) -> int:
+        """Скільки фізичних етикеток надрукує формат"""
+        return self.quantity or 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "index": self.index,
+            "bytes": self.end - self.start,
+            "width": self.width,
+            "length": self.length,
+            "quantity": self.quantity,
+            "fields": self.fields,
+            "graphics": self.graphics
+        }
+
+
+class ZplDocument:
+    """
+    Результат розбору ZPL потоку
+
+    labels - етикетки з межами в потоці; boundaries - кінці всіх команд ^XZ
+    (за ними розбивається потік); errors - структурні помилки, з якими
+    завдання не слід відправляти; warnings - підозрілі, але допустимі місця.
+    """
+
+    def __init__(self, zpl: str):
+        self.zpl = zpl
+        self.labels: List[LabelInfo] = []
+        self.boundaries: List[int] = []
+        self.errors: List[str] = []
+        self.warnings: List[str] = []
+        self.error_count = 0
+        self.warning_count = 0
+
+    @property
+    def ok(self) -> bool:
+        return self.error_count == 0
+
+    @property
+    def printed_labels(self) -> int:
+        """Скільки фізичних етикеток буде надруковано з урахуванням ^PQ"""
+        return sum(label.copies for label in self.labels)
+
+    def error(self, message: str):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ISSUES:
+            self.errors.append(message)
+
+    def warning(self, message: str):
+        self.warning_count += 1
+        if len(self.warnings) < MAX_REPORTED_ISSUES:
+            self.warnings.append(message)
+
+    def to_dict(self, include_labels: bool = False) -> Dict[str, Any]:
+        """Повертає підсумок розбору для API"""
+        result = {
+            "valid": self.ok,
+            "labels": len(self.labels),
+            "printed_labels": self.printed_labels,
+            "bytes": len(self.zpl),
+            "errors": self.errors,
+            "warnings": self.warnings,
+            "error_count": self.error_count,
+            "warning_count": self.warning_count
+        }
+        if include_labels:
+            result["label_details"] = [label.to_dict() for label in self.labels]
+        return result
+
+
+@functools.lru_cache(maxsize=32)
+def _command_re(format_prefix: str, control_prefix: str, commands: Optional[frozenset] = None):
+    """
+    Регулярний вираз початку команди: (префікс)(назва)
+
+    Якщо задано commands, шукаються лише ці команди (та зміна префіксів),
+    а решта потоку пропускається всередині регулярного виразу.
+    """
+    prefixes = re.escape(format_prefix + control_prefix)
+    if commands is None:
+        names = f'[^{prefixes}]{{0,2}}'
+    else:
+        # Регістр враховується класами символів: з re.IGNORECASE пошук удвічі повільніший
+        names = '|'.join(''.join(f'[{char}{char.lower()}]' for char in name)
+                         for name in sorted(commands | _PREFIX_COMMANDS))
+    return re.compile(f'([{prefixes}])({names})')
+
+
+def tokenize(zpl: str, commands: Optional[frozenset] = None) -> Iterator[ZplCommand]:
+    """
+    Розбиває ZPL потік на команди за один прохід
+
+    Враховує зміну префіксів (^CC, ~CC, ^CT, ~CT) та роздільника (^CD, ~CD),
+    дані ^FD/^FV (символ ~ всередині - це дані) та двійкові дані ^GF
+    (формати B та C пропускаються за вказаною довжиною).
+    Текст поза командами ігнорується, як і принтером.
+
+    Args:
+        zpl: ZPL потік
+        commands: Повертати лише ці команди (назви у верхньому регістрі);
+            решта пропускається регулярним виразом без розбору, що значно
+            швидше на потоках із сотнями тисяч команд
+
+    Yields:
+        ZplCommand; prefix - '^' для команд формату та '~' для керуючих
+        команд, навіть якщо префікси змінено через ^CC/^CT
+    """
+    format_prefix = DEFAULT_FORMAT_PREFIX
+    control_prefix = DEFAULT_CONTROL_PREFIX
+    delimiter = DEFAULT_DELIMITER
+    length = len(zpl)
+    pos = 0
+    # Позиція наступного керуючого префікса: рідкісний символ, тому шукаємо його
+    # не для кожної команди, а лише коли пройшли попередню знайдену позицію
+    next_control = -1
+
+    while pos < length:
+        command_re = _command_re(format_prefix, control_prefix, commands)
+        restart = None
+        for match in command_re.finditer(zpl, pos):
+            prefix, name = match.groups()
+            start, params_start = match.span()
+            is_format = prefix == format_prefix
+            name = name.upper()
+
+            next_format = zpl.find(format_prefix, params_start)
+            if next_format < 0:
+                next_format = length
+            if next_control < params_start:
+                next_control = zpl.find(control_prefix, params_start)
+                if next_control < 0:
+                    next_control = length
+            end = natural_end = min(next_format, next_control)
+
+            if name in _PREFIX_COMMANDS:
+                # Параметр - один символ: новий префікс або роздільник
+                end = restart = min(length, params_start + 1)
+            elif is_format and name in _FIELD_DATA_COMMANDS:
+                end = next_format
+            elif name == 'GF':
+                end = _binary_graphic_end(zpl, params_start, delimiter) or natural_end
+
+            params = zpl[params_start:end]
+            yield ZplCommand(DEFAULT_FORMAT_PREFIX if is_format else DEFAULT_CONTROL_PREFIX,
+                             name, params, start, end)
+
+            if restart is not None:
+                if params:
+                    if name == 'CC':
+                        format_prefix = params
+                    elif name == 'CT':
+                        control_prefix = params
+                    else:
+                        delimiter = params
+                    next_control = -1
+                break
+            if end > natural_end or end - params_start > _SKIP_AHEAD:
+                # Дані містять символи префіксів або досить довгі, щоб не сканувати їх регулярним виразом
+                restart = end
+                break
+
+        if restart is None:
+            break
+        pos = restart
+
+
+def _binary_graphic_end(zpl: str, params_start: int, delimiter: str) -> Optional[int]:
+    """
+    Повертає кінець двійкових даних ^GFB/^GFC (можуть містити символи префіксів)
+    або None для ASCII даних ^GFA
+    """
+    if zpl[params_start:params_start + 1].upper() not in ('B', 'C'):
+        return None
+    header_end = params_start
+    for _ in range(4):
+        header_end = zpl.find(delimiter, header_end)
+        if header_end < 0:
+            return None
+        header_end += 1
+    try:
+        byte_count = int(zpl[params_start:header_end].split(delimiter)[1])
+    except (ValueError, IndexError):
+        return None
+    return min(len(zpl), header_end + max(0, byte_count)) or None
+
+
+def _parse_int(value: str) -> Optional[int]:
+    value = value.strip()
+    return int(value) if value.isdigit() else None
+
+
+def parse_zpl(zpl: str, print_width: Optional[int] = None,
+              label_length: Optional[int] = None) -> ZplDocument:
+    """
+    Розбирає ZPL потік: межі етикеток, ^PW/^LL/^PQ, ^GF, кількість полів, помилки
+
+    Токенізатор повертає лише структурні команди та команди полів (поля
+    рахуються в тому ж проході), а решта команд пропускається регулярним
+    виразом без розбору.
+
+    Args:
+        zpl: ZPL потік
+        print_width: Ширина друку принтера в точках (для попередження про ^PW ширший за принтер)
+        label_length: Максимальна довжина етикетки принтера в точках
+
+    Returns:
+        ZplDocument
+    """
+    doc = ZplDocument(zpl or '')
+    if not doc.zpl.strip():
+        doc.error("ZPL порожній")
+        return doc
+
+    label: Optional[LabelInfo] = None
+    delimiter = DEFAULT_DELIMITER
+    # Чи є в етикетці поле, ще не закрите ^FS
+    field_open = False
+    outside_warned = False
+
+    for cmd in tokenize(doc.zpl, _STRUCTURE_COMMANDS):
+        name = cmd.name
+
+        if name in _PREFIX_COMMANDS:
+            if name == 'CD' and cmd.params:
+                delimiter = cmd.params
+            continue
+
+        if cmd.prefix == DEFAULT_CONTROL_PREFIX:
+            # Керуючі команди виконуються принтером одразу і допустимі будь-де
+            continue
+
+        if name == 'XA':
+            if label is not None:
+                doc.error(f"Етикетка {label.index + 1}: ^XA до завершення попередньої етикетки (^XZ)")
+            label = LabelInfo(len(doc.labels), cmd.start)
+            field_open = False
+            continue
+
+        if name == 'XZ':
+            doc.boundaries.append(cmd.end)
+            if label is None:
+                doc.warning(f"^XZ без ^XA на позиції {cmd.start}")
+                continue
+            label.end = cmd.end
+            if field_open:
+                doc.warning(f"Етикетка {label.index + 1}: поле не закрите ^FS")
+            doc.labels.append(label)
+            label = None
+            continue
+
+        if label is None:
+            if not outside_warned:
+                doc.warning(f"Команда ^{name} поза межами етикетки (^XA…^XZ) ігнорується принтером")
+                outside_warned = True
+            continue
+
+        if name in _FIELD_DATA_COMMANDS:
+            label.fields += 1
+            field_open = True
+        elif name == 'FS':
+            field_open = False
+        elif name == 'PW':
+            label.width = _parse_dimension(doc, label, '^PW', cmd.params, delimiter)
+            if label.width and print_width and label.width > print_width:
+                doc.warning(f"Етикетка {label.index + 1}: ^PW{label.width} ширше за ширину друку принтера ({print_width})")
+        elif name == 'LL':
+            label.length = _parse_dimension(doc, label, '^LL', cmd.params, delimiter)
+            if label.length and label_length and label.length > label_length:
+                doc.warning(f"Етикетка {label.index + 1}: ^LL{label.length} довше за максимальну довжину принтера ({label_length})")
+        elif name == 'PQ':
+            if cmd.params.split(delimiter)[0].strip():
+                label.quantity = _parse_dimension(doc, label, '^PQ', cmd.params, delimiter)
+        elif name == 'GF':
+            _parse_graphic_field(doc, label, cmd.params, delimiter)
+
+    if label is not None:
+        doc.error(f"Етикетка {label.index + 1}: немає ^XZ - принтер об'єднає її з наступними даними")
+        label.end = len(doc.zpl)
+        if field_open:
+            doc.warning(f"Етикетка {label.index + 1}: поле не закрите ^FS")
+        doc.labels.append(label)
+
+    return doc
+
+
+def _parse_dimension(doc: ZplDocument, label: LabelInfo, command: str, value: str,
+                     delimiter: str) -> Optional[int]:
+    number = _parse_int(value.split(delimiter)[0])
+    if number is None:
+        doc.error(f"Етикетка {label.index + 1}: некоректне значення {command}: '{value.strip()[:20]}'")
+    return number
+
+
+def _parse_graphic_field(doc: ZplDocument, label: LabelInfo, params: str, delimiter: str):
+    """Перевіряє заголовок ^GFa,b,c,d та розмір даних"""
+    parts = params.split(delimiter, 4)
+    if len(parts) < 5:
+        doc.error(f"Етикетка {label.index + 1}: ^GF без обов'язкових параметрів a,b,c,d,data")
+        return
+
+    graphic_format = parts[0].strip().upper() or 'A'
+    byte_count, field_count, row_bytes = (_parse_int(part) for part in parts[1:4])
+    if graphic_format not in ('A', 'B', 'C') or None in (byte_count, field_count, row_bytes) or not row_bytes:
+        doc.error(f"Етикетка {label.index + 1}: некоректний заголовок ^GF{delimiter.join(parts[:4])}")
+        return
+
+    graphic = {
+        "format": graphic_format,
+        "bytes": byte_count,
+        "field_bytes": field_count,
+        "bytes_per_row": row_bytes,
+        "width_dots": row_bytes * 8,
+        "height_dots": field_count // row_bytes
+    }
+    label.graphics.append(graphic)
+
+    if field_count % row_bytes:
+        doc.warning(f"Етикетка {label.index + 1}: розмір ^GF ({field_count}) не кратний байтам у рядку ({row_bytes})")
+
+    data = parts[4]
+    if graphic_format in ('B', 'C'):
+        if len(data) < byte_count:
+            doc.error(f"Етикетка {label.index + 1}: ^GF очікує {byte_count} байт даних, отримано {len(data)}")
+    else:
+        data = data.strip()
+        hex_chars = len(data) - data.count('\n') - data.count('\r')
+        # Розмір можна перевірити лише для нестиснених шістнадцяткових даних
+        if data and hex_chars != byte_count * 2 and _is_plain_hex(data):
+            doc.warning(f"Етикетка {label.index + 1}: ^GF очікує {byte_count * 2} шістнадцяткових символів, "
+                        f"отримано {hex_chars}")
+
+
+_NON_HEX_RE = re.compile(r'[^0-9A-Fa-f\r\n]')
+
+
+def _is_plain_hex(data: str) -> bool:
+    return _NON_HEX_RE.search(data) is None
+
+
+def label_boundaries(zpl: str) -> List[int]:
+    """Повертає позиції кінців усіх команд ^XZ (без розбору решти команд)"""
+    return [cmd.end for cmd in tokenize(zpl, _BOUNDARY_COMMANDS)
+            if cmd.name == 'XZ' and cmd.prefix == DEFAULT_FORMAT_PREFIX]
+
+
+def split_labels(zpl: str) -> List[str]:
+    """
+    Розбиває ZPL потік на окремі етикетки по межах ^XA…^XZ
+
+    Команди поза межами етикеток (наприклад ~SD, ~JA перед першою ^XA)
+    приєднуються до наступної етикетки, хвіст після останньої ^XZ - до
+    останньої етикетки, тому склеювання результату дає вихідний потік.
+
+    Args:
+        zpl: ZPL потік з однією або кількома етикетками
+
+    Returns:
+        List[str]: Список етикеток (порожній, якщо ZPL порожній)
+    """
+    if not zpl or not zpl.strip():
+        return []
+    return _split(zpl, label_boundaries(zpl))
+
+
+def split_document(doc: ZplDocument) -> List[str]:
+    """Розбиває вже розібраний потік на етикетки (див. split_labels)"""
+    return _split(doc.zpl, doc.boundaries)
+
+
+def _split(zpl: str, boundaries: List[int]) -> List[str]:
+    labels = []
+    label_start = 0
+    for boundary in boundaries:
+        labels.append(zpl[label_start:boundary])
+        label_start = boundary
+
+    tail = zpl[label_start:]
+    if labels:
+        labels[-1] += tail
+    else:
+        # Немає жодної ^XZ - відправляємо потік як одну "етикетку"
+        labels.append(zpl)
+    return labels
+
+
+def count_labels(zpl: str) -> int:
+    """Повертає кількість етикеток (команд ^XZ) в ZPL потоці, мінімум 1"""
+    return max(1, len(label_boundaries(zpl)))
+
+
+def validate_zpl(zpl: str, print_width: Optional[int] = None,
+                 label_length: Optional[int] = None) -> ZplDocument:
+    """
+    Перевіряє ZPL перед відправкою відповідно до ZPL_VALIDATION
+
+    Returns:
+        ZplDocument; у режимі warn помилки переносяться в попередження,
+        у режимі off повертається розбір без перевірок
+    """
+    doc = parse_zpl(zpl, print_width, label_length)
+    if ZPL_VALIDATION == 'off':
+        doc.errors, doc.warnings = [], []
+        doc.error_count = doc.warning_count = 0
+    elif ZPL_VALIDATION == 'warn' and doc.errors:
+        doc.warnings = doc.errors + doc.warnings
+        doc.warning_count += doc.error_count
+        doc.errors, doc.error_count = [], 0
+    return doc
+
+
+def collapse_repeated_labels(labels: List[str], max_copies: Optional[int] = None) -> Tuple[List[str], List[int]]:
+    """
+    Замінює послідовні однакові етикетки однією етикеткою з ^PQ N
+
+    Наявний ^PQ множиться на кількість копій. Етикетки з серіалізацією
+    (^SN, ^SF), збереженням формату (^DF), керуючими командами чи кількома
+    форматами залишаються як є. Довга серія ділиться на частини не більше
+    max_copies копій, щоб між ними можна було вставити інші етикетки.
+
+    Args:
+        labels: Етикетки (по одному формату ^XA…^XZ)
+        max_copies: Максимум однакових етикеток в одній (None - без обмеження)
+
+    Returns:
+        (етикетки, скільки вхідних етикеток замінює кожна з них)
+    """
+    result = []
+    copies_per_label = []
+    index = 0
+    while index < len(labels):
+        label = labels[index]
+        run_end = index + 1
+        while run_end < len(labels) and labels[run_end] == label:
+            run_end += 1
+        remaining = run_end - index
+        chunk = min(remaining, max_copies) if max_copies else remaining
+
+        merged = _with_quantity(label, chunk) if chunk > 1 else None
+        if merged is None:
+            result.extend(labels[index:run_end])
+            copies_per_label.extend([1] * remaining)
+        else:
+            while remaining > 0:
+                copies = min(remaining, chunk)
+                if copies == chunk:
+                    result.append(merged)
+                else:
+                    result.append(_with_quantity(label, copies) if copies > 1 else label)
+                copies_per_label.append(copies)
+                remaining -= copies
+        index = run_end
+
+    return result, copies_per_label
+
+
+def _with_quantity(label: str, copies: int) -> Optional[str]:
+    """Повертає етикетку з кількістю копій, помноженою на copies, або None, якщо це небезпечно"""
+    formats = 0
+    quantity_cmd = None
+    end_cmd = None
+    for cmd in tokenize(label):
+        if cmd.prefix == DEFAULT_CONTROL_PREFIX or cmd.name in _NO_COLLAPSE_COMMANDS:
+            return None
+        if cmd.name == 'XA':
+            formats += 1
+        elif cmd.name == 'PQ':
+            quantity_cmd = cmd
+        elif cmd.name == 'XZ':
+            if end_cmd is not None:
+                return None
+            end_cmd = cmd
+    if formats != 1 or end_cmd is None:
+        return None
+
+    if quantity_cmd is None:
+        if copies > MAX_PRINT_QUANTITY:
+            return None
+        # Вставляємо ^PQ перед ^XZ з тим самим символом префікса
+        prefix = label[end_cmd.start]
+        return f"{label[:end_cmd.start]}{prefix}PQ{copies}{label[end_cmd.start:]}"
+
+    params = quantity_cmd.params.split(DEFAULT_DELIMITER)
+    quantity = _parse_int(params[0]) if params[0].strip() else 1
+    if not quantity or quantity * copies > MAX_PRINT_QUANTITY:
+        return None
+    params[0] = str(quantity * copies)
+    params_start = quantity_cmd.end - len(quantity_cmd.params)
+    return f"{label[:params_start]}{DEFAULT_DELIMITER.join(params)}{label[quantity_cmd.end:]}"
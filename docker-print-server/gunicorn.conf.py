@@ -0,0 +1,59 @@
+"""
+Конфігурація gunicorn
+
+Параметри запуску (bind, workers, SSL) передає start.sh; тут лише хуки,
+режим preload та кешування TLS контексту.
+
+GUNICORN_PRELOAD=1 - додаток імпортується один раз у master, а workers
+отримують його через fork (copy-on-write), тому стартують і
+перезапускаються швидше. Фонові служби (журнал завдань, реєстр принтерів)
+у цьому режимі запускаються в кожному worker після fork.
+
+Workers працюють у режимі gthread (GUNICORN_THREADS потоків на процес):
+кожне WebSocket з'єднання /ws/print займає потік на весь час свого життя,
+а синхронний worker обслуговував би лише одне з'єднання і був би
+перезапущений за таймаутом.
+"""
+import os
+
+preload_app = os.getenv('GUNICORN_PRELOAD') == '1'
+# Скільки чекати завершення worker під час плавного перезавантаження (SIGHUP)
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+# Потоків на worker (кількість одночасних запитів і WebSocket з'єднань на процес)
+threads = int(os.getenv('GUNICORN_THREADS', '16'))
+
+
+def post_fork(server, worker):
+    """Запускає фонові служби в щойно створеному worker"""
+    if preload_app:
+        from app.main import start_background_services
+        start_background_services()
+
+
+def ssl_context(conf, default_ssl_context_factory):
+    """
+    Повертає кешований TLS контекст замість створення нового на кожне з'єднання
+
+    Новий сертифікат (наприклад, після перевипуску certbot) підхоплюється на
+    місці протягом SSL_RELOAD_CHECK_INTERVAL секунд.
+    """
+    from app.tls import get_ssl_context
+    return get_ssl_context(conf.certfile, conf.keyfile, default_ssl_context_factory)
+
+
+def worker_exit(server, worker):
+    """
+    Дає завданням друку worker завершитися перед його зупинкою
+
+    Незавершені за graceful_timeout завдання залишаються в журналі та
+    відтворюються після наступного старту. Після цього на диск записується
+    буфер історії друку.
+    """
+    # Хук також викликається в master при збиранні завершених workers
+    if os.getpid() != worker.pid:
+        return
+    from app.jobs import drain_jobs
+    if not drain_jobs(max(0, graceful_timeout - 2)):
+        server.log.warning("Worker %s завершується з незавершеними завданнями друку", worker.pid)
+    from app.history import flush_history
+    flush_history()
@@ -4,11 +4,18 @@ set -e
 APP_MODULE=${APP_MODULE:-app.main:app}
 APP_PORT=${APP_PORT:-443}
 WORKERS=${GUNICORN_WORKERS:-4}
+# Кількість процесів потрібна додатку, щоб ділити між ними ліміти швидкості принтерів
+export GUNICORN_WORKERS="${WORKERS}"
 TIMEOUT=${GUNICORN_TIMEOUT:-120}
 
+if [ "${GUNICORN_PRELOAD}" = "1" ]; then
+  echo "[start.sh] GUNICORN_PRELOAD=1, додаток завантажується один раз у master процесі" >&2
+fi
+
 if [ "${SSL_DISABLE}" = "1" ]; then
   echo "[start.sh] SSL_DISABLE=1, стартуємо без SSL на порту ${APP_PORT}" >&2
-  exec gunicorn --bind "0.0.0.0:${APP_PORT}" \
+  exec gunicorn --config gunicorn.conf.py \
+    --bind "0.0.0.0:${APP_PORT}" \
     --workers "${WORKERS}" \
     --timeout "${TIMEOUT}" \
     "${APP_MODULE}"
@@ -30,7 +37,8 @@ if [ ! -f "${SSL_KEY_PATH}" ]; then
 fi
 
 echo "[start.sh] Запускаємо gunicorn на порту ${APP_PORT} з SSL"
-exec gunicorn --bind "0.0.0.0:${APP_PORT}" \
+exec gunicorn --config gunicorn.conf.py \
+  --bind "0.0.0.0:${APP_PORT}" \
   --workers "${WORKERS}" \
   --timeout "${TIMEOUT}" \
   --certfile "${SSL_CERT_PATH}" \
@@ -0,0 +1,128 @@
+"""Спільні фікстури тестів: ізольовані каталоги даних, фейковий принтер та менеджер завдань"""
+import os
+import socket
+import threading
+import time
+
+import pytest
+
+from app import jobs as jobs_module
+from app.jobs import JobManager
+
+# Файли, які сервер створює або читає за замовчуванням у config/
+_DATA_PATHS = {
+    'CONFIG_PATH': 'config.json',
+    'SCAN_DATA_PATH': 'scan_data.json',
+    'HISTORY_PATH': 'history.db',
+    'STATE_DIR': 'state',
+    'SPOOL_DIR': 'spool',
+    'PROFILE_DIR': 'profiles',
+    'SSL_RENEW_DIR': 'ssl_renew',
+}
+
+
+@pytest.fixture(autouse=True, scope='session')
+def _data_dir(tmp_path_factory):
+    """Не даємо тестам писати в config/ репозиторію"""
+    root = tmp_path_factory.mktemp('config')
+    saved = {name: os.environ.get(name) for name in _DATA_PATHS}
+    for name, path in _DATA_PATHS.items():
+        os.environ[name] = str(root / path)
+    # Імпорт app.main не запускає фонові служби процесу (журнал завдань, реєстр принтерів)
+    saved['GUNICORN_PRELOAD'] = os.environ.get('GUNICORN_PRELOAD')
+    os.environ['GUNICORN_PRELOAD'] = '1'
+    yield root
+    for name, value in saved.items():
+        if value is None:
+            os.environ.pop(name, None)
+        else:
+            os.environ[name] = value
+
+
+def host_status_response(formats: int = 0) -> bytes:
+    """Відповідь на ~HS з formats форматами в буфері"""
+    return (f"\x02030,0,0,1245,{formats:03d},0,0,0,000,0,0,0\x03\r\n"
+            f"\x02000,0,0,0,0,2,4,0,00000000,1,000\x03\r\n"
+            f"\x021234,0\x03\r\n").encode('ascii')
+
+
+class FakePrinter:
+    """
+    ZPL принтер на 127.0.0.1: записує отримані етикетки (^XA...^XZ) та відповідає на ~HS
+
+    status_delay затримує кожну відповідь на ~HS, тобто підтвердження вікна етикеток.
+    """
+
+    def __init__(self, status_delay: float = 0):
+        self.status_delay = status_delay
+        self.labels = []
+        self.status_requests = 0
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(16)
+        self.port = self.sock.getsockname()[1]
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        buffer = b''
+        with conn:
+            while True:
+                try:
+                    chunk = conn.recv(65536)
+                except OSError:
+                    return
+                if not chunk:
+                    return
+                buffer += chunk
+                while True:
+                    status, end = buffer.find(b'~HS'), buffer.find(b'^XZ')
+                    if status < 0 and end < 0:
+                        break
+                    if status >= 0 and (end < 0 or status < end):
+                        buffer = buffer[status + 3:]
+                        self.status_requests += 1
+                        time.sleep(self.status_delay)
+                        try:
+                            conn.sendall(host_status_response())
+                        except OSError:
+                            return
+                    else:
+                        self.labels.append(buffer[:end + 3].decode('utf-8'))
+                        buffer = buffer[end + 3:]
+
+    def close(self):
+        self.sock.close()
+
+
+@pytest.fixture
+def printer():
+    printers = []
+
+    def create(status_delay: float = 0) -> FakePrinter:
+        printers.append(FakePrinter(status_delay))
+        return printers[-1]
+
+    yield create
+    for fake in printers:
+        fake.close()
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    """Менеджер завдань без журналу та сховища, що підтверджує кожну етикетку окремо"""
+    history = []
+    monkeypatch.setattr(jobs_module, 'record_print',
+                        lambda ip, port, status, **fields: history.append((fields['job_id'], status)))
+    manager = JobManager(window_size=1)
+    # Записи історії друку (job_id, status)
+    manager.history = history
+    yield manager
+    manager.drain(5)
@@ -0,0 +1,100 @@
+"""WebSocket канал друку: підтвердження вікон та скасування при закритті"""
+import json
+import queue
+import threading
+import time
+
+import pytest
+from simple_websocket import ConnectionClosed
+
+from app import channel as channel_module
+from app.channel import PrintChannel, CLOSED_ERROR
+
+
+class _FakeWebSocket:
+    """Клієнт WebSocket: повідомлення для сервера кладуться в incoming, відповіді - в sent"""
+
+    def __init__(self):
+        self.incoming = queue.Queue()
+        self.sent = []
+        self._changed = threading.Condition()
+
+    def receive(self):
+        message = self.incoming.get()
+        if message is None:
+            raise ConnectionClosed()
+        return json.dumps(message)
+
+    def send(self, data):
+        with self._changed:
+            self.sent.append(json.loads(data))
+            self._changed.notify_all()
+
+    def wait_for(self, predicate, timeout: float = 5):
+        with self._changed:
+            assert self._changed.wait_for(lambda: predicate(self.sent), timeout=timeout), self.sent
+
+    def of(self, message_id):
+        return [message for message in self.sent if message.get('id') == message_id]
+
+
+@pytest.fixture
+def channel(manager, monkeypatch):
+    monkeypatch.setattr(channel_module, 'get_job_manager', lambda: manager)
+    ws = _FakeWebSocket()
+    channel = PrintChannel(ws, origin='https://example.com', client='127.0.0.1')
+    thread = threading.Thread(target=channel.run, daemon=True)
+    thread.start()
+    yield channel
+    ws.incoming.put(None)
+    thread.join(5)
+
+
+def _print(fake, message_id, count):
+    return {"type": "print", "id": message_id, "IP": "127.0.0.1", "PORT": fake.port,
+            "ZPL": "".join(f"^XA^FD{message_id}-{n}^FS^XZ" for n in range(count))}
+
+
+def test_print_is_acked_per_window(channel, printer):
+    fake = printer()
+    ws = channel.ws
+    ws.incoming.put(_print(fake, 'a1', 3))
+    ws.wait_for(lambda sent: any(message['type'] == 'done' for message in sent))
+
+    messages = ws.of('a1')
+    assert [message['type'] for message in messages] == ['accepted', 'ack', 'ack', 'ack', 'done']
+    assert messages[0]['labels'] == 3
+    assert [message['label'] for message in messages[1:4]] == [1, 2, 3]
+    assert messages[-1]['status'] == 'success'
+    assert len(fake.labels) == 3
+
+
+def test_invalid_message_is_rejected(channel):
+    channel.ws.incoming.put({"type": "print", "id": "a1", "IP": "127.0.0.1", "PORT": "abc", "ZPL": "^XA^XZ"})
+    channel.ws.wait_for(lambda sent: sent)
+    assert channel.ws.sent[0]['type'] == 'error'
+    assert 'PORT' in channel.ws.sent[0]['message']
+
+
+def test_close_cancels_pending_messages(channel, printer, manager):
+    # Кожне вікно підтверджується через 0.2 с, тому a1 ще друкується, а a2 чекає в черзі
+    fake = printer(status_delay=0.2)
+    ws = channel.ws
+    ws.incoming.put(_print(fake, 'a1', 5))
+    ws.incoming.put(_print(fake, 'a2', 2))
+    ws.wait_for(lambda sent: any(message['type'] == 'ack' for message in sent)
+                and len([message for message in sent if message['type'] == 'accepted']) == 2)
+
+    ws.incoming.put(None)
+    ws.wait_for(lambda sent: len([message for message in sent if message['type'] == 'done']) == 2)
+    for message_id in ('a1', 'a2'):
+        done = ws.of(message_id)[-1]
+        assert done['status'] == 'error'
+        assert done['message'] == CLOSED_ERROR
+
+    # a1 зупинилося на межі етикетки одразу після підтвердженої, a2 не друкувалося зовсім
+    assert manager.drain(5)
+    time.sleep(0.3)
+    assert len(fake.labels) in (1, 2)
+    assert not [label for label in fake.labels if 'a2-' in label]
+    assert channel.closed
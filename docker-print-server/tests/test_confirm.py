@@ -0,0 +1,109 @@
+"""Підтвердження друку: опитування ~HS до спорожнення буфера принтера"""
+import socket
+import threading
+
+import pytest
+
+from app import confirm as confirm_module
+from app.confirm import PrintConfirmer, CONFIRMATION_PRINTED, CONFIRMATION_TIMEOUT
+
+
+def _host_status_response(formats: int) -> bytes:
+    return (f"\x02030,0,0,1245,{formats:03d},0,0,0,000,0,0,0\x03\r\n"
+            f"\x02000,0,0,0,0,2,4,0,00000000,1,000\x03\r\n"
+            f"\x021234,0\x03\r\n").encode('ascii')
+
+
+class _FakePrinter:
+    """Відповідає на ~HS кількістю форматів у буфері з busy, далі - порожнім буфером"""
+
+    def __init__(self, busy=()):
+        self.busy = list(busy)
+        self.polls = 0
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(16)
+        self.port = self.sock.getsockname()[1]
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            with conn:
+                if conn.recv(16):
+                    self.polls += 1
+                    conn.sendall(_host_status_response(self.busy.pop(0) if self.busy else 0))
+
+    def close(self):
+        self.sock.close()
+
+
+@pytest.fixture
+def confirmer(monkeypatch):
+    monkeypatch.setattr(confirm_module, 'CONFIRM_POLL_INTERVAL', 0.02)
+    monkeypatch.setattr(confirm_module, 'CONFIRM_POLL_MAX_INTERVAL', 0.16)
+    confirmer = PrintConfirmer()
+    confirmer.start()
+    return confirmer
+
+
+@pytest.fixture
+def printer():
+    printers = []
+
+    def create(busy=()):
+        printers.append(_FakePrinter(busy))
+        return printers[-1]
+
+    yield create
+    for fake in printers:
+        fake.close()
+
+
+def test_printed_after_busy_then_drained(confirmer, printer):
+    fake = printer(busy=[2, 1])
+    result = confirmer.watch('127.0.0.1', fake.port, timeout=5).wait(6)
+
+    assert result['status'] == CONFIRMATION_PRINTED
+    assert result['polls'] == 3
+    assert result['printer_status']['formats_in_buffer'] == 0
+    assert result['time_to_printed'] >= result['drain_time'] >= 0
+    assert confirmer.metrics() == {"pending": 0, "printed": 1, "timeout": 0}
+
+
+def test_sender_host_status_counts_as_busy(confirmer, printer):
+    fake = printer()
+    busy = {"formats_in_buffer": 1, "labels_remaining": 0}
+    result = confirmer.watch('127.0.0.1', fake.port, timeout=5, host_status=busy).wait(6)
+
+    assert result['status'] == CONFIRMATION_PRINTED
+    assert result['polls'] == 1
+
+
+def test_never_busy_is_not_confirmed(confirmer, printer):
+    fake = printer()
+    result = confirmer.watch('127.0.0.1', fake.port, timeout=0.5).wait(2)
+
+    assert result['status'] == CONFIRMATION_TIMEOUT
+    assert result['printed_at'] is None
+    assert "не показав відправлене в буфері" in result['error']
+    # Інтервал подвоюється: 0.02 + 0.04 + 0.08 + 0.16 + 0.16 ... замість 25 опитувань
+    assert 3 <= fake.polls <= 6
+
+
+def test_unreachable_printer_times_out_with_error(confirmer):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+
+    callback_results = []
+    confirmation = confirmer.watch('127.0.0.1', port, timeout=0.3, callback=callback_results.append)
+    result = confirmation.wait(2)
+
+    assert result['status'] == CONFIRMATION_TIMEOUT
+    assert "Не вдалося підключитися" in result['error']
+    assert callback_results == [result]
@@ -0,0 +1,43 @@
+"""Історія друку: фільтри та посторінковий курсор"""
+from app.history import PrintHistory, parse_cursor
+
+
+def _history(tmp_path):
+    history = PrintHistory(str(tmp_path / 'history.db'))
+    # Два записи з однаковим часом прийому: порядок між ними задає id
+    for index, created_at in enumerate((100.0, 200.0, 200.0, 300.0, 400.0)):
+        history.record('10.0.0.1', 9100 + index % 2, 'completed', job_id=f"job{index}",
+                       created_at=created_at, finished_at=created_at + 1)
+    history.record('10.0.0.2', 9100, 'failed', job_id='other', created_at=250.0, finished_at=251.0)
+    return history
+
+
+def _pages(history, **filters):
+    job_ids, cursor = [], None
+    while True:
+        records, next_cursor = history.query(limit=2, cursor=cursor, **filters)
+        job_ids.extend(record['job_id'] for record in records)
+        if next_cursor is None:
+            return job_ids
+        cursor = parse_cursor(next_cursor)
+
+
+def test_keyset_pages_cover_all_records_once(tmp_path):
+    history = _history(tmp_path)
+    assert _pages(history) == ['job4', 'job3', 'other', 'job2', 'job1', 'job0']
+
+
+def test_printer_filter_by_ip_and_by_port(tmp_path):
+    history = _history(tmp_path)
+    assert _pages(history, printer='10.0.0.1') == ['job4', 'job3', 'job2', 'job1', 'job0']
+    assert _pages(history, printer='10.0.0.1:9101') == ['job3', 'job1']
+
+
+def test_status_and_time_filters(tmp_path):
+    history = _history(tmp_path)
+    assert _pages(history, status='failed') == ['other']
+    assert _pages(history, since=200.0, until=400.0) == ['job3', 'other', 'job2', 'job1']
+
+
+def test_parse_cursor_round_trip():
+    assert parse_cursor("1700000000.123456:42") == (1700000000.123456, 42)
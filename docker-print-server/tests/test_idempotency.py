@@ -0,0 +1,91 @@
+"""Ідемпотентні запити: повтор відповіді, запит, що виконується, інше тіло, 5xx"""
+import threading
+
+import pytest
+from flask import Flask, jsonify, request
+
+from app import idempotency as idempotency_module
+from app.idempotency import idempotent, IDEMPOTENCY_HEADER, REPLAYED_HEADER
+from app.state import FileStateBackend
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    backend = FileStateBackend(str(tmp_path))
+    monkeypatch.setattr(idempotency_module, 'get_state_backend', lambda: backend)
+    app = Flask(__name__)
+    app.calls = 0
+    app.release = threading.Event()
+    app.release.set()
+    app.entered = threading.Event()
+
+    @app.route('/print', methods=['POST'])
+    @idempotent
+    def print_view():
+        app.calls += 1
+        app.entered.set()
+        app.release.wait(5)
+        data = request.get_json()
+        if data.get('fail'):
+            return jsonify({"status": "error", "message": "Принтер недоступний"}), 503
+        return jsonify({"status": "success", "call": app.calls})
+
+    return app
+
+
+def _post(client, body, key='k1'):
+    return client.post('/print', json=body, headers={IDEMPOTENCY_HEADER: key})
+
+
+def test_repeated_request_is_replayed(app):
+    client = app.test_client()
+    first = _post(client, {"zpl": "^XA^XZ"})
+    assert first.status_code == 200
+    assert REPLAYED_HEADER not in first.headers
+
+    second = _post(client, {"zpl": "^XA^XZ"})
+    assert second.status_code == 200
+    assert second.headers[REPLAYED_HEADER] == 'true'
+    assert second.get_json() == first.get_json()
+    assert app.calls == 1
+
+    # Інший ключ - новий запит
+    assert _post(client, {"zpl": "^XA^XZ"}, key='k2').get_json()['call'] == 2
+
+
+def test_different_body_is_rejected(app):
+    client = app.test_client()
+    _post(client, {"zpl": "^XA^XZ"})
+    response = _post(client, {"zpl": "^XA^FDінше^FS^XZ"})
+    assert response.status_code == 422
+    assert app.calls == 1
+
+
+def test_request_in_flight_returns_conflict(app):
+    app.release.clear()
+    first = {}
+    thread = threading.Thread(target=lambda: first.update(response=_post(app.test_client(), {"zpl": "^XA^XZ"})))
+    thread.start()
+    assert app.entered.wait(5)
+
+    assert _post(app.test_client(), {"zpl": "^XA^XZ"}).status_code == 409
+    app.release.set()
+    thread.join(5)
+    assert first['response'].status_code == 200
+    assert app.calls == 1
+
+
+def test_server_error_is_not_stored(app):
+    client = app.test_client()
+    assert _post(client, {"fail": True}).status_code == 503
+    response = _post(client, {"fail": True})
+    assert response.status_code == 503
+    assert REPLAYED_HEADER not in response.headers
+    assert app.calls == 2
+
+
+def test_without_key_every_request_runs(app):
+    client = app.test_client()
+    client.post('/print', json={"zpl": "^XA^XZ"})
+    client.post('/print', json={"zpl": "^XA^XZ"})
+    assert app.calls == 2
@@ -0,0 +1,72 @@
+"""Фонова перевірка принтерів: ~HS лише для ZPL принтерів та відкладена ідентифікація"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import inventory as inventory_module
+from app.inventory import PrinterRegistry, InventoryMaintainer
+
+
+@pytest.fixture
+def maintainer(monkeypatch):
+    calls = {'probe': [], 'identify': 0}
+
+    def probe(ip, port, host_status=True):
+        calls['probe'].append(host_status)
+        return {"reachable": True, "printer_status": {} if host_status else None}
+
+    def identify(ip, port):
+        calls['identify'] += 1
+        return None
+
+    monkeypatch.setattr(inventory_module, 'probe_printer', probe)
+    monkeypatch.setattr(inventory_module, 'identify_printer', identify)
+    monkeypatch.setattr(inventory_module, 'is_printer_busy', lambda ip, port: False)
+    registry = PrinterRegistry()
+    registry._apply_scan_data({"printers": [
+        {"ip": "10.0.0.1", "port": 9100, "identified": True, "model": "ZT410"},
+        {"ip": "10.0.0.2", "port": 9100, "identified": False},
+    ]}, None)
+    maintainer = InventoryMaintainer(registry)
+    maintainer.calls = calls
+    return maintainer
+
+
+def _refresh(maintainer, key):
+    maintainer.registry.update(key, maintainer._probe(key))
+
+
+def test_host_status_only_for_zpl_printers(maintainer):
+    _refresh(maintainer, '10.0.0.1:9100')
+    assert maintainer.calls == {'probe': [True], 'identify': 0}
+
+    _refresh(maintainer, '10.0.0.2:9100')
+    assert maintainer.calls == {'probe': [True, False], 'identify': 1}
+
+
+def test_failed_identification_backs_off(maintainer):
+    _refresh(maintainer, '10.0.0.2:9100')
+    printer = maintainer.registry.get('10.0.0.2', 9100)
+    assert printer['identified'] is False
+    assert printer['identify_failures'] == 1
+    assert printer['identify_failed_at']
+
+    # Поки не минув IDENTIFY_RETRY_INTERVAL, ~HI повторно не надсилається
+    _refresh(maintainer, '10.0.0.2:9100')
+    assert maintainer.calls['identify'] == 1
+
+    failed_at = datetime.now() - timedelta(seconds=inventory_module.IDENTIFY_RETRY_INTERVAL + 1)
+    maintainer.registry.update('10.0.0.2:9100', {"identify_failed_at": failed_at.isoformat()})
+    _refresh(maintainer, '10.0.0.2:9100')
+    assert maintainer.calls['identify'] == 2
+    # Після другої невдачі інтервал подвоюється
+    assert maintainer.registry.get('10.0.0.2', 9100)['identify_failures'] == 2
+    maintainer.registry.update('10.0.0.2:9100', {"identify_failed_at": failed_at.isoformat()})
+    _refresh(maintainer, '10.0.0.2:9100')
+    assert maintainer.calls['identify'] == 2
+
+
+def test_busy_printer_is_not_probed(maintainer, monkeypatch):
+    monkeypatch.setattr(inventory_module, 'is_printer_busy', lambda ip, port: True)
+    assert maintainer._probe('10.0.0.1:9100') == {}
+    assert maintainer.calls['probe'] == []
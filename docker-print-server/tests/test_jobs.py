@@ -0,0 +1,113 @@
+"""Менеджер завдань: скасування та відновлення, пріоритети, підтвердження друку"""
+import threading
+
+from app import jobs as jobs_module
+from app.jobs import STATUS_COMPLETED, STATUS_FAILED, STATUS_PRINTING, PRIORITY_HIGH
+
+
+def _labels(name: str, count: int):
+    return [f"^XA^FD{name}{n}^FS^XZ" for n in range(1, count + 1)]
+
+
+def test_cancelled_and_resumed_job_prints_once(manager, printer):
+    fake = printer()
+    queued = {}
+
+    def on_first_update(state):
+        # Поки перше завдання друкується, друге чекає в черзі: скасовуємо та відновлюємо його
+        if state['status'] == STATUS_PRINTING and not queued:
+            job = manager.submit('127.0.0.1', fake.port, labels=_labels('B', 2))
+            queued['job'] = job
+            assert manager.cancel(job.id, 'Скасовано')
+            assert manager.get(job.id)['status'] == STATUS_FAILED
+            assert manager.resume(job.id) == (True, None)
+
+    first = manager.submit('127.0.0.1', fake.port, labels=_labels('A', 2), listener=on_first_update)
+    assert manager.drain(5)
+    # Завдання в кінці черги виконується після всіх записів, що стоять перед ним
+    last = manager.submit('127.0.0.1', fake.port, labels=_labels('C', 1))
+    assert manager.drain(5)
+
+    second = queued['job']
+    assert manager.get(first.id)['status'] == STATUS_COMPLETED
+    # Застарілий запис черги, що залишився після скасування, не запускає завдання вдруге
+    assert manager.get(second.id)['status'] == STATUS_COMPLETED
+    assert manager.get(second.id)['attempts'] == 1
+    assert manager.history == [(second.id, STATUS_FAILED), (first.id, STATUS_COMPLETED),
+                               (second.id, STATUS_COMPLETED), (last.id, STATUS_COMPLETED)]
+    assert fake.labels == _labels('A', 2) + _labels('B', 2) + _labels('C', 1)
+
+
+def test_cancel_while_printing_stops_at_label_boundary(manager, printer):
+    fake = printer(status_delay=0.1)
+    cancelled = []
+
+    def on_update(state):
+        if state['acked'] == 1 and not cancelled:
+            cancelled.append(manager.cancel(state['job_id'], 'Стоп'))
+
+    job = manager.submit('127.0.0.1', fake.port, labels=_labels('A', 5), listener=on_update)
+    assert manager.drain(5)
+
+    state = manager.get(job.id)
+    assert state['status'] == STATUS_FAILED
+    assert state['error'] == 'Стоп'
+    assert state['acked'] == 1
+    assert fake.labels == _labels('A', 1)
+
+    # Відновлення продовжує з контрольної точки
+    assert manager.resume(job.id) == (True, None)
+    assert manager.drain(5)
+    assert manager.get(job.id)['status'] == STATUS_COMPLETED
+    assert fake.labels == _labels('A', 5)
+
+
+def test_high_priority_job_inserted_at_label_boundary(manager, printer):
+    fake = printer()
+    urgent = {}
+
+    def on_update(state):
+        # Завдання high з'являється в черзі, поки друкується перша етикетка завдання normal
+        if state['status'] == STATUS_PRINTING and not urgent:
+            urgent['job'] = manager.submit('127.0.0.1', fake.port, labels=_labels('U', 2),
+                                           priority=PRIORITY_HIGH)
+
+    normal = manager.submit('127.0.0.1', fake.port, labels=_labels('N', 3), listener=on_update)
+    assert manager.drain(5)
+
+    assert manager.get(normal.id)['status'] == STATUS_COMPLETED
+    assert manager.get(urgent['job'].id)['status'] == STATUS_COMPLETED
+    # Етикетки high цілком між першою та другою етикетками normal
+    assert fake.labels == _labels('N', 1) + _labels('U', 2) + _labels('N', 3)[1:]
+    assert manager.latency()[PRIORITY_HIGH]['jobs'] == 1
+
+
+class _Confirmation:
+    def to_dict(self):
+        return {"status": "pending"}
+
+
+def test_confirm_reads_host_status_after_last_window(manager, printer, monkeypatch):
+    # Без підтвердження отримання ~HS надсилається лише після останнього вікна завдання з CONFIRM
+    monkeypatch.setattr(jobs_module, 'JOB_CONFIRM_RECEIPT', False)
+    watched = []
+    started = threading.Event()
+
+    class _Confirmer:
+        def watch(self, ip, port, created_at, callback, host_status=None):
+            watched.append(host_status)
+            started.set()
+            return _Confirmation()
+
+    monkeypatch.setattr(jobs_module, 'get_confirmer', lambda: _Confirmer())
+    fake = printer()
+
+    manager.submit('127.0.0.1', fake.port, labels=_labels('A', 3))
+    assert manager.drain(5)
+    assert fake.status_requests == 0
+
+    manager.submit('127.0.0.1', fake.port, labels=_labels('B', 3), confirm=True)
+    # Підтвердження починається вже після статусу completed
+    assert started.wait(5)
+    assert fake.status_requests == 1
+    assert len(watched) == 1 and watched[0]['formats_in_buffer'] == 0
@@ -0,0 +1,106 @@
+"""Злиття шаблону з даними: екранування ^FH, підстановки як є, формати даних та ліміти"""
+import io
+
+import pytest
+
+from app import merge as merge_module
+from app.merge import (compile_template, MergeError, MergeLimitError, iter_csv_rows, iter_ndjson_rows,
+                       detect_rows_format)
+
+
+def test_field_values_escaped_with_existing_fh():
+    template = compile_template("^XA^FO10,10^FH^FD{{name}}^FS^XZ")
+    assert template.render({"name": "a^b~c_d"}) == "^XA^FO10,10^FH^FDa_5Eb_7Ec_5Fd^FS^XZ"
+
+
+def test_custom_fh_indicator():
+    template = compile_template("^XA^FH#^FD{{name}}^FS^XZ")
+    assert template.render({"name": "50%#^"}) == "^XA^FH#^FD50%#23#5E^FS^XZ"
+
+
+def test_fh_added_to_field_without_it():
+    template = compile_template("^XA^FO10,10^FDЦіна_1: {{price}}^FS^FO10,50^FDбез змін_^FS^XZ")
+    # ^FH додано лише до поля з підстановкою; його незмінний текст теж екрановано
+    assert template.render({"price": "9^9"}) == \
+        "^XA^FO10,10^FH^FDЦіна_5F1: 9_5E9^FS^FO10,50^FDбез змін_^FS^XZ"
+
+
+def test_raw_placeholder_rejects_command_prefixes():
+    template = compile_template("^XA^FO{{x}},10^FH^FD{{name}}^FS^PQ{{qty}}^XZ")
+    assert template.render({"x": 5, "name": "A", "qty": 2}) == "^XA^FO5,10^FH^FDA^FS^PQ2^XZ"
+    for value in ("1^XZ", "1~JR"):
+        with pytest.raises(MergeError, match="Рядок 3"):
+            template.render({"x": 5, "name": "A", "qty": value}, row_number=3)
+
+
+def test_missing_value_and_template_without_placeholders():
+    template = compile_template("^XA^FD{{name}}^FS^XZ")
+    with pytest.raises(MergeError, match="name"):
+        template.render_all([{"other": 1}])
+    with pytest.raises(MergeError):
+        compile_template("^XA^FDстатичний^FS^XZ")
+
+
+def test_csv_rows():
+    data = "﻿name;qty\r\nПерша;1\r\n\"Друга; з крапкою з комою\";2\r\n".encode('utf-8')
+    rows = list(iter_csv_rows(io.BytesIO(data)))
+    assert rows == [{"name": "Перша", "qty": "1"}, {"name": "Друга; з крапкою з комою", "qty": "2"}]
+
+
+def test_csv_rows_beyond_sniff_sample():
+    lines = ["name,qty"] + [f"label {n},{n}" for n in range(1000)]
+    rows = list(iter_csv_rows(io.BytesIO("\n".join(lines).encode('utf-8'))))
+    assert len(rows) == 1000
+    assert rows[-1] == {"name": "label 999", "qty": "999"}
+
+
+def test_ndjson_rows():
+    data = b'{"name": "A", "qty": 1}\n\n{"name": "B", "qty": 2}\n'
+    assert list(iter_ndjson_rows(io.BytesIO(data))) == [{"name": "A", "qty": 1}, {"name": "B", "qty": 2}]
+    with pytest.raises(MergeError, match="Рядок 2"):
+        list(iter_ndjson_rows(io.BytesIO(b'{"name": "A"}\n{broken\n')))
+
+
+def test_detect_rows_format():
+    assert detect_rows_format('rows.csv', None) == 'csv'
+    assert detect_rows_format('rows.jsonl', None) == 'ndjson'
+    assert detect_rows_format(None, 'application/x-ndjson') == 'ndjson'
+    assert detect_rows_format('rows.xlsx', 'application/octet-stream') is None
+
+
+def test_render_all_limits():
+    template = compile_template("^XA^FD{{name}}^FS^XZ")
+    rows = [{"name": "A"}] * 3
+    assert len(template.render_all(rows, max_rows=3)) == 3
+    with pytest.raises(MergeLimitError):
+        template.render_all(rows, max_rows=2)
+    with pytest.raises(MergeLimitError, match="Рядок 2"):
+        template.render_all(rows, max_bytes=len(template.render(rows[0])) + 1)
+
+
+@pytest.fixture
+def client():
+    from app.main import app
+    return app.test_client()
+
+
+def _merge_request(client, rows):
+    return client.post('/api/print/merge', json={
+        "IP": "127.0.0.1", "PORT": 9100, "TEMPLATE": "^XA^FD{{name}}^FS^XZ", "ROWS": rows
+    })
+
+
+@pytest.mark.parametrize('limit, value', [('MERGE_MAX_ROWS', 2), ('MERGE_MAX_BYTES', 20)])
+def test_merge_endpoint_rejects_oversized_request(client, monkeypatch, limit, value):
+    monkeypatch.setattr(merge_module, limit, value)
+    response = _merge_request(client, [{"name": "A"}, {"name": "B"}, {"name": "C"}])
+    assert response.status_code == 413
+    assert "розділіть дані" in response.get_json()['message']
+
+
+def test_merge_endpoint_rejects_unsupported_file(client):
+    response = client.post('/api/print/merge', data={
+        "IP": "127.0.0.1", "PORT": "9100", "TEMPLATE": "^XA^FD{{name}}^FS^XZ",
+        "ROWS": (io.BytesIO(b'name\nA\n'), 'rows.xlsx', 'application/octet-stream'),
+    }, content_type='multipart/form-data')
+    assert response.status_code == 400
@@ -0,0 +1,104 @@
+"""Пошук принтерів: перевірка портів, вибір основного порту та ідентифікація"""
+import socket
+import threading
+
+import pytest
+
+from app.printer import sweep_ports, _primary_port, parse_host_status, identify_printer
+
+
+def _serve_once(sock: socket.socket, responses: dict):
+    """Приймає одне з'єднання та відповідає на відомі команди"""
+    try:
+        conn, _ = sock.accept()
+    except OSError:
+        return
+    with conn:
+        buffer = b''
+        while True:
+            chunk = conn.recv(64)
+            if not chunk:
+                return
+            buffer += chunk
+            for command, response in responses.items():
+                if buffer.startswith(command):
+                    buffer = buffer[len(command):]
+                    conn.sendall(response)
+
+
+@pytest.fixture
+def listener_socket():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(('127.0.0.1', 0))
+    sock.listen(16)
+    yield sock
+    sock.close()
+
+
+@pytest.fixture
+def listener(listener_socket):
+    return listener_socket.getsockname()[1]
+
+
+def _closed_port() -> int:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def test_sweep_finds_open_port(listener):
+    closed = _closed_port()
+    found, stats = sweep_ports(['127.0.0.1'], [listener, closed], max_timeout=1)
+
+    assert found == {'127.0.0.1': [listener]}
+    assert stats['probes'] == 2
+
+
+def test_sweep_without_listeners_finds_nothing():
+    found, stats = sweep_ports(['127.0.0.1'], [_closed_port()], max_timeout=1)
+    assert found == {}
+    assert stats['elapsed'] < 1
+
+
+def test_primary_port_skips_lpd():
+    assert _primary_port([515, 9100], 515) == 9100
+    assert _primary_port([515, 6101], 9100) == 6101
+    assert _primary_port([9100, 6101], 6101) == 6101
+    assert _primary_port([515, 8000], 9100) == 8000
+    assert _primary_port([515], 9100) is None
+
+
+def test_parse_host_status():
+    response = ("\x02030,1,0,1245,003,0,0,0,000,0,0,0\x03\r\n"
+                "\x02000,0,1,0,0,2,4,0,00000007,1,000\x03\r\n"
+                "\x021234,0\x03\r\n")
+    status = parse_host_status(response)
+    assert status['paper_out'] is True
+    assert status['formats_in_buffer'] == 3
+    assert status['head_up'] is True
+    assert status['labels_remaining'] == 7
+    assert parse_host_status("\x02030,0,0\x03") is None
+
+
+def test_identify_printer(listener_socket):
+    threading.Thread(target=_serve_once, args=(listener_socket, {
+        b'~HI': b'\x02ZT410-200dpi,V75.19.15Z,8,8176KB\x03\r\n',
+        b'^XA^HH^XZ': (b'\x02  832 8/MM FULL    PRINT WIDTH\r\n'
+                       b'  1215              LABEL LENGTH\r\n\x03'),
+    }), daemon=True).start()
+
+    info = identify_printer('127.0.0.1', listener_socket.getsockname()[1])
+    assert info == {"model": "ZT410-200dpi", "firmware": "V75.19.15Z", "dpmm": 8, "dpi": 203,
+                    "memory_kb": 8176, "print_width": 832, "label_length": 1215}
+
+
+def test_identify_silent_device(listener_socket):
+    # Пристрій приймає з'єднання, але не відповідає на ~HI - це не ZPL принтер
+    threading.Thread(target=_serve_once, args=(listener_socket, {}), daemon=True).start()
+    assert identify_printer('127.0.0.1', listener_socket.getsockname()[1], timeout=0.2) is None
+
+
+def test_identify_closed_port():
+    assert identify_printer('127.0.0.1', _closed_port(), timeout=0.2) is None
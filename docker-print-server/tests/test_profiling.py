@@ -0,0 +1,66 @@
+"""Профілювання: вмикається лише токеном, доступ лише з коректним токеном"""
+import pytest
+from flask import Flask, jsonify
+
+from app.profiling import init_profiling, PROFILE_TOKEN_HEADER, PROFILE_ID_HEADER
+
+TOKEN = 'secret-token'
+
+
+def _create_app() -> Flask:
+    app = Flask(__name__)
+
+    @app.route('/api/ping')
+    def ping():
+        return jsonify({"status": "success"})
+
+    return app
+
+
+@pytest.fixture
+def app(monkeypatch, tmp_path):
+    monkeypatch.setenv('PROFILING_TOKEN', TOKEN)
+    monkeypatch.setenv('PROFILE_DIR', str(tmp_path))
+    app = _create_app()
+    assert init_profiling(app)
+    return app
+
+
+def test_disabled_without_token(monkeypatch):
+    monkeypatch.delenv('PROFILING_TOKEN', raising=False)
+    app = _create_app()
+    assert not init_profiling(app)
+    assert not [rule for rule in app.url_map.iter_rules() if rule.rule.startswith('/api/profiling')]
+    assert not app.before_request_funcs and not app.after_request_funcs
+
+    response = app.test_client().get('/api/ping', headers={PROFILE_TOKEN_HEADER: TOKEN})
+    assert PROFILE_ID_HEADER not in response.headers
+    assert app.test_client().post('/api/profiling/sample?seconds=1').status_code == 404
+
+
+@pytest.mark.parametrize('headers', [{}, {PROFILE_TOKEN_HEADER: 'wrong'}])
+def test_endpoints_require_token(app, headers):
+    client = app.test_client()
+    assert client.post('/api/profiling/sample?seconds=1', headers=headers).status_code == 403
+    assert client.get('/api/profiling/profiles/' + '0' * 32, headers=headers).status_code == 403
+    # Запит з некоректним токеном виконується, але не профілюється
+    assert PROFILE_ID_HEADER not in client.get('/api/ping', headers=headers).headers
+
+
+def test_request_profile_with_token(app):
+    client = app.test_client()
+    response = client.get('/api/ping', headers={PROFILE_TOKEN_HEADER: TOKEN})
+    assert response.status_code == 200
+    profile_id = response.headers[PROFILE_ID_HEADER]
+
+    profile = client.get(f'/api/profiling/profiles/{profile_id}', headers={PROFILE_TOKEN_HEADER: TOKEN})
+    assert profile.status_code == 200
+    assert 'function calls' in profile.get_data(as_text=True)
+    assert client.get('/api/profiling/profiles/../x', headers={PROFILE_TOKEN_HEADER: TOKEN}).status_code == 404
+
+
+def test_sample_returns_collapsed_stacks(app):
+    response = app.test_client().post('/api/profiling/sample?seconds=0.1&interval=0.01',
+                                      headers={PROFILE_TOKEN_HEADER: TOKEN})
+    assert response.status_code == 200
+    assert int(response.headers['X-Profile-Samples']) > 0
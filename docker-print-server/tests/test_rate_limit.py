@@ -0,0 +1,75 @@
+"""Відро токенів та обмежувач швидкості принтера"""
+import pytest
+
+from app.rate_limit import TokenBucket, PrinterShaper
+
+
+def test_full_bucket_does_not_wait():
+    bucket = TokenBucket(10)
+    assert bucket.reserve(10) == 0.0
+
+
+def test_reserve_beyond_tokens_waits_for_refill():
+    bucket = TokenBucket(10)
+    bucket.reserve(10)
+    assert bucket.reserve(5) == pytest.approx(0.5, abs=0.05)
+
+
+def test_oversized_request_goes_into_debt():
+    bucket = TokenBucket(10, capacity=4)
+    # Більше за місткість дозволяється з повного відра...
+    assert bucket.reserve(12) == 0.0
+    assert bucket.tokens == pytest.approx(-8, abs=0.05)
+    # ...а наступний запит чекає, поки борг буде відпрацьовано
+    assert bucket.reserve(1) == pytest.approx(0.9, abs=0.05)
+
+
+def test_refund_is_capped_by_capacity():
+    bucket = TokenBucket(10, capacity=4)
+    bucket.reserve(3)
+    bucket.refund(3)
+    assert bucket.tokens == pytest.approx(4, abs=0.05)
+    bucket.refund(100)
+    assert bucket.tokens == 4
+
+
+def test_unlimited_bucket_never_waits():
+    bucket = TokenBucket(0)
+    assert bucket.reserve(1e9) == 0.0
+
+
+def test_acquire_over_max_wait_refunds_tokens():
+    shaper = PrinterShaper('10.0.0.1:9100')
+    shaper.labels.configure(2, 2)
+    shaper.acquire(2, 0)
+
+    assert not shaper.acquire(1, 0, max_wait=0.1)
+    # Відмова не списала токени: очікування не зросло
+    assert shaper.labels.reserve(1) == pytest.approx(0.5, abs=0.05)
+    assert shaper.waited_seconds == 0
+
+
+def test_auto_tune_keeps_configured_burst():
+    shaper = PrinterShaper('10.0.0.1:9100')
+    shaper.configure({'labels_per_sec': 4, 'burst_labels': 20, 'auto_tune': True})
+    assert shaper.labels.capacity == 20
+
+    shaper.feedback({'formats_in_buffer': 0})
+    assert shaper.labels.rate == pytest.approx(4.5)
+    assert shaper.labels.capacity == 20
+
+
+def test_auto_tune_reseeds_on_config_change():
+    shaper = PrinterShaper('10.0.0.1:9100')
+    shaper.configure({'labels_per_sec': 4, 'auto_tune': True})
+    shaper.feedback({'buffer_full': True})
+    tuned = shaper.labels.rate
+    assert tuned < 4
+
+    # Інший ключ змінився - підібрана швидкість зберігається
+    shaper.configure({'labels_per_sec': 4, 'bytes_per_sec': 1000, 'auto_tune': True})
+    assert shaper.labels.rate == tuned
+
+    # Новий labels_per_sec - підбір стартує з нього
+    shaper.configure({'labels_per_sec': 8, 'auto_tune': True})
+    assert shaper.labels.rate == 8
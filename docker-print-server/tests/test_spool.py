@@ -0,0 +1,121 @@
+"""Журнал завдань: відтворення, ущільнення, невдачі та повторний запис"""
+import glob
+import os
+import time
+
+import pytest
+
+from app import spool as spool_module
+from app.spool import Spool
+
+
+def _crash(spool: Spool):
+    """Імітує завершення процесу: знімає flock з журналу"""
+    spool.flush()
+    spool._file.close()
+
+
+def _reopen(spool_dir):
+    spool = Spool(str(spool_dir))
+    return spool, {record['job_id']: record for record in spool.open()}
+
+
+def test_replay_unfinished_jobs(tmp_path):
+    spool = Spool(str(tmp_path))
+    assert spool.open() == []
+    spool.journal_accept('a', '10.0.0.1', 9100, ['^XA^XZ'] * 3, copies=[2, 1, 1])
+    spool.journal_accept('b', '10.0.0.1', 9100, ['^XA^XZ'])
+    spool.journal_ack('a', 2)
+    spool.journal_done('b')
+    _crash(spool)
+
+    _, records = _reopen(tmp_path)
+    assert list(records) == ['a']
+    assert records['a']['acked'] == 2
+    assert records['a']['copies'] == [2, 1, 1]
+    # Старий журнал перейнято та видалено
+    assert len(glob.glob(os.path.join(str(tmp_path), 'spool-*.log'))) == 1
+
+
+def test_failed_job_not_replayed_until_resumed(tmp_path):
+    spool = Spool(str(tmp_path))
+    spool.open()
+    spool.journal_accept('a', '10.0.0.1', 9100, ['^XA^XZ'])
+    spool.journal_accept('b', '10.0.0.1', 9100, ['^XA^XZ'])
+    spool.journal_fail('a', 'Таймаут')
+    spool.journal_fail('b', 'Таймаут')
+    spool.journal_resume('b')
+    _crash(spool)
+
+    spool, records = _reopen(tmp_path)
+    assert records['a']['error'] == 'Таймаут'
+    assert records['a']['failed_at']
+    assert 'failed_at' not in records['b']
+
+    # Відмітка невдачі переживає і повторне перейняття журналу
+    _crash(spool)
+    _, records = _reopen(tmp_path)
+    assert 'failed_at' in records['a']
+    assert 'failed_at' not in records['b']
+
+
+def test_compaction_keeps_only_live_jobs(tmp_path, monkeypatch):
+    monkeypatch.setattr(spool_module, 'SPOOL_COMPACT_THRESHOLD', 3)
+    spool = Spool(str(tmp_path))
+    spool.open()
+    spool.journal_accept('live', '10.0.0.1', 9100, ['^XA^XZ'] * 2)
+    for job_id in ('x', 'y', 'z'):
+        spool.journal_accept(job_id, '10.0.0.1', 9100, ['^XA^XZ'])
+        spool.journal_done(job_id)
+    spool.journal_ack('live', 1)
+    spool.flush()
+
+    deadline = time.monotonic() + 5
+    while spool._done_since_compaction and time.monotonic() < deadline:
+        time.sleep(0.01)
+    spool.journal_ack('live', 1)
+    spool.flush()
+    with open(spool._path, encoding='utf-8') as f:
+        assert '"x"' not in f.read()
+
+    _crash(spool)
+    _, records = _reopen(tmp_path)
+    assert list(records) == ['live']
+    assert records['live']['acked'] == 1
+
+
+class _FlakyFile:
+    """Файл журналу, запис у який перші failures разів завершується помилкою"""
+
+    def __init__(self, f, failures: int):
+        self._f = f
+        self.failures = failures
+
+    def write(self, data):
+        if self.failures:
+            self.failures -= 1
+            raise OSError(28, 'No space left on device')
+        return self._f.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+
+
+def test_failed_write_is_retried(tmp_path, monkeypatch):
+    monkeypatch.setattr(spool_module, 'SPOOL_RETRY_INTERVAL', 0.01)
+    spool = Spool(str(tmp_path))
+    spool.open()
+    spool.journal_accept('a', '10.0.0.1', 9100, ['^XA^XZ'] * 3)
+
+    spool._file = _FlakyFile(spool._file, failures=2)
+    # Запис, що чекає fsync, отримує помилку, а контрольна точка записується повторно
+    with pytest.raises(OSError):
+        spool.journal_accept('b', '10.0.0.1', 9100, ['^XA^XZ'])
+    spool.journal_ack('a', 2)
+    spool.flush()
+    assert spool._file.failures == 0
+
+    _crash(spool)
+    _, records = _reopen(tmp_path)
+    assert list(records) == ['a']
+    assert records['a']['acked'] == 2
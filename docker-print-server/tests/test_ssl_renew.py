@@ -0,0 +1,103 @@
+"""Перевипуск сертифіката у фоні: стан, потоковий вивід certbot та один перевипуск одночасно"""
+import threading
+import time
+
+import pytest
+
+from app import ssl_renew as ssl_renew_module
+from app.ssl_renew import start_renewal, get_renewal, RENEW_RUNNING, RENEW_COMPLETED, RENEW_FAILED
+
+
+class _FakeDocker:
+    """Клієнт Docker API, де certbot виводить chunks та завершується з exit_code"""
+
+    def __init__(self, chunks, exit_code: int = 0):
+        self.chunks = chunks
+        self.exit_code = exit_code
+        self.release = threading.Event()
+        self.release.set()
+        self.commands = []
+        self.containers = self
+        self.api = self
+
+    def get(self, name):
+        return type('Container', (), {'id': name})()
+
+    def exec_create(self, container_id, command, **kwargs):
+        self.commands.append(command)
+        return {'Id': 'exec-1'}
+
+    def exec_start(self, exec_id, stream=False):
+        for chunk in self.chunks:
+            yield chunk
+            self.release.wait(5)
+
+    def exec_inspect(self, exec_id):
+        return {'ExitCode': self.exit_code}
+
+
+@pytest.fixture
+def docker(monkeypatch, tmp_path):
+    monkeypatch.setenv('SSL_RENEW_DIR', str(tmp_path))
+    clients = []
+
+    def create(chunks, exit_code: int = 0) -> _FakeDocker:
+        clients.append(_FakeDocker(chunks, exit_code))
+        monkeypatch.setattr(ssl_renew_module, 'get_docker_client', lambda: clients[-1])
+        return clients[-1]
+
+    yield create
+    for client in clients:
+        client.release.set()
+
+
+def _wait_finished(renewal_id: str, timeout: float = 5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        state = get_renewal(renewal_id)
+        if state['status'] != RENEW_RUNNING:
+            return state
+        time.sleep(0.01)
+    raise AssertionError(f"Перевипуск {renewal_id} не завершився")
+
+
+def test_renewal_runs_in_background(docker):
+    client = docker([b'Requesting a certificate\n', b'Successfully received certificate\n'])
+    client.release.clear()
+
+    state, running_id = start_renewal('example.duckdns.org', 'admin@example.com')
+    assert running_id is None
+    assert state['status'] == RENEW_RUNNING
+    renewal_id = state['renewal_id']
+
+    # Поки certbot працює, вивід читається частинами з next_offset
+    deadline = time.monotonic() + 5
+    while not get_renewal(renewal_id)['output'] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    first = get_renewal(renewal_id)
+    assert first['status'] == RENEW_RUNNING
+    assert first['output'] == 'Requesting a certificate\n'
+
+    # Другий перевипуск не запускається, поки триває перший
+    assert start_renewal('example.duckdns.org', 'admin@example.com') == (None, renewal_id)
+
+    client.release.set()
+    finished = _wait_finished(renewal_id)
+    assert finished['status'] == RENEW_COMPLETED
+    assert finished['exit_code'] == 0
+    assert get_renewal(renewal_id, first['next_offset'])['output'] == 'Successfully received certificate\n'
+    assert '-d' in client.commands[0] and 'example.duckdns.org' in client.commands[0]
+
+
+def test_certbot_error_fails_renewal(docker):
+    docker([b'Error: DNS problem\n'], exit_code=1)
+    state, _ = start_renewal('example.duckdns.org', 'admin@example.com')
+    finished = _wait_finished(state['renewal_id'])
+    assert finished['status'] == RENEW_FAILED
+    assert '1' in finished['error']
+    assert finished['output'] == 'Error: DNS problem\n'
+
+
+def test_unknown_renewal(docker):
+    assert get_renewal('0' * 32) is None
+    assert get_renewal('../state') is None
@@ -0,0 +1,26 @@
+"""Запуск процесу: важкі залежності та фонові служби не запускаються разом з app.main"""
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _run(code: str, **env) -> str:
+    """Виконує code в новому процесі (каталоги даних - з фікстури _data_dir)"""
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                            cwd=ROOT, env=dict(os.environ, **env))
+    return result.stdout.strip()
+
+
+def test_main_does_not_import_heavy_dependencies():
+    assert _run("import sys, app.main; "
+                "print(','.join(name for name in ('docker', 'cryptography') if name in sys.modules))") == ''
+
+
+def test_preload_import_does_not_start_background_services():
+    # З GUNICORN_PRELOAD=1 модуль імпортує master: потоки та flock до fork недопустимі
+    output = _run("import threading, app.main, app.jobs, app.inventory; "
+                  "print(threading.active_count(), app.jobs._job_manager, app.inventory._maintainer)",
+                  GUNICORN_PRELOAD='1')
+    assert output.split() == ['1', 'None', 'None']
@@ -0,0 +1,117 @@
+"""Сховища спільного стану: строк дії записів та оренди"""
+import os
+import subprocess
+import sys
+import time
+import uuid
+
+import pytest
+
+from app.state import StateBackend, FileStateBackend, RedisStateBackend
+
+
+@pytest.fixture
+def file_backend(tmp_path):
+    return FileStateBackend(str(tmp_path))
+
+
+@pytest.fixture
+def redis_backend():
+    pytest.importorskip('redis')
+    backend = RedisStateBackend(os.getenv('REDIS_URL', 'redis://localhost:6379/0'),
+                                prefix=f"test-{uuid.uuid4().hex[:8]}:")
+    try:
+        backend._client.ping()
+    except Exception:
+        pytest.skip('Redis недоступний')
+    yield backend
+    for key in backend._client.scan_iter(backend.prefix + '*'):
+        backend._client.delete(key)
+
+
+@pytest.fixture(params=['file', 'redis'])
+def backend(request):
+    return request.getfixturevalue(f"{request.param}_backend")
+
+
+def test_backend_is_abstract():
+    with pytest.raises(TypeError):
+        StateBackend()
+
+
+def test_get_set_delete(backend):
+    assert backend.get('job:a') is None
+    backend.set('job:a', {"status": "queued"})
+    assert backend.get('job:a') == {"status": "queued"}
+    backend.set('job:a', {"status": "printing"})
+    assert backend.get('job:a') == {"status": "printing"}
+    backend.delete('job:a')
+    backend.delete('job:a')
+    assert backend.get('job:a') is None
+
+
+def test_set_with_ttl_expires(backend):
+    backend.set('job:a', {"status": "queued"}, ttl=0.1)
+    assert backend.get('job:a') == {"status": "queued"}
+    time.sleep(0.2)
+    assert backend.get('job:a') is None
+
+
+def test_add_only_once_until_expired(backend):
+    assert backend.add('idempotency:k', {"n": 1}, ttl=0.1)
+    assert not backend.add('idempotency:k', {"n": 2}, ttl=0.1)
+    assert backend.get('idempotency:k') == {"n": 1}
+    time.sleep(0.2)
+    assert backend.add('idempotency:k', {"n": 3})
+    assert backend.get('idempotency:k') == {"n": 3}
+
+
+def test_file_backend_rejects_path_keys(file_backend):
+    with pytest.raises(ValueError):
+        file_backend.get('job:../../etc/passwd')
+
+
+def test_file_cleanup_removes_expired(file_backend):
+    file_backend.set('job:old', {}, ttl=0.01)
+    file_backend.set('job:live', {})
+    time.sleep(0.05)
+    file_backend._cleanup_at = 0
+    file_backend.cleanup()
+    assert sorted(os.listdir(os.path.join(file_backend.root, 'job'))) == ['live.json']
+
+
+def test_file_lease_is_exclusive(tmp_path):
+    first, second = FileStateBackend(str(tmp_path)), FileStateBackend(str(tmp_path))
+    assert first.acquire_lease('leader', 'a', 1)
+    # Продовження власником
+    assert first.acquire_lease('leader', 'a', 1)
+    assert not second.acquire_lease('leader', 'b', 1)
+    first.release_lease('leader', 'a')
+    assert second.acquire_lease('leader', 'b', 1)
+
+
+def test_file_lease_released_with_process(tmp_path):
+    # Процес-власник завершився, не звільнивши оренду
+    subprocess.run([sys.executable, '-c',
+                    f"from app.state import FileStateBackend; "
+                    f"assert FileStateBackend({str(tmp_path)!r}).acquire_lease('leader', 'a', 60)"],
+                   check=True, cwd=os.path.dirname(os.path.dirname(__file__)))
+    assert FileStateBackend(str(tmp_path)).acquire_lease('leader', 'b', 60)
+
+
+def test_redis_lease_renew_and_expiry(redis_backend):
+    assert redis_backend.acquire_lease('leader', 'a', 0.3)
+    assert not redis_backend.acquire_lease('leader', 'b', 0.3)
+    time.sleep(0.2)
+    # Продовження власником відсуває строк дії
+    assert redis_backend.acquire_lease('leader', 'a', 0.3)
+    time.sleep(0.2)
+    assert not redis_backend.acquire_lease('leader', 'b', 0.3)
+
+    # Чужий власник не може звільнити оренду
+    redis_backend.release_lease('leader', 'b')
+    assert not redis_backend.acquire_lease('leader', 'b', 0.3)
+    time.sleep(0.4)
+    assert redis_backend.acquire_lease('leader', 'b', 0.3)
+    redis_backend.release_lease('leader', 'b')
+    assert redis_backend.acquire_lease('leader', 'a', 0.3)
@@ -0,0 +1,86 @@
+"""TLS контекст: перечитування сертифіката після його зміни"""
+import datetime
+import ssl
+
+import pytest
+
+cryptography = pytest.importorskip('cryptography')
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+
+from app.tls import ReloadingSSLContext
+
+
+def _write_certificate(certfile, keyfile, name: str):
+    """Записує самопідписаний сертифікат з CN=name та його ключ"""
+    key = ec.generate_private_key(ec.SECP256R1())
+    subject = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, name)])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (x509.CertificateBuilder().subject_name(subject).issuer_name(subject)
+            .public_key(key.public_key()).serial_number(x509.random_serial_number())
+            .not_valid_before(now).not_valid_after(now + datetime.timedelta(days=1))
+            .sign(key, hashes.SHA256()))
+    keyfile.write_bytes(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                          serialization.NoEncryption()))
+    certfile.write_bytes(cert.public_bytes(serialization.Encoding.PEM))
+
+
+@pytest.fixture
+def files(tmp_path):
+    certfile, keyfile = tmp_path / 'cert.pem', tmp_path / 'key.pem'
+    _write_certificate(certfile, keyfile, 'first')
+
+    def factory():
+        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        context.load_cert_chain(str(certfile), str(keyfile))
+        return context
+
+    return certfile, keyfile, factory
+
+
+def test_context_is_cached_until_files_change(files):
+    certfile, keyfile, factory = files
+    tls = ReloadingSSLContext(check_interval=0)
+    first = tls.get(str(certfile), str(keyfile), factory)
+    assert tls.get(str(certfile), str(keyfile), factory) is first
+
+    _write_certificate(certfile, keyfile, 'second')
+    second = tls.get(str(certfile), str(keyfile), factory)
+    assert second is not first
+    assert tls.reloads == 1
+    assert tls.error is None
+
+
+def test_bad_certificate_keeps_previous_context(files):
+    certfile, keyfile, factory = files
+    tls = ReloadingSSLContext(check_interval=0)
+    first = tls.get(str(certfile), str(keyfile), factory)
+
+    certfile.write_text('not a certificate')
+    assert tls.get(str(certfile), str(keyfile), factory) is first
+    assert tls.error
+    assert tls.reloads == 0
+
+    # Коли файли знову узгоджені, новий сертифікат підхоплюється
+    _write_certificate(certfile, keyfile, 'second')
+    assert tls.get(str(certfile), str(keyfile), factory) is not first
+    assert tls.error is None
+
+
+def test_first_load_error_is_raised(files):
+    certfile, keyfile, factory = files
+    certfile.unlink()
+    tls = ReloadingSSLContext(check_interval=0)
+    with pytest.raises(OSError):
+        tls.get(str(certfile), str(keyfile), factory)
+
+
+def test_check_interval_skips_stat(files):
+    certfile, keyfile, factory = files
+    tls = ReloadingSSLContext(check_interval=60)
+    first = tls.get(str(certfile), str(keyfile), factory)
+    _write_certificate(certfile, keyfile, 'second')
+    # Зміна помічається лише після check_interval
+    assert tls.get(str(certfile), str(keyfile), factory) is first
@@ -0,0 +1,64 @@
+"""Токенізатор, розбір та об'єднання однакових етикеток ZPL"""
+from app.zpl import tokenize, parse_zpl, split_labels, collapse_repeated_labels
+
+
+def _commands(zpl):
+    return [(cmd.prefix, cmd.name, cmd.params) for cmd in tokenize(zpl)]
+
+
+def test_tokenize_format_prefix_change():
+    # Після ^CC+ команди формату починаються з +, а ^ - звичайний символ даних
+    assert _commands("^XA^CC+^FO10,10+FDa^b+FS+XZ") == [
+        ('^', 'XA', ''), ('^', 'CC', '+'), ('^', 'FD', 'a^b'), ('^', 'FS', ''), ('^', 'XZ', '')
+    ]
+
+
+def test_tokenize_control_prefix_change():
+    # Після ~CT# керуючі команди починаються з #, а ~ в даних поля не є командою
+    assert _commands("~CT#^XA^FDa~b^FS#JA^XZ") == [
+        ('~', 'CT', '#'), ('^', 'XA', ''), ('^', 'FD', 'a~b'), ('^', 'FS', ''), ('~', 'JA', ''), ('^', 'XZ', '')
+    ]
+
+
+def test_binary_graphic_data_is_skipped():
+    data = '^XZ~JA\x00\x01'
+    label = f"^XA^FO0,0^GFB,{len(data)},{len(data)},1,{data}^FS^XZ"
+
+    assert split_labels(label + "^XA^XZ") == [label, "^XA^XZ"]
+    doc = parse_zpl(label)
+    assert doc.ok
+    assert doc.labels[0].graphics[0]['format'] == 'B'
+    assert doc.labels[0].graphics[0]['bytes'] == len(data)
+
+
+def test_truncated_binary_graphic_is_error():
+    doc = parse_zpl("^XA^GFB,100,100,1,abc^FS^XZ")
+    assert not doc.ok
+    assert "^GF очікує 100 байт даних" in doc.errors[0]
+
+
+def test_fields_counted_and_unclosed_field_warned():
+    doc = parse_zpl("^XA^FDa^FS^FVb^FS^XZ^XA^FDc^XZ")
+    assert [label.fields for label in doc.labels] == [2, 1]
+    assert doc.warnings == ["Етикетка 2: поле не закрите ^FS"]
+
+
+def test_collapse_splits_runs_by_max_copies():
+    label = "^XA^FDx^FS^XZ"
+    labels, copies = collapse_repeated_labels([label] * 5 + ["^XA^FDy^FS^XZ"], max_copies=2)
+
+    assert labels == ["^XA^FDx^FS^PQ2^XZ", "^XA^FDx^FS^PQ2^XZ", label, "^XA^FDy^FS^XZ"]
+    assert copies == [2, 2, 1, 1]
+
+
+def test_collapse_multiplies_existing_quantity():
+    labels, copies = collapse_repeated_labels(["^XA^FDx^FS^PQ3,0,1,Y^XZ"] * 2)
+    assert labels == ["^XA^FDx^FS^PQ6,0,1,Y^XZ"]
+    assert copies == [2]
+
+
+def test_collapse_keeps_unsafe_labels():
+    for label in ("^XA^SN001,1^FS^XZ", "^XA^CC+^FDx+FS+XZ", "~JA^XA^FDx^FS^XZ"):
+        labels, copies = collapse_repeated_labels([label] * 3, max_copies=2)
+        assert labels == [label] * 3
+        assert copies == [1, 1, 1]
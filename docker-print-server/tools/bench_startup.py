@@ -0,0 +1,170 @@
+"""
+Бенчмарк часу старту сервера друку
+
+Вимірює:
+  - час імпорту app.main у чистому процесі (та найважчі модулі за -X importtime);
+  - час від запуску gunicorn до першої успішної відповіді /api/health
+    у звичайному режимі та з GUNICORN_PRELOAD=1.
+
+Сервер запускається без SSL на вільному локальному порту, стан (журнал
+завдань, реєстр принтерів) пишеться в тимчасовий каталог.
+
+Запуск (з каталогу docker-print-server):
+    python tools/bench_startup.py [--workers 4] [--runs 3] [--top 10]
+"""
+import os
+import sys
+import time
+import socket
+import argparse
+import tempfile
+import subprocess
+import statistics
+import urllib.request
+from typing import Dict, List, Optional, Tuple
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Максимальний час очікування першої відповіді (в секундах)
+READY_TIMEOUT = 60
+
+
+def _bench_env(state_dir: str, preload: bool = False) -> Dict[str, str]:
+    """Оточення, що не торкається config/ робочої копії"""
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": ROOT_DIR,
+        "SSL_DISABLE": "1",
+        "GUNICORN_PRELOAD": "1" if preload else "0",
+        "SPOOL_DIR": os.path.join(state_dir, "spool"),
+        "STATE_DIR": os.path.join(state_dir, "state"),
+        "SCAN_DATA_PATH": os.path.join(state_dir, "scan_data.json"),
+        "CONFIG_PATH": os.path.join(state_dir, "config.json"),
+    })
+    return env
+
+
+def measure_import(state_dir: str, top: int) -> Tuple[float, List[Tuple[int, str]], bool]:
+    """
+    Імпортує app.main у новому інтерпретаторі з -X importtime
+
+    Returns:
+        (сумарний час імпорту в мс, [(мкс, модуль)] найважчих модулів верхнього рівня,
+         чи був імпортований docker)
+    """
+    code = "import sys, app.main; print('docker' in sys.modules)"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT_DIR, env=_bench_env(state_dir), capture_output=True, text=True, check=True
+    )
+
+    modules: List[Tuple[int, str]] = []
+    total_us = 0
+    # Модулі до site належать старту інтерпретатора, а не додатку
+    lines = result.stderr.splitlines()
+    site_index = next((i for i, line in enumerate(lines) if line.endswith("| site")), -1)
+    for line in lines[site_index + 1:]:
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        try:
+            _, cumulative, name = line.split("|")
+            cumulative_us = int(cumulative.strip())
+        except ValueError:
+            continue  # Заголовок таблиці
+        depth = len(name) - len(name.lstrip())
+        name = name.strip()
+        if name == "app.main":
+            total_us = cumulative_us
+        elif depth <= 3:
+            # Модулі, імпортовані безпосередньо app.main або app.*
+            modules.append((cumulative_us, name))
+
+    modules.sort(reverse=True)
+    return total_us / 1000, modules[:top], result.stdout.strip() == "True"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_first_request(state_dir: str, workers: int, preload: bool) -> Optional[float]:
+    """
+    Запускає gunicorn та чекає першої відповіді /api/health
+
+    Returns:
+        Час у мс або None, якщо сервер не відповів за READY_TIMEOUT
+    """
+    port = _free_port()
+    cmd = [
+        sys.executable, "-m", "gunicorn",
+        "--config", os.path.join(ROOT_DIR, "gunicorn.conf.py"),
+        "--bind", f"127.0.0.1:{port}",
+        "--workers", str(workers),
+        "--log-level", "warning",
+        "app.main:app",
+    ]
+    url = f"http://127.0.0.1:{port}/api/health"
+
+    started = time.perf_counter()
+    process = subprocess.Popen(cmd, cwd=ROOT_DIR, env=_bench_env(state_dir, preload),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - started < READY_TIMEOUT:
+            if process.poll() is not None:
+                return None
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        return (time.perf_counter() - started) * 1000
+            except OSError:
+                time.sleep(0.005)
+        return None
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def _summary(values: List[float]) -> str:
+    if not values:
+        return "немає даних"
+    return (f"медіана {statistics.median(values):.0f} мс, "
+            f"мін {min(values):.0f} мс, макс {max(values):.0f} мс")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк часу старту сервера друку")
+    parser.add_argument("--workers", type=int, default=4, help="Кількість workers gunicorn")
+    parser.add_argument("--runs", type=int, default=3, help="Кількість повторів кожного виміру")
+    parser.add_argument("--top", type=int, default=10, help="Скільки найважчих модулів показати")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="print-server-bench-") as state_dir:
+        import_times = []
+        heaviest: List[Tuple[int, str]] = []
+        docker_loaded = False
+        for _ in range(args.runs):
+            total_ms, heaviest, docker_loaded = measure_import(state_dir, args.top)
+            import_times.append(total_ms)
+
+        print(f"Імпорт app.main: {_summary(import_times)}")
+        print(f"docker імпортується при старті: {'так' if docker_loaded else 'ні'}")
+        print("Найважчі модулі (сумарно, мс):")
+        for cumulative_us, name in heaviest:
+            print(f"  {cumulative_us / 1000:8.1f}  {name}")
+
+        for preload in (False, True):
+            times = []
+            for _ in range(args.runs):
+                elapsed = measure_first_request(state_dir, args.workers, preload)
+                if elapsed is not None:
+                    times.append(elapsed)
+            mode = "з preload" if preload else "без preload"
+            print(f"Перший запит ({args.workers} workers, {mode}): {_summary(times)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -13,10 +13,12 @@
      * Парсить ZPL код для визначення розмірів етикетки
      * 
      * @param {string} zpl - ZPL код для аналізу
+     * @param {number} [printerDpmm] - Роздільна здатність принтера (точок на мм) з інвентаря
+     *                                 сервера (поле dpmm в /api/printers/scan-data); за замовчуванням 8
      * @returns {Object} Об'єкт з розмірами {width, height, dpmm} в дюймах
      */
-    function parseZPLDimensions(zpl) {
-        var defaultDpmm = 8;
+    function parseZPLDimensions(zpl, printerDpmm) {
+        var defaultDpmm = printerDpmm > 0 ? printerDpmm : 8;
         var defaultWidth = 4; // дюйми
         var defaultHeight = 6; // дюйми
         
@@ -107,9 +109,10 @@
      * @param {string} zpl - ZPL код для конвертації
      * @param {Function} [onSuccess] - Callback при успішній генерації PDF
      * @param {Function} [onError] - Callback при помилці
+     * @param {number} [dpmm] - Роздільна здатність принтера (точок на мм), якщо відома
      * @returns {Promise} Promise з PDF blob
      */
-    function generatePDFFromZPL(zpl, onSuccess, onError) {
+    function generatePDFFromZPL(zpl, onSuccess, onError, dpmm) {
         return new Promise(function(resolve, reject) {
             if (!zpl || typeof zpl !== 'string' || zpl.trim() === '') {
                 var error = new Error('ZPL код не вказаний або порожній');
@@ -121,8 +124,8 @@
             }
             
             // Визначаємо розміри етикетки
-            var dimensions = parseZPLDimensions(zpl);
-            var dpmm = dimensions.dpmm;
+            var dimensions = parseZPLDimensions(zpl, dpmm);
+            dpmm = dimensions.dpmm;
             var width = dimensions.width;
             var height = dimensions.height;
             
@@ -222,6 +225,11 @@
      * @param {number} options.port - Порт принтера (зазвичай 9100)
      * @param {string} options.zpl - ZPL команди для друку
      * @param {string} options.serverUrl - URL проміжного сервера (з HTTPS)
+     * @param {number} [options.dpmm] - Роздільна здатність для PDF режиму (точок на мм)
+     * @param {string} [options.priority] - 'high' - друкувати на межі наступної етикетки
+     *                                      масового завдання замість очікування його завершення
+     * @param {boolean} [options.confirm] - Відповісти, коли принтер фактично надрукує
+     *                                      (відповідь сервера містить confirmation)
      * @param {Function} [options.onSuccess] - Callback функція при успішному друку
      * @param {Function} [options.onError] - Callback функція при помилці
      * @returns {Promise} Promise, який резолвиться при успішному відправленні або реджектиться при помилці
@@ -272,7 +280,7 @@
             // Перевірка чи це PDF режим
             if (ip.toUpperCase().trim() === 'PDF') {
                 // Генеруємо PDF через Labelary API
-                return generatePDFFromZPL(zpl, onSuccess, onError)
+                return generatePDFFromZPL(zpl, onSuccess, onError, options.dpmm)
                     .then(function(result) {
                         resolve(result);
                     })
@@ -324,6 +332,12 @@
                 PORT: port,
                 ZPL: zpl
             };
+            if (options.priority) {
+                printData.PRIORITY = options.priority;
+            }
+            if (options.confirm) {
+                printData.CONFIRM = true;
+            }
 
             // Відправка запиту на проміжний сервер
             fetch(serverUrl.trim(), {
@@ -408,6 +422,519 @@
         });
     }
 
+    /**
+     * Повертає базовий URL сервера друку (без /api/print в кінці)
+     * 
+     * @param {string} serverUrl - URL проміжного сервера (наприклад https://host/api/print)
+     * @returns {string} Базовий URL (наприклад https://host)
+     */
+    function getServerBaseUrl(serverUrl) {
+        return serverUrl.trim().replace(/\/+$/, '').replace(/\/api\/print$/i, '');
+    }
+
+    /**
+     * Виконує JSON запит до сервера друку та повертає розібрану відповідь
+     * 
+     * @param {string} url - URL запиту
+     * @param {string} method - HTTP метод
+     * @param {Object} [body] - Тіло запиту
+     * @returns {Promise} Promise з JSON відповіддю (reject, якщо status === 'error')
+     */
+    function requestJson(url, method, body) {
+        var init = {
+            method: method,
+            headers: { 'Accept': 'application/json' }
+        };
+        if (body !== undefined) {
+            init.headers['Content-Type'] = 'application/json';
+            init.body = JSON.stringify(body);
+        }
+        return fetch(url, init).then(function(response) {
+            return response.json().catch(function() {
+                return { status: 'error', message: 'HTTP ' + response.status + ' ' + response.statusText };
+            }).then(function(data) {
+                if (!response.ok || (data && data.status === 'error')) {
+                    var error = new Error((data && data.message) || ('HTTP ' + response.status));
+                    error.status = response.status;
+                    error.details = data;
+                    throw error;
+                }
+                return data;
+            });
+        });
+    }
+
+    /**
+     * Відправляє множину етикеток як серверні завдання друку (/api/jobs)
+     * 
+     * Сервер відправляє етикетки по одній, записує контрольну точку після кожної
+     * та при обриві з'єднання дозволяє продовжити з останньої підтвердженої
+     * етикетки замість повторного друку всього завдання.
+     * Послідовні етикетки на один принтер об'єднуються в одне завдання.
+     * 
+     * @param {Object} options - Параметри
+     * @param {Array} options.labels - Масив етикеток [{IP: "...", PORT: 9100, ZPL: "..."}, ...]
+     * @param {string} options.serverUrl - URL проміжного сервера (з HTTPS)
+     * @param {number} [options.pollInterval=1] - Інтервал опитування статусу в секундах
+     * @param {string} [options.priority='normal'] - Пріоритет завдань ('normal' або 'high')
+     * @param {Function} [options.onProgress] - Callback прогресу (acked, total, job)
+     * @param {Function} [options.onSuccess] - Callback при успішному завершенні всіх завдань
+     * @param {Function} [options.onError] - Callback при помилці; error.job - стан завдання,
+     *                                       error.resume() - продовжує друк з контрольної точки
+     * @returns {Promise} Promise, який резолвиться при завершенні всіх завдань
+     * 
+     * @example
+     * sendLabelsAsJobs({
+     *   labels: labels,
+     *   serverUrl: 'https://print-server.example.com/api/print',
+     *   onError: function(error) {
+     *     if (confirm(error.message + '. Продовжити друк?')) {
+     *       error.resume();
+     *     }
+     *   }
+     * });
+     */
+    function sendLabelsAsJobs(options) {
+        var onSuccess = options && options.onSuccess;
+        var onError = options && options.onError;
+
+        function fail(error) {
+            if (typeof onError === 'function') {
+                onError(error);
+            }
+            return Promise.reject(error);
+        }
+
+        if (!options || !Array.isArray(options.labels) || options.labels.length === 0) {
+            return fail(new Error('Масив етикеток не вказаний або порожній'));
+        }
+
+        var serverUrl = options.serverUrl;
+        if (!serverUrl || typeof serverUrl !== 'string' || !serverUrl.toLowerCase().startsWith('https://')) {
+            return fail(new Error('URL проміжного сервера повинен використовувати HTTPS протокол'));
+        }
+
+        var jobsUrl = getServerBaseUrl(serverUrl) + '/api/jobs';
+        var pollInterval = options.pollInterval || 1;
+        var onProgress = options.onProgress;
+
+        // Групуємо послідовні етикетки на один і той самий принтер
+        var groups = [];
+        for (var i = 0; i < options.labels.length; i++) {
+            var label = options.labels[i];
+            var ip = label.IP || label.ip;
+            var port = parseInt(label.PORT || label.port);
+            var zpl = label.ZPL || label.zpl;
+
+            if (!ip || !zpl || isNaN(port)) {
+                return fail(new Error('Етикетка ' + (i + 1) + ': не вказано IP, PORT або ZPL'));
+            }
+
+            var last = groups[groups.length - 1];
+            if (last && last.ip === ip && last.port === port) {
+                last.labels.push(zpl);
+            } else {
+                groups.push({ ip: ip, port: port, labels: [zpl], offset: i });
+            }
+        }
+
+        var totalLabels = options.labels.length;
+        var jobs = [];
+
+        function sleep(seconds) {
+            return new Promise(function(resolve) {
+                setTimeout(resolve, seconds * 1000);
+            });
+        }
+
+        function waitForJob(group, job) {
+            if (typeof onProgress === 'function') {
+                // Однакові етикетки сервер об'єднує в ^PQ (job.collapsed), тому job.total
+                // може бути меншим за кількість відправлених етикеток
+                var acked = job.status === 'completed' ? group.labels.length : job.acked;
+                onProgress(group.offset + acked, totalLabels, job);
+            }
+            if (job.status === 'completed') {
+                return Promise.resolve(job);
+            }
+            if (job.status === 'failed') {
+                var error = new Error(job.error || 'Помилка друку завдання ' + job.job_id);
+                error.job = job;
+                error.processed = group.offset + job.acked;
+                error.total = totalLabels;
+                return Promise.reject(error);
+            }
+            return sleep(pollInterval).then(function() {
+                return requestJson(jobsUrl + '/' + job.job_id, 'GET');
+            }).then(function(data) {
+                return waitForJob(group, data.job);
+            });
+        }
+
+        function runFrom(groupIndex, resumeJobId) {
+            if (groupIndex >= groups.length) {
+                var summary = { total: totalLabels, success: totalLabels, errors: 0, jobs: jobs };
+                if (typeof onSuccess === 'function') {
+                    onSuccess(summary);
+                }
+                return Promise.resolve(summary);
+            }
+
+            var group = groups[groupIndex];
+            var started = resumeJobId
+                ? requestJson(jobsUrl + '/' + resumeJobId + '/resume', 'POST')
+                : requestJson(jobsUrl, 'POST', {
+                    IP: group.ip,
+                    PORT: group.port,
+                    LABELS: group.labels,
+                    PRIORITY: options.priority || 'normal'
+                });
+
+            return started.then(function(data) {
+                return waitForJob(group, data.job);
+            }).then(function(job) {
+                jobs[groupIndex] = job;
+                return runFrom(groupIndex + 1);
+            }).catch(function(error) {
+                var jobId = error.job ? error.job.job_id : resumeJobId;
+                if (jobId) {
+                    // Продовжуємо з останньої підтвердженої етикетки
+                    error.resume = function() {
+                        return runFrom(groupIndex, jobId);
+                    };
+                }
+                return fail(error);
+            });
+        }
+
+        return runFrom(0);
+    }
+
+    /**
+     * Друкує етикетки з шаблону та рядків даних (/api/print/merge)
+     * 
+     * Браузер відправляє один шаблон з підстановками {{name}} та масив рядків
+     * замість тисяч готових ZPL рядків; етикетки генеруються на сервері
+     * та друкуються фоновим завданням.
+     * 
+     * @param {Object} options - Параметри
+     * @param {string} options.ip - IP-адреса принтера
+     * @param {number} options.port - Порт принтера
+     * @param {string} options.template - ZPL шаблон з підстановками {{name}}
+     * @param {Array} options.rows - Масив рядків даних [{name: "...", qty: 1}, ...]
+     * @param {string} options.serverUrl - URL проміжного сервера (з HTTPS)
+     * @param {number} [options.pollInterval=1] - Інтервал опитування статусу в секундах
+     * @param {string} [options.priority='normal'] - Пріоритет завдання ('normal' або 'high')
+     * @param {Function} [options.onProgress] - Callback прогресу (acked, total, job)
+     * @param {Function} [options.onSuccess] - Callback при завершенні друку (job)
+     * @param {Function} [options.onError] - Callback при помилці; error.job - стан завдання
+     * @returns {Promise} Promise, який резолвиться станом завершеного завдання
+     * 
+     * @example
+     * printMerge({
+     *   ip: '192.168.1.100',
+     *   port: 9100,
+     *   template: '^XA^FO50,50^ADN,36,20^FD{{name}}^FS^PQ{{qty}}^XZ',
+     *   rows: [{name: 'Коробка 1', qty: 2}, {name: 'Коробка 2', qty: 1}],
+     *   serverUrl: 'https://print-server.example.com/api/print'
+     * });
+     */
+    function printMerge(options) {
+        var onSuccess = options && options.onSuccess;
+        var onError = options && options.onError;
+
+        function fail(error) {
+            if (typeof onError === 'function') {
+                onError(error);
+            }
+            return Promise.reject(error);
+        }
+
+        if (!options || !options.template || !Array.isArray(options.rows) || options.rows.length === 0) {
+            return fail(new Error('Шаблон або рядки даних не вказані'));
+        }
+
+        var serverUrl = options.serverUrl;
+        if (!serverUrl || typeof serverUrl !== 'string' || !serverUrl.toLowerCase().startsWith('https://')) {
+            return fail(new Error('URL проміжного сервера повинен використовувати HTTPS протокол'));
+        }
+
+        var baseUrl = getServerBaseUrl(serverUrl);
+        var pollInterval = options.pollInterval || 1;
+        var onProgress = options.onProgress;
+
+        function waitForJob(job) {
+            if (typeof onProgress === 'function') {
+                onProgress(job.acked, job.total, job);
+            }
+            if (job.status === 'completed') {
+                if (typeof onSuccess === 'function') {
+                    onSuccess(job);
+                }
+                return Promise.resolve(job);
+            }
+            if (job.status === 'failed') {
+                var error = new Error(job.error || 'Помилка друку завдання ' + job.job_id);
+                error.job = job;
+                return Promise.reject(error);
+            }
+            return new Promise(function(resolve) {
+                setTimeout(resolve, pollInterval * 1000);
+            }).then(function() {
+                return requestJson(baseUrl + '/api/jobs/' + job.job_id, 'GET');
+            }).then(function(data) {
+                return waitForJob(data.job);
+            });
+        }
+
+        return requestJson(baseUrl + '/api/print/merge', 'POST', {
+            IP: options.ip,
+            PORT: options.port,
+            TEMPLATE: options.template,
+            ROWS: options.rows,
+            PRIORITY: options.priority || 'normal'
+        }).then(function(data) {
+            return waitForJob(data.job);
+        }).catch(fail);
+    }
+
+    /**
+     * Відкриває постійний WebSocket канал друку (/ws/print)
+     * 
+     * Усі повідомлення друку йдуть через одне з'єднання без очікування відповіді
+     * на попереднє; сервер підтверджує кожну етикетку окремо та надсилає стан
+     * підписаних принтерів. Повідомлення, надіслані до відкриття з'єднання,
+     * відправляються після підключення. При обриві з'єднання незавершені
+     * повідомлення відхиляються (сервер їх не друкує далі), а канал
+     * перепідключається при наступному print() або одразу, якщо є підписки.
+     * 
+     * @param {Object} options - Параметри
+     * @param {string} options.serverUrl - URL проміжного сервера (з HTTPS)
+     * @param {Function} [options.onStatus] - Callback стану принтера (status): {IP, PORT, reachable, host_status}
+     * @param {Function} [options.onClose] - Callback при обриві з'єднання (event)
+     * @param {number} [options.reconnectDelay=2] - Пауза перед перепідключенням в секундах
+     * @returns {Object} Канал: print(ip, port, zpl, onAck, priority), subscribe(ip, port),
+     *                   unsubscribe(ip, port), close(); priority 'high' друкується на межі
+     *                   наступної етикетки поточного повідомлення на той самий принтер
+     * 
+     * @example
+     * var channel = createPrintChannel({
+     *   serverUrl: 'https://print-server.example.com/api/print',
+     *   onStatus: function(status) { console.log(status.IP, status.host_status); }
+     * });
+     * channel.subscribe('192.168.1.100', 9100);
+     * channel.print('192.168.1.100', 9100, zpl, function(label, labels) {
+     *   console.log('Етикетка ' + label + ' з ' + labels);
+     * }).then(function(result) {
+     *   console.log('Надруковано ' + result.labels + ' етикеток');
+     * });
+     */
+    function createPrintChannel(options) {
+        var serverUrl = options && options.serverUrl;
+        if (!serverUrl || typeof serverUrl !== 'string' || !serverUrl.toLowerCase().startsWith('https://')) {
+            throw new Error('URL проміжного сервера повинен використовувати HTTPS протокол');
+        }
+
+        var wsUrl = getServerBaseUrl(serverUrl).replace(/^https:/i, 'wss:') + '/ws/print';
+        var reconnectDelay = options.reconnectDelay || 2;
+        var socket = null;
+        var closed = false;
+        var outbox = [];
+        var pending = {};
+        var subscriptions = {};
+        var sequence = 0;
+
+        function connect() {
+            if (socket || closed) {
+                return;
+            }
+            socket = new WebSocket(wsUrl);
+
+            socket.onopen = function() {
+                Object.keys(subscriptions).forEach(function(key) {
+                    outbox.unshift(subscriptions[key]);
+                });
+                while (outbox.length && socket && socket.readyState === WebSocket.OPEN) {
+                    socket.send(JSON.stringify(outbox.shift()));
+                }
+            };
+
+            socket.onmessage = function(event) {
+                var message;
+                try {
+                    message = JSON.parse(event.data);
+                } catch (e) {
+                    console.error('Некоректне повідомлення каналу друку:', event.data);
+                    return;
+                }
+                var entry = message.id !== undefined ? pending[message.id] : null;
+
+                if (message.type === 'status') {
+                    if (typeof options.onStatus === 'function') {
+                        options.onStatus(message);
+                    }
+                } else if (message.type === 'accepted' && entry) {
+                    entry.labels = message.labels;
+                    entry.warnings = message.warnings || [];
+                } else if (message.type === 'ack' && entry) {
+                    if (typeof entry.onAck === 'function') {
+                        entry.onAck(message.label, message.labels);
+                    }
+                } else if (message.type === 'done' && entry) {
+                    delete pending[message.id];
+                    if (message.status === 'success') {
+                        entry.resolve({ id: message.id, labels: entry.labels, warnings: entry.warnings });
+                    } else {
+                        var error = new Error(message.message || 'Помилка друку');
+                        error.acked = message.acked || 0;
+                        entry.reject(error);
+                    }
+                } else if (message.type === 'error') {
+                    if (entry) {
+                        delete pending[message.id];
+                        var rejected = new Error(message.message);
+                        rejected.details = message;
+                        entry.reject(rejected);
+                    } else {
+                        console.error('Канал друку: ' + message.message);
+                    }
+                }
+            };
+
+            socket.onclose = function(event) {
+                socket = null;
+                // Сервер не продовжує друк після обриву - відхиляємо незавершені повідомлення
+                Object.keys(pending).forEach(function(id) {
+                    var error = new Error('З\'єднання з сервером друку втрачено');
+                    error.disconnected = true;
+                    pending[id].reject(error);
+                });
+                pending = {};
+                outbox = [];
+                if (typeof options.onClose === 'function') {
+                    options.onClose(event);
+                }
+                if (!closed && Object.keys(subscriptions).length) {
+                    setTimeout(connect, reconnectDelay * 1000);
+                }
+            };
+        }
+
+        function send(message) {
+            if (socket && socket.readyState === WebSocket.OPEN) {
+                socket.send(JSON.stringify(message));
+            } else {
+                outbox.push(message);
+                connect();
+            }
+        }
+
+        return {
+            print: function(ip, port, zpl, onAck, priority) {
+                if (closed) {
+                    return Promise.reject(new Error('Канал друку закрито'));
+                }
+                var id = 'm' + (++sequence);
+                return new Promise(function(resolve, reject) {
+                    pending[id] = { resolve: resolve, reject: reject, onAck: onAck, labels: 0, warnings: [] };
+                    send({ type: 'print', id: id, IP: ip, PORT: parseInt(port), ZPL: zpl, priority: priority || 'normal' });
+                });
+            },
+            subscribe: function(ip, port) {
+                var message = { type: 'subscribe', IP: ip, PORT: parseInt(port) };
+                subscriptions[ip + ':' + message.PORT] = message;
+                send(message);
+            },
+            unsubscribe: function(ip, port) {
+                delete subscriptions[ip + ':' + parseInt(port)];
+                if (socket && socket.readyState === WebSocket.OPEN) {
+                    socket.send(JSON.stringify({ type: 'unsubscribe', IP: ip, PORT: parseInt(port) }));
+                }
+            },
+            close: function() {
+                closed = true;
+                outbox = [];
+                if (socket) {
+                    socket.close();
+                }
+            }
+        };
+    }
+
+    /**
+     * Відправляє множину етикеток через WebSocket канал друку
+     * 
+     * Усі етикетки надсилаються одразу через одне з'єднання; сервер друкує їх
+     * по черзі для кожного принтера (на різні принтери - паралельно).
+     * 
+     * @param {Object} options - Параметри
+     * @param {Array} options.labels - Масив етикеток [{IP: "...", PORT: 9100, ZPL: "..."}, ...]
+     * @param {string} options.serverUrl - URL проміжного сервера (з HTTPS)
+     * @param {Object} [options.channel] - Вже відкритий канал (createPrintChannel); інакше
+     *                                     відкривається новий і закривається після друку
+     * @param {Function} [options.onProgress] - Callback після кожної надрукованої етикетки (current, total)
+     * @param {Function} [options.onSuccess] - Callback при успішному завершенні всіх етикеток
+     * @param {Function} [options.onError] - Callback при помилці; error.summary - підсумок
+     * @returns {Promise} Promise, який резолвиться підсумком {total, success, errors}
+     */
+    function sendLabelsOverChannel(options) {
+        var onSuccess = options && options.onSuccess;
+        var onError = options && options.onError;
+
+        function fail(error) {
+            if (typeof onError === 'function') {
+                onError(error);
+            }
+            return Promise.reject(error);
+        }
+
+        if (!options || !Array.isArray(options.labels) || options.labels.length === 0) {
+            return fail(new Error('Масив етикеток не вказаний або порожній'));
+        }
+
+        var channel = options.channel;
+        var ownChannel = !channel;
+        if (ownChannel) {
+            try {
+                channel = createPrintChannel({ serverUrl: options.serverUrl });
+            } catch (e) {
+                return fail(e);
+            }
+        }
+
+        var total = options.labels.length;
+        var printed = 0;
+        var errors = [];
+
+        var results = options.labels.map(function(label, index) {
+            return channel.print(label.IP || label.ip, label.PORT || label.port, label.ZPL || label.zpl)
+                .then(function() {
+                    printed++;
+                    if (typeof options.onProgress === 'function') {
+                        options.onProgress(printed, total);
+                    }
+                }, function(error) {
+                    errors.push({ index: index, label: label, error: error.message });
+                });
+        });
+
+        return Promise.all(results).then(function() {
+            if (ownChannel) {
+                channel.close();
+            }
+            var summary = { total: total, success: printed, errors: errors.length, errorDetails: errors };
+            if (errors.length) {
+                var error = new Error('Не надруковано ' + errors.length + ' з ' + total + ' етикеток: ' + errors[0].error);
+                error.summary = summary;
+                return fail(error);
+            }
+            if (typeof onSuccess === 'function') {
+                onSuccess(summary);
+            }
+            return summary;
+        });
+    }
+
     /**
      * Відправляє множину ZPL-етикеток порціями з паузами між порціями
      * 
@@ -420,6 +947,10 @@
      * @param {Function} [options.onPoolComplete] - Callback при завершенні порції (poolNumber, totalPools)
      * @param {Function} [options.onSuccess] - Callback при успішному завершенні всіх етикеток
      * @param {Function} [options.onError] - Callback при помилці
+     * @param {boolean} [options.useServerJobs] - Друкувати через серверні завдання з контрольними
+     *                                            точками (див. sendLabelsAsJobs) замість порцій
+     * @param {boolean} [options.useWebSocket] - Друкувати через постійний WebSocket канал
+     *                                           (див. sendLabelsOverChannel) замість порцій
      * @returns {Promise} Promise, який резолвиться при завершенні всіх етикеток
      * 
      * @example
@@ -440,6 +971,25 @@
      * });
      */
     function sendLabelsInBatches(options) {
+        if (options && options.useWebSocket) {
+            return sendLabelsOverChannel({
+                labels: options.labels,
+                serverUrl: options.serverUrl,
+                onProgress: options.onProgress,
+                onSuccess: options.onSuccess,
+                onError: options.onError
+            });
+        }
+        if (options && options.useServerJobs) {
+            return sendLabelsAsJobs({
+                labels: options.labels,
+                serverUrl: options.serverUrl,
+                onProgress: options.onProgress,
+                onSuccess: options.onSuccess,
+                onError: options.onError
+            });
+        }
+
         return new Promise(function(resolve, reject) {
             // Валідація параметрів
             if (!options || !options.labels || !Array.isArray(options.labels) || options.labels.length === 0) {
@@ -944,6 +1494,8 @@
                     labels: labels,
                     poolSize: poolSize,
                     sleepSeconds: sleepSeconds,
+                    useServerJobs: !!printData.useServerJobs,
+                    useWebSocket: !!printData.useWebSocket,
                     serverUrl: apiUrl,
                     onProgress: function(current, total, currentPool, totalPools) {
                         // Можна додати callback для прогресу якщо потрібно
@@ -971,6 +1523,10 @@
     // Експорт функцій для глобального використання в APEX
     window.sendToPrintServer = sendToPrintServer;
     window.sendLabelsInBatches = sendLabelsInBatches;
+    window.sendLabelsAsJobs = sendLabelsAsJobs;
+    window.printMerge = printMerge;
+    window.createPrintChannel = createPrintChannel;
+    window.sendLabelsOverChannel = sendLabelsOverChannel;
     window.sendFromApexItem = sendFromApexItem;
 
     // Підтримка CommonJS (якщо потрібно)
@@ -978,6 +1534,10 @@
         module.exports = {
             sendToPrintServer: sendToPrintServer,
             sendLabelsInBatches: sendLabelsInBatches,
+            sendLabelsAsJobs: sendLabelsAsJobs,
+            printMerge: printMerge,
+            createPrintChannel: createPrintChannel,
+            sendLabelsOverChannel: sendLabelsOverChannel,
             sendFromApexItem: sendFromApexItem
         };
     }